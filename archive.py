@@ -0,0 +1,155 @@
+import os
+import gzip
+import zlib
+import uuid
+from datetime import datetime, timezone
+from http.client import responses
+
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+
+# Archive des pages html téléchargées par crawl.py (--archive), pour pouvoir les
+# relire hors ligne (crawl.py --replay-archive) après un changement des règles
+# (motifs autorisés / bloqués, is_probable_pdf...), sans tout recrawler.
+#
+# Format WARC (enregistrements "response", un membre gzip par enregistrement,
+# lisible par les outils WARC habituels) dans state/archive/AAAAMMJJ-HHMMSS-pid.warc.gz.
+# Les fichiers ne sont jamais modifiés : un nouveau fichier par session, et
+# au-delà de ARCHIVE_FILE_SIZE. Le corps est celui lu par crawl.py (décompressé,
+# au plus MAX_PAGE_SIZE), les en-têtes Content-Encoding / Transfer-Encoding sont retirés.
+#
+# Index dans la table archive_index (voir db.py) : pour chaque url, la position de
+# sa dernière version (fichier, début et longueur du membre gzip) et sa profondeur.
+
+ARCHIVE_FILE_SIZE = 1024 * 1024 * 1024  # octets, ensuite un nouveau fichier
+COMPRESS_LEVEL = 6
+DROPPED_HEADERS = {"content-encoding", "transfer-encoding", "content-length"}
+READ_BATCH_SIZE = 1000  # entrées de l'index lues par requête
+
+
+class PageArchive:
+    # un seul écrivain : le thread principal de crawl()
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.file = None
+        self.file_name = None
+
+    def _open_new_file(self):
+        if self.file is not None:
+            self.file.close()
+        self.file_name = f"{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}.warc.gz"
+        self.file = open(os.path.join(self.directory, self.file_name), "ab")
+
+    def write(self, conn, url, requested_url, depth, res, content):
+        # url : url finale (après redirections), requested_url : url demandée.
+        # L'index est mis à jour sans commit : fait par crawl() après chaque page.
+        if self.file is None or self.file.tell() >= ARCHIVE_FILE_SIZE:
+            self._open_new_file()
+
+        status_line = f"HTTP/1.1 {res.status_code} {res.reason or responses.get(res.status_code, '')}\r\n"
+        headers = "".join(
+            f"{name}: {value}\r\n" for name, value in res.headers.items() if name.lower() not in DROPPED_HEADERS
+        )
+        block = (status_line + headers + f"Content-Length: {len(content)}\r\n\r\n").encode("latin-1", "replace") + content
+        warc_headers = [
+            ("WARC-Type", "response"),
+            ("WARC-Record-ID", f"<urn:uuid:{uuid.uuid4()}>"),
+            ("WARC-Date", datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")),
+            ("WARC-Target-URI", url),
+            ("X-Crawl-Requested-URI", requested_url),
+            ("X-Crawl-Depth", str(depth)),
+            ("Content-Type", "application/http; msgtype=response"),
+            ("Content-Length", str(len(block))),
+        ]
+        record = ("WARC/1.0\r\n" + "".join(f"{name}: {value}\r\n" for name, value in warc_headers) + "\r\n").encode("utf-8")
+        member = gzip.compress(record + block + b"\r\n\r\n", compresslevel=COMPRESS_LEVEL)
+
+        offset = self.file.tell()
+        self.file.write(member)
+        self.file.flush()
+        conn.execute(
+            "INSERT OR REPLACE INTO archive_index (url, depth, file, offset, length) VALUES (?, ?, ?, ?, ?)",
+            (url, depth, self.file_name, offset, len(member)),
+        )
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class ArchivedResponse:
+    # ce que visit_page() utilise d'une réponse de requests
+
+    def __init__(self, url, status_code, reason, headers):
+        self.url = url
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.encoding = get_encoding_from_headers(headers)
+        self.history = []
+
+
+def parse_record(data):
+    # data : membre gzip d'un enregistrement ; renvoie (ArchivedResponse, corps)
+    record = zlib.decompress(data, wbits=31)
+    warc_head, _, rest = record.partition(b"\r\n\r\n")
+    warc_headers = dict(
+        line.split(": ", 1) for line in warc_head.decode("utf-8").split("\r\n")[1:] if ": " in line
+    )
+    http_head, _, body = rest[:int(warc_headers["Content-Length"])].partition(b"\r\n\r\n")
+    http_lines = http_head.decode("latin-1").split("\r\n")
+    _, status, reason = (http_lines[0].split(" ", 2) + [""])[:3]
+    headers = CaseInsensitiveDict(line.split(": ", 1) for line in http_lines[1:] if ": " in line)
+    return ArchivedResponse(warc_headers["WARC-Target-URI"], int(status), reason, headers), body
+
+
+def _index_entries(conn):
+    # l'index par lots de READ_BATCH_SIZE, dans l'ordre (fichier, début) : aucune
+    # lecture ne reste en cours pendant la relecture (en WAL, elle empêcherait les checkpoints)
+    sql = f"""
+        SELECT url, depth, file, offset, length FROM archive_index
+        WHERE file > ? OR (file = ? AND offset > ?)
+        ORDER BY file, offset
+        LIMIT {READ_BATCH_SIZE}
+    """
+    last_file, last_offset = "", -1
+    while True:
+        rows = conn.execute(sql, (last_file, last_file, last_offset)).fetchall()
+        yield from rows
+        if len(rows) < READ_BATCH_SIZE:
+            return
+        last_file, last_offset = rows[-1][2], rows[-1][3]
+
+
+def read_archive(conn, directory):
+    # Dernière version de chaque page de l'index, dans l'ordre des fichiers : les
+    # lectures sont séquentielles. Renvoie des (url, profondeur, réponse, corps).
+    current_name = None
+    f = None
+    try:
+        for url, depth, file_name, offset, length in _index_entries(conn):
+            if file_name != current_name:
+                if f is not None:
+                    f.close()
+                path = os.path.join(directory, file_name)
+                if not os.path.exists(path):
+                    print(f"[WARN] Missing archive file: {path}")
+                    f, current_name = None, file_name
+                    continue
+                f, current_name = open(path, "rb"), file_name
+            if f is None:
+                continue
+            f.seek(offset)
+            try:
+                res, content = parse_record(f.read(length))
+            except (zlib.error, ValueError, KeyError) as e:
+                print(f"[WARN] Unreadable archive record for {url}: {e}")
+                continue
+            yield url, depth, res, content
+    finally:
+        if f is not None:
+            f.close()
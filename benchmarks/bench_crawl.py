@@ -0,0 +1,274 @@
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+from collections import defaultdict
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from synthetic_site import add_site_arguments, site_from_arguments
+
+
+# Débit de crawl.py, verify.py et download.py sur des sites synthétiques servis en
+# local (synthetic_site.py), sans réseau. Chaque étape tourne dans un processus
+# séparé, dans un dossier temporaire (state/ neuf), l'une après l'autre, avec les
+# délais de politesse remplaçables (--request-delay, --domain-delay).
+#
+# Résultat en JSON (stdout, ou --output), à comparer entre deux commits :
+#   python benchmarks/bench_crawl.py --output avant.json
+#   git checkout ...
+#   python benchmarks/bench_crawl.py --compare avant.json
+#
+# Pour chaque étape : durée, pages, liens, documents et leurs débits, pic de
+# mémoire (RSS), et temps passé
+#   parse        : extraction des liens (link_extractor)
+#   network      : requêtes, lecture des réponses (et écriture des fichiers pour
+#                  download.py), sans l'attente de politesse ; additionné sur tous
+#                  les threads, donc plus grand que la durée si concurrency > 1
+#   throttle_wait: attente de politesse par domaine, additionnée sur tous les threads
+#   persistence  : journal, fichiers d'état, écritures dans la base
+
+STAGES = ["crawl", "verify", "download"]
+METRICS = ["wall_s", "pages_per_s", "links_per_s", "documents_per_s", "peak_rss_mb"]
+
+
+class Timings:
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self.lock:
+            self.totals[name] += seconds
+
+    def wrap(self, name, func, count=None):
+        # count(résultat) : nombre ajouté à self.counts[name]
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                self.add(name, time.perf_counter() - start)
+            if count is not None:
+                with self.lock:
+                    self.counts[name] += count(result)
+            return result
+        return wrapper
+
+    def throttle_class(self, base):
+        timings = self
+
+        class TimedThrottle(base):
+            @contextmanager
+            def slot(self, domain):
+                start = time.perf_counter()
+                with super().slot(domain):
+                    timings.add("throttle_wait", time.perf_counter() - start)
+                    yield
+
+        return TimedThrottle
+
+
+# ---- étapes (dans le processus enfant) ----
+
+def run_crawl(args, timings):
+    import crawl
+    import throttle
+
+    crawl.MAX_DEPTH = args.max_depth
+    crawl.REQUEST_DELAY = args.request_delay
+    crawl.MIN_REQUEST_DELAY = min(args.min_request_delay, args.request_delay)
+    crawl.throttle = timings.throttle_class(throttle.DomainThrottle)(
+        crawl.REQUEST_DELAY, min_delay=crawl.MIN_REQUEST_DELAY, max_delay=crawl.MAX_REQUEST_DELAY)
+    crawl.fetch_with_throttle = timings.wrap("network", crawl.fetch_with_throttle)
+    crawl.extract_links = timings.wrap("parse", crawl.extract_links, count=lambda page: len(page.links))
+    for name in ("journal_commit", "compact_state", "flush_pdf_info_batch", "save_page"):
+        setattr(crawl, name, timings.wrap("persistence", getattr(crawl, name)))
+
+    crawl.setup(frontier=args.frontier)
+    start = time.perf_counter()
+    crawl.crawl(concurrency=args.crawl_concurrency)
+    return time.perf_counter() - start, crawl.crawl_yield["pages"], timings.counts["parse"], crawl.crawl_yield["documents"]
+
+
+def run_verify(args, timings):
+    import verify
+
+    verify.MIN_DOMAIN_DELAY = args.domain_delay
+    verify.DomainThrottle = timings.throttle_class(verify.DomainThrottle)
+    verify.verify_link = timings.wrap("network", verify.verify_link)
+    verify.save_results = timings.wrap("persistence", verify.save_results)
+
+    start = time.perf_counter()
+    verify.verify_links(concurrency=args.verify_concurrency)
+    wall = time.perf_counter() - start
+    conn = sqlite3.connect(verify.DB_PATH)
+    verified = conn.execute("SELECT COUNT(*) FROM found_documents WHERE link_http_code IS NOT NULL").fetchone()[0]
+    conn.close()
+    return wall, 0, 0, verified
+
+
+def run_download(args, timings):
+    import download
+
+    download.MIN_DOMAIN_DELAY = args.domain_delay
+    download.DomainThrottle = timings.throttle_class(download.DomainThrottle)
+    download.download_document = timings.wrap("network", download.download_document)
+    download.save_results = timings.wrap("persistence", download.save_results)
+
+    start = time.perf_counter()
+    download.main(concurrency=args.download_concurrency)
+    wall = time.perf_counter() - start
+    conn = sqlite3.connect(download.DB_PATH)
+    downloaded = conn.execute("SELECT COUNT(*) FROM found_documents WHERE doc_date_downloaded IS NOT NULL").fetchone()[0]
+    conn.close()
+    return wall, 0, 0, downloaded
+
+
+def run_stage_in_child(args):
+    import throttle
+    import robots
+    throttle.BREAKER_COOLDOWN = args.breaker_cooldown
+    robots.ROBOTS_UNAVAILABLE_TTL = args.robots_unavailable_ttl
+
+    os.chdir(args.workdir)
+    timings = Timings()
+    run = {"crawl": run_crawl, "verify": run_verify, "download": run_download}[args.run_stage]
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        wall, pages, links, documents = run(args, timings)
+
+    network = timings.totals["network"] - timings.totals["throttle_wait"]
+    result = {
+        "wall_s": round(wall, 3),
+        "pages": pages,
+        "links": links,
+        "documents": documents,
+        "pages_per_s": round(pages / wall, 2),
+        "links_per_s": round(links / wall, 2),
+        "documents_per_s": round(documents / wall, 2),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "time_s": {
+            "parse": round(timings.totals["parse"], 3),
+            "network": round(max(network, 0), 3),
+            "throttle_wait": round(timings.totals["throttle_wait"], 3),
+            "persistence": round(timings.totals["persistence"], 3),
+        },
+    }
+    print(json.dumps(result))
+
+
+# ---- processus principal ----
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def prepare_workdir(workdir, seeds):
+    os.makedirs(os.path.join(workdir, "state"))
+    with open(os.path.join(workdir, "state", "urls_to_visit.txt"), "w", encoding="utf-8") as f:
+        for url in seeds:
+            f.write(f"{url}|0\n")
+
+
+def run_stage(stage, workdir, args):
+    command = [sys.executable, os.path.abspath(__file__), "--run-stage", stage, "--workdir", workdir]
+    for name in ("request_delay", "min_request_delay", "domain_delay", "breaker_cooldown",
+                 "robots_unavailable_ttl", "max_depth",
+                 "frontier", "crawl_concurrency", "verify_concurrency", "download_concurrency"):
+        command += ["--" + name.replace("_", "-"), str(getattr(args, name))]
+    process = subprocess.run(command, capture_output=True, text=True)
+    if process.returncode:
+        sys.stderr.write(process.stderr)
+        raise SystemExit(f"Stage {stage} failed")
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def compare(previous, current):
+    print(f"Comparison with {previous.get('commit')} ({previous.get('date')}):", file=sys.stderr)
+    for stage, result in current["stages"].items():
+        before = previous.get("stages", {}).get(stage)
+        if before is None:
+            continue
+        for metric in METRICS:
+            old, new = before.get(metric), result.get(metric)
+            if old and new is not None:
+                print(f"  {stage:<9} {metric:<16} {old:>10} -> {new:<10} (x{new / old:.2f})", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_site_arguments(parser)
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--request-delay", type=float, default=0, help="REQUEST_DELAY de crawl.py")
+    parser.add_argument("--min-request-delay", type=float, default=0, help="MIN_REQUEST_DELAY de crawl.py")
+    parser.add_argument("--domain-delay", type=float, default=0, help="MIN_DOMAIN_DELAY de verify.py et download.py")
+    parser.add_argument("--breaker-cooldown", type=float, default=2,
+                        help="BREAKER_COOLDOWN de throttle.py, court pour les hôtes défaillants")
+    parser.add_argument("--robots-unavailable-ttl", type=float, default=2,
+                        help="ROBOTS_UNAVAILABLE_TTL de robots.py, court pour les hôtes défaillants (503 sur robots.txt)")
+    parser.add_argument("--max-depth", type=int, default=100)
+    parser.add_argument("--frontier", choices=["best-first", "fifo"], default="best-first")
+    parser.add_argument("--crawl-concurrency", type=int, default=4)
+    parser.add_argument("--verify-concurrency", type=int, default=16)
+    parser.add_argument("--download-concurrency", type=int, default=8)
+    parser.add_argument("--output", help="fichier JSON du résultat (défaut : stdout)")
+    parser.add_argument("--compare", help="résultat JSON précédent, pour comparaison")
+    parser.add_argument("--keep", action="store_true", help="garde le dossier de travail")
+    parser.add_argument("--run-stage", choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        run_stage_in_child(args)
+        return
+
+    site = site_from_arguments(args).start()
+    workdir = tempfile.mkdtemp(prefix="bench_crawl_")
+    prepare_workdir(workdir, site.seeds())
+    config = {key: value for key, value in vars(args).items()
+              if key not in ("output", "compare", "keep", "run_stage", "workdir")}
+    results = {"commit": git_commit(), "date": datetime.now().isoformat(timespec="seconds"),
+               "config": config, "stages": {}}
+    try:
+        for stage in STAGES:
+            if stage in args.stages:
+                print(f"[BENCH] {stage}...", file=sys.stderr)
+                requests_before = site.requests
+                results["stages"][stage] = run_stage(stage, workdir, args)
+                results["stages"][stage]["requests"] = site.requests - requests_before
+    finally:
+        site.stop()
+        if args.keep:
+            print(f"[BENCH] Working directory: {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
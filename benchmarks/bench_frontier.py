@@ -0,0 +1,148 @@
+import os
+import sys
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from frontier import Frontier
+from scoring import LinkScorer
+
+
+# Documents trouvés en fonction du nombre de requêtes, frontière "fifo" (parcours
+# en largeur) contre "best-first" (scoring.py), sur des sites universitaires simulés :
+# beaucoup d'actualités, d'agenda et de pages personnelles, et quelques pages de
+# cours avec des dizaines de pdf. Le temps est simulé : REQUEST_TIME par requête,
+# et REQUEST_DELAY entre deux requêtes sur un même domaine, comme dans crawl.py.
+#
+#   python benchmarks/bench_frontier.py
+#   python benchmarks/bench_frontier.py --domains 20 --requests 3000
+#
+# Sur un vrai crawl, comparer les lignes de state/yield.log (crawl.py --frontier ...).
+
+REQUEST_TIME = 0.3
+REQUEST_DELAY = 2
+
+
+def make_site(rng, domain, size):
+    # renvoie {url: [(href, text, is_pdf), ...]}
+    base = f"https://{domain}"
+    pages = {}
+
+    def page(path, links):
+        pages[base + path] = links
+
+    n_news = size
+    n_people = size // 4
+    n_courses = max(size // 20, 2)
+
+    page("/", [
+        (base + "/actualites/1", "Actualités", False),
+        (base + "/agenda/1", "Agenda", False),
+        (base + "/annuaire/", "Annuaire", False),
+        (base + "/enseignement/", "Enseignement", False),
+        (base + "/contact", "Contact", False),
+    ])
+    page("/contact", [])
+    menu = [(base + "/", "Accueil", False), (base + "/contact", "Contact", False)]
+
+    for i in range(1, n_news + 1):
+        links = menu + [(base + f"/actualites/{i + 1}", "Suite", False),
+                        (base + f"/agenda/{rng.randint(1, n_news)}", "Événement", False)]
+        page(f"/actualites/{i}", links)
+        page(f"/agenda/{i}", menu + [(base + f"/agenda/{i + 1}", "Mois suivant", False)])
+
+    page("/annuaire/", menu + [(base + f"/perso/{i}", f"Page de M. {i}", False) for i in range(n_people)])
+    for i in range(n_people):
+        links = menu + [(base + f"/perso/{i}/publications", "Publications", False)]
+        if i % 3 == 0:
+            links.append((base + f"/cours/{rng.randrange(n_courses)}", "Teaching", False))
+        page(f"/perso/{i}", links)
+        page(f"/perso/{i}/publications", menu + [
+            (base + f"/perso/{i}/article-{j}.pdf", f"Article {j}", True) for j in range(rng.randint(0, 3))
+        ])
+
+    page("/enseignement/", menu + [(base + f"/formation/{i}", f"Formation {i}", False) for i in range(4)])
+    for i in range(4):
+        page(f"/formation/{i}", menu + [
+            (base + f"/cours/{j}", f"UE {j}", False) for j in range(n_courses) if j % 4 == i
+        ])
+    for j in range(n_courses):
+        links = menu + [(base + f"/cours/{j}/td-{k}.pdf", f"Feuille de TD {k}", True) for k in range(rng.randint(5, 20))]
+        links += [(base + f"/cours/{j}/annales", "Annales et corrigés", False)]
+        page(f"/cours/{j}", links)
+        page(f"/cours/{j}/annales", menu + [
+            (base + f"/cours/{j}/examen-{k}.pdf", f"Examen {2010 + k}", True) for k in range(rng.randint(3, 10))
+        ])
+    return pages
+
+
+def simulate(pages, seeds, kind, max_requests, checkpoints):
+    clock = [0.0]
+    last_visit = {}
+    scorer = LinkScorer()
+    frontier = Frontier(
+        lambda url: url.split("/")[2],
+        lambda domain: last_visit.get(domain, -REQUEST_DELAY) + REQUEST_DELAY,
+        priority=kind == "best-first",
+    )
+    for seed in seeds:
+        frontier.push(seed, 0, scorer.score(seed, 0))
+    seen = set(seeds)
+    documents = set()
+    results = []
+    requests_done = 0
+
+    while frontier and requests_done < max_requests:
+        entry = frontier.pop(clock[0])
+        if entry is None:
+            clock[0] = max(clock[0], frontier.next_ready_time())
+            continue
+        url, depth, domain = entry
+        clock[0] += REQUEST_TIME
+        last_visit[domain] = clock[0]
+        requests_done += 1
+
+        links = pages.get(url, [])
+        found = sum(1 for _, _, is_pdf in links if is_pdf)
+        scorer.record_page(domain, found)
+        for href, text, is_pdf in links:
+            if is_pdf:
+                documents.add(href)
+            elif href not in seen:
+                seen.add(href)
+                frontier.push(href, depth + 1, scorer.score(href, depth + 1, domain, text, None, found))
+        frontier.release(domain)
+        if requests_done in checkpoints:
+            results.append((requests_done, len(documents)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--domains", type=int, default=5)
+    parser.add_argument("--size", type=int, default=300, help="pages d'actualités par domaine")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    pages = {}
+    domains = [f"math.univ-{i}.fr" for i in range(args.domains)]
+    for domain in domains:
+        pages.update(make_site(rng, domain, args.size))
+    total = len({href for links in pages.values() for href, _, is_pdf in links if is_pdf})
+    seeds = [f"https://{domain}/" for domain in domains]
+
+    checkpoints = sorted({n for n in (50, 100, 200, 500, 1000, 2000, 5000) if n < args.requests} | {args.requests})
+    fifo = simulate(pages, seeds, "fifo", args.requests, checkpoints)
+    best = simulate(pages, seeds, "best-first", args.requests, checkpoints)
+
+    print(f"{args.domains} domains, {len(pages)} pages, {total} documents")
+    print(f"  {'requests':>8}  {'fifo':>6}  {'best-first':>10}")
+    for (n, fifo_docs), (_, best_docs) in zip(fifo, best):
+        print(f"  {n:>8}  {fifo_docs:>6}  {best_docs:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+from crawl import get_meta_refresh_redirect_url
+from link_extractor import extract_links
+
+
+# Compare l'extraction des liens avec BeautifulSoup (ancienne méthode de crawl())
+# et avec link_extractor, sur une grosse page d'index générée ou sur des fichiers
+# html passés en argument. Vérifie aussi que les résultats sont identiques.
+#
+#   python benchmarks/bench_link_extractor.py
+#   python benchmarks/bench_link_extractor.py page1.html page2.html --repeat 20
+
+
+def make_index_page(n_links):
+    rows = []
+    for i in range(n_links):
+        rows.append(
+            f'<tr><td class="c{i % 7}"><a href="/examens/{2000 + i % 25}/sujet-{i}.pdf" '
+            f'title="Sujet {i}">TD n&deg;{i} <span class="small">(pdf)</span></a></td>'
+            f'<td>Partiel &amp; corrig&eacute;</td><td><a href="page-{i}.html">d&eacute;tails</a></td></tr>\n'
+        )
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8">'
+        '<title>Annales de mathématiques</title>'
+        '<style>td { padding: 2px }</style></head><body>'
+        '<div id="menu"><ul>' + ''.join(f'<li><a href="/m{i}/">Menu {i}</a></li>' for i in range(40)) + '</ul></div>'
+        '<table>\n' + ''.join(rows) + '</table></body></html>'
+    ).encode("utf-8")
+
+
+def with_beautifulsoup(content, url):
+    soup = BeautifulSoup(content.decode("utf-8", errors="replace"), "html.parser")
+    redirect_url = get_meta_refresh_redirect_url(soup, url)
+    title = soup.title.string if soup.title else None
+    links = [(link["href"], link.text, link.get("title", None)) for link in soup.find_all("a", href=True)]
+    return title, redirect_url, links
+
+
+def with_link_extractor(content, url):
+    chunks = (content[i:i + 65536] for i in range(0, len(content), 65536))
+    page = extract_links(chunks, "utf-8")
+    return page.title, page.meta_refresh_url(url), page.links
+
+
+def timed(function, content, url, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(content, url)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="*")
+    parser.add_argument("--links", type=int, default=5000, help="nombre de lignes de la page générée")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    pages = [(f"generated ({args.links} rows)", make_index_page(args.links))]
+    for filename in args.files:
+        with open(filename, "rb") as f:
+            pages.append((filename, f.read()))
+
+    url = "https://www.example.org/annales/index.html"
+    for name, content in pages:
+        bs_time, bs_result = timed(with_beautifulsoup, content, url, args.repeat)
+        le_time, le_result = timed(with_link_extractor, content, url, args.repeat)
+        print(f"{name}: {len(content) / 1024:.0f} kB, {len(le_result[2])} links")
+        print(f"  BeautifulSoup   {bs_time * 1000:8.1f} ms")
+        print(f"  link_extractor  {le_time * 1000:8.1f} ms  (x{bs_time / le_time:.1f})")
+        print(f"  same results    {bs_result == le_result}")
+
+
+if __name__ == "__main__":
+    main()
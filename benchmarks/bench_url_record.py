@@ -0,0 +1,97 @@
+import os
+import sys
+import time
+import argparse
+from urllib.parse import urljoin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crawl
+from crawl import (
+    normalize_url, get_domain, is_probable_pdf, is_probable_html,
+    convert_google_drive_share_to_download, get_file_extension, link_record, url_record,
+)
+
+
+# Coût par lien de la classification des liens dans visit_page() :
+#   - avant : urljoin, normalize_url, get_domain (x3), is_probable_pdf,
+#     convert_google_drive_share_to_download (x2), get_file_extension (x2 ou 3)...
+#   - après : link_record(), une seule analyse par url, avec cache LRU
+# sur un crawl simulé où chaque page répète le même menu. Vérifie aussi que les
+# résultats sont identiques.
+#
+#   python benchmarks/bench_url_record.py
+#   python benchmarks/bench_url_record.py --pages 2000 --menu 80
+
+
+def make_pages(n_pages, menu_size, links_per_page):
+    menu = [f"/rubrique-{i}/index.php" for i in range(menu_size)] + ["https://drive.google.com/file/d/abc123/view"]
+    pages = []
+    for p in range(n_pages):
+        base = f"https://math.univ-exemple.fr/annales/{p % 20}/page-{p}.html"
+        links = list(menu)
+        for i in range(links_per_page):
+            links.append(
+                f"sujets/{p}-{i}.pdf" if i % 3 == 0 else
+                f"../td/{p}/{i}.html#haut" if i % 3 == 1 else
+                f"https://plmbox.math.cnrs.fr/f/{p}{i}/?dl=1"
+            )
+        pages.append((base, links))
+    return pages
+
+
+def classify_before(base, href):
+    url = normalize_url(urljoin(base, href))
+    domain = get_domain(url)
+    get_domain(url)  # is_eligible_for_crawl
+    get_domain(url)  # is_url_blocked
+    if is_probable_pdf(url):
+        if convert_google_drive_share_to_download(url):
+            url = convert_google_drive_share_to_download(url)
+        return "pdf", url, get_file_extension(url), domain
+    if is_probable_html(url):
+        return "html", url, None, domain
+    return None, url, None, domain
+
+
+def classify_after(base, href):
+    record = link_record(base, href)
+    if record.is_pdf:
+        return "pdf", record.document_url, record.document_extension, record.domain
+    if record.is_html:
+        return "html", record.url, None, record.domain
+    return None, record.url, None, record.domain
+
+
+def run(classify, pages):
+    start = time.perf_counter()
+    results = [classify(base, href) for base, links in pages for href in links]
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--menu", type=int, default=40, help="liens du menu, répétés sur chaque page")
+    parser.add_argument("--links", type=int, default=30, help="liens propres à chaque page")
+    args = parser.parse_args()
+
+    pages = make_pages(args.pages, args.menu, args.links)
+    n_links = sum(len(links) for _, links in pages)
+
+    before_time, before = run(classify_before, pages)
+    url_record.cache_clear()
+    after_time, after = run(classify_after, pages)
+    info = url_record.cache_info()
+    warm_time, _ = run(classify_after, pages)
+
+    print(f"{args.pages} pages, {n_links} links, cache size {crawl.URL_RECORD_CACHE_SIZE}")
+    print(f"  before            {before_time / n_links * 1e6:6.2f} µs/link")
+    print(f"  url records       {after_time / n_links * 1e6:6.2f} µs/link  (x{before_time / after_time:.1f}, "
+          f"{info.hits / (info.hits + info.misses):.0%} cache hits)")
+    print(f"  url records warm  {warm_time / n_links * 1e6:6.2f} µs/link  (x{before_time / warm_time:.1f})")
+    print(f"  same results      {before == after}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import time
+import gzip
+import random
+import argparse
+import threading
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+# Sites synthétiques servis en local, pour mesurer le crawl sans réseau
+# (voir bench_crawl.py). Chaque domaine est un port de 127.0.0.1 :
+#   http://127.0.0.1:{port}/page/{n}       page html, `links` liens
+#   http://127.0.0.1:{port}/doc/{n}.pdf    document (Range accepté, comme un vrai serveur)
+# Une partie des pages sont des redirections 301 (/page/n -> /moved/n) ou des
+# meta refresh (/page/n -> /refreshed/n). Les premiers domaines peuvent être lents
+# (slow_delay secondes par réponse) ou défaillants (503 sur une requête sur deux).
+# Avec sitemaps=True, chaque domaine a un robots.txt qui annonce un index de
+# sitemaps : toutes les pages (sitemap-pages.xml) et tous les documents liés
+# (sitemap-docs.xml.gz, compressé). Sinon robots.txt et sitemap.xml sont des 404.
+# Tout est déterministe pour une même graine.
+#
+#   python benchmarks/synthetic_site.py --domains 3 --pages 100
+#   (affiche les urls de départ, Ctrl-C pour arrêter)
+
+CROSS_DOMAIN_RATIO = 0.05  # part des liens de pages vers un autre domaine
+FAILURE_RATE = 0.5  # hôtes défaillants
+LAST_MODIFIED = formatdate(1_600_000_000, usegmt=True)
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+
+class QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # connexions fermées par le client avant la fin de la réponse (verify.py)
+
+
+class SyntheticSite:
+
+    def __init__(self, domains=5, pages=200, links=20, pdf_ratio=0.1, redirect_ratio=0.02,
+                 meta_refresh_ratio=0.02, slow_hosts=0, failing_hosts=0, slow_delay=0.2,
+                 pdf_size=20_000, sitemaps=False, seed=1, base_port=18000):
+        self.domains = domains
+        self.pages = pages
+        self.links = links
+        self.pdf_ratio = pdf_ratio
+        self.redirect_ratio = redirect_ratio
+        self.meta_refresh_ratio = meta_refresh_ratio
+        self.slow_hosts = slow_hosts
+        self.failing_hosts = failing_hosts
+        self.slow_delay = slow_delay
+        self.pdf_size = pdf_size
+        self.sitemaps = sitemaps
+        self.seed = seed
+        self.ports = [base_port + i for i in range(domains)]
+        self.servers = []
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def seeds(self):
+        return [f"http://127.0.0.1:{port}/page/0" for port in self.ports]
+
+    def _rng(self, domain, page):
+        return random.Random(f"{self.seed}/{domain}/{page}")
+
+    def page_kind(self, domain, page):
+        if page == 0:
+            return "page"
+        r = self._rng(domain, page).random()
+        if r < self.redirect_ratio:
+            return "redirect"
+        if r < self.redirect_ratio + self.meta_refresh_ratio:
+            return "meta_refresh"
+        return "page"
+
+    def page_links(self, domain, page):
+        rng = self._rng(domain, page)
+        rng.random()  # tirage de page_kind
+        links = []
+        for _ in range(self.links):
+            if rng.random() < self.pdf_ratio:
+                links.append(f"/doc/{rng.randrange(self.pages * 4)}.pdf")
+            elif self.domains > 1 and rng.random() < CROSS_DOMAIN_RATIO:
+                links.append(f"http://127.0.0.1:{self.ports[rng.randrange(self.domains)]}/page/{rng.randrange(self.pages)}")
+            else:
+                links.append(f"/page/{rng.randrange(self.pages)}")
+        return links
+
+    def sitemap(self, domain, name):
+        # corps du sitemap `name`, None s'il n'existe pas
+        base = f"http://127.0.0.1:{self.ports[domain]}"
+        if name == "sitemap_index.xml":
+            entries = "".join(f"<sitemap><loc>{base}/{child}</loc></sitemap>"
+                              for child in ("sitemap-pages.xml", "sitemap-docs.xml.gz"))
+            return f'<?xml version="1.0"?><sitemapindex xmlns="{SITEMAP_NS}">{entries}</sitemapindex>'.encode()
+        if name == "sitemap-pages.xml":
+            urls = [f"{base}/page/{page}" for page in range(self.pages)]
+        elif name == "sitemap-docs.xml.gz":
+            urls = sorted({
+                f"{base}{href}"
+                for page in range(self.pages)
+                for href in self.page_links(domain, page) if href.endswith(".pdf")
+            })
+        else:
+            return None
+        body = f'<?xml version="1.0"?><urlset xmlns="{SITEMAP_NS}">'
+        body += "".join(f"<url><loc>{url}</loc></url>" for url in urls) + "</urlset>"
+        return gzip.compress(body.encode()) if name.endswith(".gz") else body.encode()
+
+    def pdf(self, domain, number):
+        header = f"%PDF-1.4\n% {domain}/{number}\n".encode()
+        return header + b"0" * max(self.pdf_size - len(header), 0)
+
+    def handler(self, domain):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            wbufsize = -1  # en-têtes et corps envoyés ensemble
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def send(self, status, body=b"", content_type="text/html; charset=utf-8", headers=()):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with site.lock:
+                    site.requests += 1
+                if domain < site.slow_hosts:
+                    time.sleep(site.slow_delay)
+                if site.slow_hosts <= domain < site.slow_hosts + site.failing_hosts and random.random() < FAILURE_RATE:
+                    return self.send(503, b"unavailable")
+
+                parts = self.path.split("?")[0].strip("/").split("/")
+                if site.sitemaps and parts == ["robots.txt"]:
+                    robots = f"User-agent: *\nDisallow: /private/\n\nSitemap: http://127.0.0.1:{site.ports[domain]}/sitemap_index.xml\n"
+                    return self.send(200, robots.encode(), "text/plain")
+                if site.sitemaps and len(parts) == 1 and parts[0].startswith("sitemap"):
+                    body = site.sitemap(domain, parts[0])
+                    if body is not None:
+                        return self.send(200, body, "application/x-gzip" if parts[0].endswith(".gz") else "application/xml")
+                if len(parts) == 2 and parts[0] == "doc" and parts[1].endswith(".pdf"):
+                    return self.send_pdf(site.pdf(domain, parts[1][:-4]))
+                if len(parts) != 2 or parts[0] not in ("page", "moved", "refreshed") or not parts[1].isdigit():
+                    return self.send(404, b"not found")
+
+                page = int(parts[1])
+                kind = site.page_kind(domain, page)
+                if parts[0] == "page" and kind == "redirect":
+                    return self.send(301, headers=[("Location", f"/moved/{page}")])
+                if parts[0] == "page" and kind == "meta_refresh":
+                    body = f'<html><head><meta http-equiv="refresh" content="0; url=/refreshed/{page}"></head></html>'
+                    return self.send(200, body.encode())
+
+                links = "".join(
+                    f'<li><a href="{href}">{"Sujet" if href.endswith(".pdf") else "Page"} {i}</a></li>'
+                    for i, href in enumerate(site.page_links(domain, page))
+                )
+                body = f"<html><head><title>Page {page}</title></head><body><ul>{links}</ul></body></html>"
+                self.send(200, body.encode())
+
+            def send_pdf(self, data):
+                headers = [("Last-Modified", LAST_MODIFIED), ("Accept-Ranges", "bytes")]
+                range_header = self.headers.get("Range", "")
+                if range_header.startswith("bytes="):
+                    start, _, end = range_header[6:].partition("-")
+                    start = int(start or 0)
+                    end = min(int(end) if end else len(data) - 1, len(data) - 1)
+                    if start >= len(data):
+                        return self.send(416, headers=[("Content-Range", f"bytes */{len(data)}")])
+                    headers.append(("Content-Range", f"bytes {start}-{end}/{len(data)}"))
+                    return self.send(206, data[start:end + 1], "application/pdf", headers)
+                self.send(200, data, "application/pdf", headers)
+
+        return Handler
+
+    def start(self):
+        for domain, port in enumerate(self.ports):
+            server = QuietServer(("127.0.0.1", port), self.handler(domain))
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.servers.append(server)
+        return self
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.servers = []
+
+
+def add_site_arguments(parser):
+    parser.add_argument("--domains", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=200, help="pages par domaine")
+    parser.add_argument("--links", type=int, default=20, help="liens par page")
+    parser.add_argument("--pdf-ratio", type=float, default=0.1, help="part des liens vers des pdf")
+    parser.add_argument("--redirect-ratio", type=float, default=0.02)
+    parser.add_argument("--meta-refresh-ratio", type=float, default=0.02)
+    parser.add_argument("--slow-hosts", type=int, default=0)
+    parser.add_argument("--failing-hosts", type=int, default=0)
+    parser.add_argument("--slow-delay", type=float, default=0.2, help="secondes par réponse des hôtes lents")
+    parser.add_argument("--pdf-size", type=int, default=20_000, help="octets")
+    parser.add_argument("--sitemaps", action="store_true", help="robots.txt et sitemaps de tous les documents")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--base-port", type=int, default=18000)
+
+
+def site_from_arguments(args):
+    return SyntheticSite(
+        domains=args.domains, pages=args.pages, links=args.links, pdf_ratio=args.pdf_ratio,
+        redirect_ratio=args.redirect_ratio, meta_refresh_ratio=args.meta_refresh_ratio,
+        slow_hosts=args.slow_hosts, failing_hosts=args.failing_hosts, slow_delay=args.slow_delay,
+        pdf_size=args.pdf_size, sitemaps=args.sitemaps, seed=args.seed, base_port=args.base_port,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    add_site_arguments(parser)
+    site = site_from_arguments(parser.parse_args()).start()
+    for url in site.seeds():
+        print(url)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        site.stop()
@@ -0,0 +1,220 @@
+import os
+import re
+import fnmatch
+from urllib.parse import urlparse, urlunparse, urljoin, unquote
+
+
+# Forme canonique des urls, pour que deux urls qui désignent la même page ne
+# soient visitées (ou enregistrées) qu'une fois. Appliquée partout où une url
+# entre dans l'état du crawl : urls à visiter, urls visitées, documents.
+#
+# Règles fixes :
+#   - schéma et nom de domaine en minuscules, port par défaut retiré (:80, :443) ;
+#   - fragment (#section) retiré, segments . et .. résolus, %xx en majuscules ;
+#   - /dossier/index.html -> /dossier/ (INDEX_FILES, seulement sans paramètres) ;
+#   - ;jsessionid=... retiré du chemin ;
+#   - paramètres de suivi et de session retirés (IGNORED_QUERY_PARAMS, et le fichier
+#     de règles par domaine), les autres triés par nom. Les noms ambigus (sid, souvent
+#     l'identifiant d'un article) ne sont retirés que par le fichier, domaine par domaine.
+#
+# Règles apprises des redirections (requested -> res.url), gardées dans LEARNED_RULES_FILE :
+#   - http://x/... -> https://x/...     : x est toujours en https ;
+#   - a.fr/chemin -> www.a.fr/chemin    : a.fr est un alias de www.a.fr, après
+#                                         HOST_ALIAS_MIN_PATHS chemins différents,
+#                                         hors racine (une racine redirigée vers un
+#                                         portail ne dit rien des autres pages) ;
+#   - sinon                             : l'url demandée est un alias de l'url finale
+#                                         (par exemple /dossier -> /dossier/).
+
+IGNORED_QUERY_PARAMS = [
+    "utm_*", "fbclid", "gclid", "dclid", "msclkid", "yclid", "mc_cid", "mc_eid", "_ga", "_gl",
+    "phpsessid", "jsessionid", "sessionid", "session_id", "cfid", "cftoken", "oscsid",
+]
+INDEX_FILES = {"index.html", "index.htm", "index.php", "index.shtml", "default.htm", "default.asp", "default.aspx"}
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+HOST_ALIAS_MIN_PATHS = 2
+
+_ESCAPE = re.compile(r"%[0-9a-fA-F]{2}")
+_JSESSIONID = re.compile(r"^jsessionid=", re.IGNORECASE)
+
+
+def _param_matcher(patterns):
+    patterns = [p.lower() for p in patterns]
+    exact = {p for p in patterns if "*" not in p and "?" not in p}
+    globs = [p for p in patterns if p not in exact]
+    regex = re.compile("|".join(fnmatch.translate(g) for g in globs)) if globs else None
+    return lambda name: name in exact or (regex is not None and regex.match(name) is not None)
+
+
+class Canonicalizer:
+
+    def __init__(self, ignored_params=IGNORED_QUERY_PARAMS, domain_params=None, index_files=INDEX_FILES):
+        # domain_params : domaine -> motifs de paramètres ignorés sur ce domaine et ses sous-domaines
+        self.is_ignored_param = _param_matcher(ignored_params)
+        self.domain_params = {
+            domain.lower(): _param_matcher(params) for domain, params in (domain_params or {}).items()
+        }
+        self.index_files = set(index_files)
+        self.https_hosts = set()
+        self.host_aliases = {}
+        self.host_alias_paths = {}  # (domaine, domaine final) -> chemins redirigés, pas encore un alias
+        self.url_aliases = {}
+        self.learned_rules_file = None
+
+    # ---- règles ----
+
+    def _domain_rule(self, host):
+        while True:
+            rule = self.domain_params.get(host)
+            if rule is not None or "." not in host:
+                return rule
+            host = host.split(".", 1)[1]
+
+    def _query(self, host, query):
+        if not query:
+            return ""
+        domain_rule = self._domain_rule(host) if self.domain_params else None
+        kept = []
+        for segment in query.split("&"):
+            if not segment:
+                continue
+            name = unquote(segment.split("=", 1)[0]).lower()
+            if self.is_ignored_param(name) or (domain_rule is not None and domain_rule(name)):
+                continue
+            kept.append((segment.split("=", 1)[0], segment))
+        kept.sort(key=lambda item: item[0])  # tri stable : l'ordre des valeurs d'un même paramètre est gardé
+        return "&".join(segment for _, segment in kept)
+
+    def _path(self, path, query):
+        if not path:
+            return "/"
+        if "%" in path:
+            path = _ESCAPE.sub(lambda m: m.group(0).upper(), path)
+        if "/." in path:
+            path = urlparse(urljoin("http://h/", path)).path
+        if not query and self.index_files:
+            directory, _, last = path.rpartition("/")
+            if last.lower() in self.index_files:
+                path = directory + "/"
+        return path
+
+    def canonical_parts(self, url):
+        # renvoie (url canonique, résultat de urlparse de cette url) ; ValueError si l'url est invalide
+        parsed = urlparse(url)
+        scheme = parsed.scheme.lower()
+        if scheme not in ("http", "https"):
+            parsed = parsed._replace(fragment="")
+            return parsed.geturl(), parsed
+
+        host = (parsed.hostname or "").rstrip(".")
+        port = parsed.port
+        if parsed.hostname and ":" in parsed.hostname:
+            host = f"[{host}]"  # ipv6
+        host = self.host_aliases.get(host, host)
+        if scheme == "http" and host in self.https_hosts:
+            scheme = "https"
+        netloc = host
+        if port is not None and str(port) != DEFAULT_PORTS.get(scheme):
+            netloc = f"{host}:{port}"
+        if "@" in parsed.netloc:
+            netloc = parsed.netloc.rsplit("@", 1)[0] + "@" + netloc
+
+        params = "" if _JSESSIONID.match(parsed.params) else parsed.params
+        query = self._query(host, parsed.query)
+        path = self._path(parsed.path, query)
+        parsed = parsed._replace(scheme=scheme, netloc=netloc, path=path, params=params, query=query, fragment="")
+        return urlunparse(parsed), parsed
+
+    def canonicalize(self, url):
+        url = self.canonical_parts(url)[0]
+        return self.url_aliases.get(url, url)
+
+    # ---- apprentissage ----
+
+    def learn_redirect(self, requested_url, final_url):
+        # Renvoie True si une règle de domaine a été apprise : les urls déjà
+        # canonisées (caches) peuvent alors ne plus l'être.
+        try:
+            requested, a = self.canonical_parts(requested_url)
+            final, b = self.canonical_parts(final_url)
+        except ValueError:
+            return False
+        if requested == final or a.scheme not in ("http", "https") or b.scheme not in ("http", "https"):
+            return False
+
+        learned = False
+        if (a.path, a.params, a.query) == (b.path, b.params, b.query):
+            host_a = a.netloc
+            host_b = b.netloc
+            host_rule = host_a == host_b  # sinon, il faut un alias de domaine ou d'url
+            if (not host_rule and ":" not in host_a and ":" not in host_b and "@" not in host_a + host_b
+                    and self._confirm_host_alias(host_a, host_b, a.path)):
+                self._add_rule("host", host_a, host_b)
+                host_rule = learned = True
+            if a.scheme == "http" and b.scheme == "https" and ":" not in host_b:
+                self._add_rule("https", host_b)
+                learned = True
+            if learned and host_rule:
+                return True
+
+        if self.url_aliases.get(final) != requested:  # pas de boucle a -> b -> a
+            self._add_rule("alias", requested, final)
+        return learned
+
+    def _confirm_host_alias(self, host_a, host_b, path):
+        # un alias de domaine réécrit toutes les urls du domaine : il faut
+        # HOST_ALIAS_MIN_PATHS chemins différents, hors racine
+        if path == "/":
+            return False
+        paths = self.host_alias_paths.setdefault((host_a, host_b), set())
+        paths.add(path)
+        if len(paths) < HOST_ALIAS_MIN_PATHS:
+            return False
+        del self.host_alias_paths[(host_a, host_b)]
+        return True
+
+    def _apply_rule(self, kind, *values):
+        if kind == "host":
+            self.host_aliases[values[0]] = values[1]
+        elif kind == "https":
+            self.https_hosts.add(values[0])
+        elif kind == "alias":
+            self.url_aliases[values[0]] = values[1]
+
+    def _add_rule(self, kind, *values):
+        self._apply_rule(kind, *values)
+        if self.learned_rules_file is not None:
+            with open(self.learned_rules_file, "a", encoding="utf-8") as f:
+                f.write("\t".join((kind,) + values) + "\n")
+
+    def load_learned_rules(self, filename):
+        self.learned_rules_file = filename
+        if not os.path.exists(filename):
+            return 0
+        count = 0
+        with open(filename, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # dernière ligne tronquée par un crash
+                kind, *values = line.rstrip("\n").split("\t")
+                self._apply_rule(kind, *values)
+                count += 1
+        return count
+
+
+def load_domain_params(filename):
+    # Une ligne par règle :
+    #   ref            -> paramètre ignoré sur tous les domaines (motif glob accepté)
+    #   example.com p  -> paramètre ignoré sur example.com et ses sous-domaines
+    global_params = []
+    domain_params = {}
+    if not os.path.exists(filename):
+        return global_params, domain_params
+    with open(filename, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 1:
+                global_params.append(parts[0])
+            elif len(parts) >= 2:
+                domain_params.setdefault(parts[0].lower(), []).extend(parts[1:])
+    return global_params, domain_params
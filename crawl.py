@@ -1,32 +1,129 @@
 import os
+import sys
 import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse, parse_qs
 import csv
 import time
 from collections import defaultdict
+from functools import lru_cache
 from datetime import datetime
-import sqlite3
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from frontier import Frontier
+from link_extractor import extract_links, parse_meta_refresh
+from url_patterns import UrlMatcher
+from seen_set import FingerprintSet
+from db import init_db, connect, document_in_db
+from throttle import DomainThrottle
+from canonical import Canonicalizer, IGNORED_QUERY_PARAMS, load_domain_params
+from traps import TrapDetector
+from scoring import LinkScorer
+from metrics import metrics, start_reporting
+from page_cache import CachedPage, cached_validators, load_page, save_page, pages_to_revisit
+from archive import PageArchive, read_archive
+from robots import RobotsCache
+from sitemaps import parse_sitemap, is_sitemap_url
+from shards import Shards, SHARD_COUNT, POLL_INTERVAL, shard_of, shard_name, run_workers, check_platform
 
 
 # ---- File Paths ----
 ALLOWED_CRAWL_PATTERNS_FILE = "allowed_crawl_patterns.txt"
 BLOCKED_CRAWL_PATTERNS_FILE = "blocked_crawl_patterns.txt"
 BLOCKED_CRAWL_DOMAINS_FILE = "blocked_crawl_domains.txt"
+IGNORED_QUERY_PARAMS_FILE = "ignored_query_params.txt"
 
 STATE_DIR = "state"
 DB_PATH = os.path.join(STATE_DIR, "found_documents.db")
 BEING_VISITED_FILE = os.path.join(STATE_DIR, "urls_being_visited.txt")
 VISITED_FILE = os.path.join(STATE_DIR, "urls_visited.txt")
+VISITED_FINGERPRINTS_FILE = os.path.join(STATE_DIR, "urls_visited.fp")
 TO_VISIT_FILE = os.path.join(STATE_DIR, "urls_to_visit.txt")
 ERROR_LOG_FILE = os.path.join(STATE_DIR, "errors.log")
 UNREACHABLE_DOMAINS_FILE = os.path.join(STATE_DIR, "unreachable_domains.txt")
-
-REQUEST_DELAY = 2  # secondes
+JOURNAL_FILE = os.path.join(STATE_DIR, "journal.log")
+LEARNED_URL_RULES_FILE = os.path.join(STATE_DIR, "learned_url_rules.txt")
+YIELD_LOG_FILE = os.path.join(STATE_DIR, "yield.log")
+ARCHIVE_DIR = os.path.join(STATE_DIR, "archive")
+
+REQUEST_DELAY = 2  # secondes, délai de départ pour chaque domaine (voir throttle.py)
+MIN_REQUEST_DELAY = 1  # plancher atteint sur les domaines rapides et sans erreur
+MAX_REQUEST_DELAY = 60
+REQUEST_TIMEOUT = 10  # secondes, réduit sur les domaines rapides (throttle.timeout)
+MAX_FETCH_ATTEMPTS = 3  # par page, en cas d'erreur réseau ou de réponse 429 / 503
+RETRY_STATUS_CODES = {429, 503}
+ROBOTS_CRAWL_DELAY = True  # applique le Crawl-delay de robots.txt (robots.py)
+ROBOTS_DISALLOW = True  # ne visite pas les pages interdites par robots.txt
+SITEMAPS = True  # visite les sitemaps annoncés par robots.txt (sitemaps.py)
+SITEMAP_FALLBACK = True  # sans ligne Sitemap dans robots.txt, essaie /sitemap.xml
+SITEMAP_SCORE = 10  # frontière best-first : les sitemaps avant les pages de leur domaine
+USER_AGENT = "Mozilla/5.0 (compatible; MyCrawler/1.0)"
+ROBOTS_USER_AGENT = "MyCrawler"
 MAX_DEPTH = 3
 PDF_BATCH_SIZE = 20
-
-last_request_time = defaultdict(float)
+JOURNAL_COMPACT_EVERY = 100_000  # nombre d'entrées du journal avant réécriture complète des fichiers d'état
+JOURNAL_FSYNC = False
+# ordre de visite des pages d'un domaine, et choix du domaine parmi ceux qui sont prêts :
+# "best-first" : les pages les plus susceptibles de mener à des documents d'abord (scoring.py)
+# "fifo" : parcours en largeur, dans l'ordre de découverte
+FRONTIER = "best-first"
+YIELD_REPORT_EVERY = 100  # pages ; documents trouvés par page, affiché et ajouté à YIELD_LOG_FILE
+TRAP_DETECTION = True  # écarte les familles d'urls sans documents (calendriers...), voir traps.py
+PAGE_CACHE = True  # garde ETag/Last-Modified et les liens de chaque page pour les revisites (page_cache.py)
+ARCHIVE_PAGES = False  # garde les pages html téléchargées (archive.py), relues par --replay-archive
+REPLAY_COMMIT_EVERY = 1000  # pages relues de l'archive entre deux écritures du journal
+MAX_PAGE_SIZE = 5 * 1024 * 1024  # octets lus au maximum par page html, le reste est ignoré
+
+HTML_CONTENT_TYPES = {"text/html", "application/xhtml+xml"}
+# réponses lues comme des sitemaps si leur élément racine est <urlset> ou <sitemapindex>
+SITEMAP_CONTENT_TYPES = {"application/xml", "text/xml", "application/gzip", "application/x-gzip"}
+# types qui ne disent rien du contenu : on regarde les premiers octets
+GENERIC_CONTENT_TYPES = {"application/octet-stream", "binary/octet-stream", "application/force-download"}
+# réponses enregistrées dans found_documents (sans lire le corps) au lieu d'être analysées
+DOCUMENT_CONTENT_TYPES = {"application/pdf"}
+# débuts de fichiers qui ne sont sûrement pas du html, quel que soit le Content-Type annoncé
+BINARY_SIGNATURES = {
+    b"%PDF-": "application/pdf",
+    b"PK\x03\x04": "application/zip",
+    b"\x1f\x8b": "application/gzip",
+    b"Rar!": "application/x-rar",
+    b"7z\xbc\xaf": "application/x-7z-compressed",
+    b"\x89PNG": "image/png",
+    b"GIF8": "image/gif",
+    b"\xff\xd8\xff": "image/jpeg",
+    b"RIFF": "audio/video (riff)",
+    b"OggS": "audio/ogg",
+    b"ID3": "audio/mpeg",
+    b"\x1a\x45\xdf\xa3": "video/webm",
+    b"\xd0\xcf\x11\xe0": "application/msword",
+}
+
+# "set" : ensembles python d'urls complètes (urls_visited.txt)
+# "fingerprint" : empreintes de 64 bits (urls_visited.fp), voir seen_set.py
+SEEN_SET_BACKEND = "set"
+BLOOM_ERROR_RATE = 0.01  # None pour désactiver le filtre de Bloom
+
+canonicalizer = Canonicalizer()  # remplacé dans setup() par celui qui lit les fichiers de règles
+# partagé avec verify.py et download.py dans pipeline.py
+throttle = DomainThrottle(REQUEST_DELAY, min_delay=MIN_REQUEST_DELAY, max_delay=MAX_REQUEST_DELAY)
+robots_cache = RobotsCache(USER_AGENT, ROBOTS_USER_AGENT)
+announced_sitemaps = []  # sitemaps lus dans robots.txt par les threads du pool, programmés par crawl()
+sitemap_urls = set()  # sitemaps déjà programmés pendant cette session
+recrawling = False  # crawl.py --recrawl : les sitemaps déjà lus sont relus
+fetch_attempts = defaultdict(int)  # url -> requêtes échouées
+journal_file = None
+journal_records = 0
+# appelé avec les (id, url) des nouveaux documents après chaque écriture dans la base (voir pipeline.py)
+document_listener = None
+urls_to_revisit = set()  # pages déjà visitées, reprogrammées par --recrawl
+page_cache_stats = defaultdict(int)
+trap_detector = TrapDetector()
+link_scorer = LinkScorer()
+crawl_yield = defaultdict(int)  # pages visitées et nouveaux documents de cette session
+shard = None  # shard crawlé par ce processus (crawl.py --workers, voir shards.py)
+page_archive = None  # PageArchive si ARCHIVE_PAGES
+replaying = False  # crawl.py --replay-archive : pages relues de l'archive, sans réseau
 
 # ---- Utilities ----
 
@@ -47,40 +144,6 @@ def ensure_state_environment():
     ]:
         ensure_file(path)
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""
-      CREATE TABLE IF NOT EXISTS found_documents (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        url TEXT  NOT NULL,
-        source_url TEXT NOT NULL,
-        source_title TEXT,
-        link_extension TEXT,
-        link_text TEXT,
-        link_title TEXT,
-        link_date_added TEXT DEFAULT (datetime('now')),
-        link_date_accessed TEXT,
-        link_http_code INTEGER,
-        link_content_type TEXT,
-        link_content_length INTEGER,
-        link_last_modified TEXT,
-        doc_initial_bytes BLOB,
-        doc_date_downloaded TEXT,
-        doc_local_path TEXT,
-        doc_file_size INTEGER,
-        doc_file_name TEXT,
-        doc_checksum TEXT,
-        doc_date_created TEXT,
-        doc_author TEXT,
-        doc_title TEXT,
-        doc_producer TEXT,
-        doc_page_count INTEGER
-      )
-    """)
-    conn.commit()
-    return conn
-
 def extract_meta_author(soup):
     author_tag = soup.find("meta", attrs={"name": "author"})
     if author_tag and author_tag.get("content"):
@@ -95,59 +158,48 @@ def get_meta_refresh_redirect_url(soup, current_url):
     if not meta:
         return None
 
-    content = meta.get("content", "")
-    if not isinstance(content, str):
-        return None
-
-    parts = content.lower().split(";")
-    for part in parts:
-        part = part.strip()
-        if part.startswith("url="):
-            raw_url = part[4:].strip().strip('\'"')
-            if raw_url:
-                return urljoin(current_url, raw_url)
-
-    return None
+    return parse_meta_refresh(meta.get("content", ""), current_url)
 
 
 
 def normalize_url(url):
-    parsed = urlparse(url)
-    parsed = parsed._replace(fragment="")  # Remove #section
-    return parsed.geturl()
+    # forme canonique, voir canonical.py
+    try:
+        return canonicalizer.canonicalize(url)
+    except ValueError:
+        return url.split("#", 1)[0]  # Remove #section
+
+
+def _google_drive_download_url(parsed):
+    if "drive.google.com" in parsed.netloc and "/file/d/" in parsed.path:
+        parts = parsed.path.split("/")
+        if "d" in parts:
+            file_id_index = parts.index("d") + 1
+            if file_id_index < len(parts):
+                file_id = parts[file_id_index]
+                return f"https://drive.usercontent.google.com/download?id={file_id}&export=download"
+    return None
 
 
 def convert_google_drive_share_to_download(url):
     try:
-        parsed = urlparse(url)
-        if "drive.google.com" in parsed.netloc and "/file/d/" in parsed.path:
-            parts = parsed.path.split("/")
-            if "d" in parts:
-                file_id_index = parts.index("d") + 1
-                if file_id_index < len(parts):
-                    file_id = parts[file_id_index]
-                    return f"https://drive.usercontent.google.com/download?id={file_id}&export=download"
-        return None
+        return _google_drive_download_url(urlparse(url))
     except Exception:
         return None
 
 
-def is_probable_pdf(url):
+def _is_probable_pdf(url, parsed):
     #rajouter tests sur le 'text' : contient la chaîne "TD" ou "pdf", ou "download" ou "télécharge" ou ".pdf" ou autre ?
-    if not isinstance(url, str):
-        return False
-
-    parsed = urlparse(url)
     path = parsed.path.lower()
-    query = parse_qs(parsed.query)
     netloc = parsed.netloc.lower()
 
     if path.endswith(".pdf"):
         return True
 
-    if "download" in path and "id" in query:
+    # parse_qs seulement si nécessaire
+    if "download" in path and "id" in parse_qs(parsed.query):
         return True
-    if "plmbox.math.cnrs.fr/f/" in url and "dl" in query:
+    if "plmbox.math.cnrs.fr/f/" in url and "dl" in parse_qs(parsed.query):
         return True
     if "plmbox.math.cnrs.fr/seafhttp/f/" in url:
         return True
@@ -161,52 +213,222 @@ def is_probable_pdf(url):
     return False
 
 
+def is_probable_pdf(url):
+    if not isinstance(url, str):
+        return False
+    return _is_probable_pdf(url, urlparse(url))
+
 
-def get_file_extension(url):
-    parsed_url = urlparse(url)
-    path = parsed_url.path
+def _path_extension(path):
     _, ext = os.path.splitext(path)
     return ext[1:].lower() if ext else ""
 
+
+def get_file_extension(url):
+    return _path_extension(urlparse(url).path)
+
+
+HTML_LIKE_EXTENSIONS = {
+    'html', 'htm', 'php', 'asp', 'aspx', 'jsp', 'jspx',
+    'cgi', 'pl', 'xhtml', 'shtml', 'cfm', 'rhtml', 'erb',
+    'do', 'action', 'axd'
+}
+
 def is_probable_html(url):
-    html_like_extensions = {
-        'html', 'htm', 'php', 'asp', 'aspx', 'jsp', 'jspx',
-        'cgi', 'pl', 'xhtml', 'shtml', 'cfm', 'rhtml', 'erb',
-        'do', 'action', 'axd'
-    }
     ext = get_file_extension(url)
-    if ext in html_like_extensions:
-        return True
-    if not get_file_extension(url):
-        return True
+    return not ext or ext in HTML_LIKE_EXTENSIONS
 
-    return False
 
+# ---- Url records ----
+# Tout ce que le crawl veut savoir d'un lien (url normalisée, domaine, extension,
+# pdf ou html probable, url de téléchargement) est calculé en une seule analyse
+# de l'url, et gardé dans un cache LRU : les liens des menus, répétés sur toutes
+# les pages d'un site, ne sont analysés qu'une fois.
+# Comparaison avec l'ancienne méthode : python benchmarks/bench_url_record.py
 
+URL_RECORD_CACHE_SIZE = 100_000
 
-def fetch_with_throttle(url):
-    domain = get_domain(url)
-    elapsed = time.time() - last_request_time[domain]
-    if elapsed < REQUEST_DELAY:
-        sleep_time = REQUEST_DELAY - elapsed
-        print(f"Throttling: waiting {sleep_time:.2f}s before accessing {domain}")
-        time.sleep(sleep_time)
 
+class UrlRecord:
+    __slots__ = ("url", "domain", "extension", "is_pdf", "is_html", "document_url", "document_extension")
+
+    def __init__(self, url):
+        # url canonique, sans les alias appris des redirections (voir link_record)
+        self.url, parsed = canonicalizer.canonical_parts(url)
+        self.domain = parsed.netloc
+        self.extension = _path_extension(parsed.path)
+        self.is_pdf = _is_probable_pdf(self.url, parsed)
+        self.is_html = not self.is_pdf and (not self.extension or self.extension in HTML_LIKE_EXTENSIONS)
+        self.document_url = None
+        self.document_extension = None
+        if self.is_pdf:
+            drive_url = _google_drive_download_url(parsed)
+            self.document_url = drive_url or self.url
+            self.document_extension = _path_extension(urlparse(drive_url).path) if drive_url else self.extension
+
+
+@lru_cache(maxsize=URL_RECORD_CACHE_SIZE)
+def url_record(url):
+    # url absolue ; None si elle ne peut pas être analysée (ipv6 mal formée...)
     try:
-        res = requests.get(
-            url,
-            timeout=10,
-            headers={"User-Agent": "Mozilla/5.0 (compatible; MyCrawler/1.0)"}
-        )
-        last_request_time[domain] = time.time()
-        return res
-    except requests.RequestException as e:
-        log_error(f"Request failed for {url}: {e}")
-        last_request_time[domain] = time.time()
-        unreachable_domains.add(domain)
+        return UrlRecord(url)
+    except ValueError:
         return None
 
 
+def link_record(base_url, href):
+    # un href absolu n'a pas besoin de urljoin
+    if not href.startswith(("http://", "https://")):
+        try:
+            href = urljoin(base_url, href)
+        except ValueError:
+            return None
+    record = url_record(href)
+    if record is not None and record.url in canonicalizer.url_aliases:
+        record = url_record(canonicalizer.url_aliases[record.url])
+    return record
+
+
+
+def sniff_content_type(first_bytes):
+    for signature, content_type in BINARY_SIGNATURES.items():
+        if first_bytes.startswith(signature):
+            return content_type
+    if first_bytes[4:8] == b"ftyp":
+        return "video/mp4"
+    return None
+
+
+def read_page(res):
+    # Décide au vu des en-têtes puis des premiers octets si la réponse est une page
+    # html, avant d'en lire la suite. Renvoie (type, contenu) :
+    #   ("html", octets lus, au plus MAX_PAGE_SIZE)
+    #   ("document", None) : à enregistrer dans found_documents, corps non lu
+    #   ("sitemap", (index, urls)) : sitemap lu au fil du téléchargement, voir sitemaps.py
+    #   ("other", None)    : ignoré, corps non lu
+    #   ("not_modified", None) : réponse 304, la page du cache est réutilisée
+    if res.status_code == 304:
+        return "not_modified", None
+    content_type = res.headers.get("Content-Type", "").split(";")[0].strip().lower()
+    if content_type in DOCUMENT_CONTENT_TYPES:
+        return "document", None
+    if SITEMAPS and (content_type in SITEMAP_CONTENT_TYPES or
+                     (not content_type or content_type in GENERIC_CONTENT_TYPES) and is_sitemap_url(res.url)):
+        sitemap = parse_sitemap(res.iter_content(chunk_size=65536), res.url)
+        if sitemap is not None:
+            return "sitemap", sitemap
+        print(f"[NOT HTML] {content_type or 'no content type'}: {res.url}")
+        return "other", None
+    if content_type and content_type not in HTML_CONTENT_TYPES and content_type not in GENERIC_CONTENT_TYPES:
+        print(f"[NOT HTML] {content_type}: {res.url}")
+        return "other", None
+    content_length = res.headers.get("Content-Length", "")
+    if content_type not in HTML_CONTENT_TYPES and content_length.isdigit() and int(content_length) > MAX_PAGE_SIZE:
+        # type inconnu et trop gros pour être une page : une page html trop grosse
+        # est au contraire lue jusqu'à MAX_PAGE_SIZE
+        print(f"[TOO LARGE] {int(content_length) / 1e6:.1f} MB: {res.url}")
+        return "other", None
+
+    chunks = res.iter_content(chunk_size=65536)
+    first_chunk = next(chunks, b"")
+    sniffed_type = sniff_content_type(first_chunk)
+    if sniffed_type in DOCUMENT_CONTENT_TYPES:
+        return "document", None
+    if sniffed_type:
+        print(f"[NOT HTML] {sniffed_type} (sniffed): {res.url}")
+        return "other", None
+    if content_type in GENERIC_CONTENT_TYPES:
+        print(f"[NOT HTML] {content_type}: {res.url}")
+        return "other", None
+
+    content = [first_chunk]
+    size = len(first_chunk)
+    for chunk in chunks:
+        content.append(chunk)
+        size += len(chunk)
+        if size >= MAX_PAGE_SIZE:
+            print(f"[TRUNCATED] Only the first {MAX_PAGE_SIZE / 1e6:.1f} MB are parsed: {res.url}")
+            break
+    return "html", b"".join(content)[:MAX_PAGE_SIZE]
+
+
+def fetch_with_throttle(url, validators=None):
+    # exécuté dans un thread du pool ; renvoie (réponse, type, contenu), voir read_page
+    # validators : (etag, last_modified) de la page en cache, pour une requête conditionnelle
+    headers = {"User-Agent": USER_AGENT}
+    if validators is not None:
+        etag, last_modified = validators
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+    domain = get_domain(url)
+    if ROBOTS_DISALLOW or ROBOTS_CRAWL_DELAY or SITEMAPS:
+        robots = robots_cache.get(domain) or read_robots(url, domain)
+        if robots.unavailable:
+            # robots.txt injoignable : la page est reportée, sans compter comme un échec,
+            # et le domaine n'est de nouveau prêt que quand robots.txt sera relu
+            # (hôte en panne : visit_page le marque injoignable)
+            if not throttle.is_dead(domain):
+                throttle.defer(domain, robots.expires - time.time())
+            return None, "deferred", None
+        if ROBOTS_DISALLOW and not robots.allowed(url):
+            print(f"[ROBOTS] Disallowed: {url}")
+            return None, "disallowed", None
+
+    sleep_time = throttle.wait_time(domain)
+    if sleep_time:
+        print(f"Throttling: waiting {sleep_time:.2f}s before accessing {domain}")
+
+    wait_start = time.perf_counter()
+    with throttle.slot(domain):
+        metrics.observe("crawl_throttle_wait_seconds", time.perf_counter() - wait_start)
+        start = time.perf_counter()
+        try:
+            with requests.get(
+                url,
+                timeout=throttle.timeout(domain, REQUEST_TIMEOUT),
+                stream=True,
+                headers=headers
+            ) as res:
+                throttle.record_response(domain, res)
+                metrics.count("crawl_responses_total", status=res.status_code)
+                if res.status_code in RETRY_STATUS_CODES:
+                    print(f"[HTTP {res.status_code}] {url}")
+                    return res, "retry", None
+                kind, content = read_page(res)
+                return res, kind, content
+        except requests.RequestException as e:
+            if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+                throttle.record_failure(domain)
+            metrics.count("crawl_fetch_errors_total", domain=domain)
+            log_error(f"Request failed for {url}: {e}")
+            return None, None, None
+        finally:
+            metrics.observe("crawl_fetch_seconds", time.perf_counter() - start, domain=domain)
+
+
+def read_robots(url, domain):
+    # robots.txt du domaine, lu au premier accès puis toutes les ROBOTS_TTL secondes
+    # (exécuté dans un thread du pool) : Crawl-delay appliqué par le throttle,
+    # sitemaps programmés par crawl(). robots.unavailable si robots.txt n'a pas pu être lu.
+    scheme = urlparse(url).scheme
+    robots = robots_cache.fetch(throttle, scheme, domain, REQUEST_TIMEOUT)
+    if robots.unavailable:
+        return robots
+    if ROBOTS_CRAWL_DELAY and robots.crawl_delay:
+        print(f"[INFO] Crawl-delay {robots.crawl_delay}s for {domain}")
+        throttle.set_crawl_delay(domain, robots.crawl_delay)
+    if SITEMAPS:
+        if robots.sitemaps:
+            announced_sitemaps.extend(robots.sitemaps)
+        elif SITEMAP_FALLBACK:
+            announced_sitemaps.append(f"{scheme}://{domain}/sitemap.xml")
+    return robots
+
+
+
 
 def log_error(message):
     timestamp = time.strftime("[%Y-%m-%d %H:%M:%S]")
@@ -237,9 +459,11 @@ def load_set(filename):
         return set(line.strip() for line in f if line.strip())
 
 def save_set(s, filename):
-    with open(filename, "w") as f:
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "w") as f:
         for item in sorted(s):
             f.write(f"{item}\n")
+    os.replace(tmp_filename, filename)
 
 def load_to_visit(filename):
     if not os.path.exists(filename):
@@ -259,12 +483,155 @@ def save_to_visit(lst, filename):
             f.write(f"{url}|{depth}\n")
     os.replace(tmp_filename, filename)
 
+def new_seen_set(path=None):
+    if SEEN_SET_BACKEND == "fingerprint":
+        return FingerprintSet(path, bloom_error_rate=BLOOM_ERROR_RATE)
+    return set()
+
+def load_visited():
+    if SEEN_SET_BACKEND != "fingerprint":
+        if os.path.exists(VISITED_FINGERPRINTS_FILE):
+            print(f"[WARN] {VISITED_FINGERPRINTS_FILE} exists but is ignored, {VISITED_FILE} may be out of date")
+        # les urls visitées avant la forme canonique (ou une nouvelle règle) sont converties
+        return {normalize_url(url) for url in load_set(VISITED_FILE)}
+
+    if os.path.exists(VISITED_FINGERPRINTS_FILE):
+        return new_seen_set(VISITED_FINGERPRINTS_FILE)
+
+    # première utilisation : conversion de urls_visited.txt, sous forme canonique
+    # comme avec le backend "set"
+    visited = new_seen_set()
+    with open(VISITED_FILE, "r") as f:
+        for line in f:
+            if line.strip():
+                visited.add(normalize_url(line.strip()))
+    visited.save(VISITED_FINGERPRINTS_FILE)
+    print(f"[INFO] Converted {len(visited)} visited urls to {VISITED_FINGERPRINTS_FILE}")
+    return visited
+
+def save_visited(visited):
+    if isinstance(visited, FingerprintSet):
+        visited.save(VISITED_FINGERPRINTS_FILE)
+        stats = visited.stats()
+        print(f"[INFO] Visited set: {stats['entries']} urls, "
+              f"{stats['memory_bytes'] / 1e6:.1f} MB in memory + {stats['mapped_bytes'] / 1e6:.1f} MB mapped, "
+              f"{stats['lookups']} lookups ({stats['lookups_per_second']:.0f}/s), "
+              f"{stats['bloom_rejections']} rejected by the Bloom filter")
+    else:
+        save_set(visited, VISITED_FILE)
+
 def save_state_to_files():
     save_to_visit(urls_to_visit, TO_VISIT_FILE)
-    save_set(urls_already_visited, VISITED_FILE)
+    save_visited(urls_already_visited)
     save_set(urls_being_visited, BEING_VISITED_FILE)
     save_set(unreachable_domains,UNREACHABLE_DOMAINS_FILE)
 
+
+# ---- Journal ----
+# Chaque modification de l'état est ajoutée à JOURNAL_FILE (une ligne "op\tvaleur").
+# Les fichiers d'état complets ne sont réécrits qu'au moment de la compaction.
+# Le rejeu est idempotent : si on plante entre la réécriture des fichiers et la
+# troncature du journal, rejouer le journal sur les nouveaux fichiers ne change rien.
+
+def journal_record(op, value):
+    global journal_records
+    journal_file.write(f"{op}\t{value}\n")
+    journal_records += 1
+
+def journal_commit():
+    if shard is not None:
+        # avant le journal : après un crash, la page est recrawlée et ses liens renvoyés
+        shard.flush_outbox()
+    journal_file.flush()
+    if JOURNAL_FSYNC:
+        os.fsync(journal_file.fileno())
+    if journal_records >= JOURNAL_COMPACT_EVERY:
+        compact_state()
+
+def compact_state():
+    global journal_file, journal_records
+    with metrics.timer("crawl_state_save_seconds"):
+        save_state_to_files()
+    if journal_file is not None:
+        journal_file.close()
+    journal_file = open(JOURNAL_FILE, "w", encoding="utf-8")
+    journal_records = 0
+
+def replay_journal(filename, to_visit, visited, being_visited, unreachable):
+    # to_visit est un dict url -> depth (ordonné), pour que le rejeu soit idempotent
+    if not os.path.exists(filename):
+        return 0
+    count = 0
+    with open(filename, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break  # dernière ligne tronquée par un crash
+            op, _, value = line.rstrip("\n").partition("\t")
+            if not value:
+                continue
+            if op == "+todo":
+                url, depth = value.rsplit("|", 1)
+                to_visit.setdefault(url, int(depth))
+            elif op == "-todo":
+                to_visit.pop(value, None)
+            elif op == "+visiting":
+                being_visited.add(value)
+            elif op == "-visiting":
+                being_visited.discard(value)
+            elif op == "+visited":
+                visited.add(value)
+            elif op == "+unreachable":
+                unreachable.add(value)
+            count += 1
+    return count
+
+def load_state():
+    global unreachable_domains, urls_being_visited, urls_already_visited
+    global urls_to_visit
+
+    unreachable_domains = load_set(UNREACHABLE_DOMAINS_FILE)
+    urls_being_visited = load_set(BEING_VISITED_FILE)
+    urls_already_visited = load_visited()
+    to_visit = {}
+    for url, depth in load_to_visit(TO_VISIT_FILE):
+        to_visit.setdefault(url, depth)
+
+    replayed = replay_journal(JOURNAL_FILE, to_visit, urls_already_visited, urls_being_visited, unreachable_domains)
+    if replayed:
+        print(f"[INFO] Replayed {replayed} journal entries")
+
+    urls_to_visit = Frontier(get_domain, domain_ready_time, priority=FRONTIER == "best-first")
+    for url, depth in to_visit.items():
+        url = normalize_url(url)
+        urls_to_visit.push(url, depth, link_scorer.score(url, depth))
+    compact_state()
+
+def schedule_url(url, depth, score=0.0):
+    # score : utilisé seulement par la frontière best-first
+    if shard is not None:
+        domain = get_domain(url)
+        if not shard.owns(domain):
+            shard.route(url, domain, depth, score)
+            metrics.count("crawl_routed_urls_total")
+            return
+    if urls_to_visit.push(url, depth, score):
+        journal_record("+todo", f"{url}|{depth}")
+
+def mark_being_visited(url):
+    urls_being_visited.add(url)
+    journal_record("+visiting", url)
+
+def mark_visited(url):
+    urls_already_visited.add(url)
+    urls_being_visited.discard(url)
+    journal_record("+visited", url)
+    journal_record("-visiting", url)
+
+def mark_unreachable(domain):
+    if domain not in unreachable_domains:
+        unreachable_domains.add(domain)
+        journal_record("+unreachable", domain)
+
 def append_pdf_info_batch(batch, pdf_url, extension, anchor_text, anchor_title, source_url, source_title):
     batch.append((
         pdf_url,
@@ -278,9 +645,10 @@ def append_pdf_info_batch(batch, pdf_url, extension, anchor_text, anchor_title,
 def flush_pdf_info_batch(db_conn, batch):
     if not batch:
         return
+    start = time.perf_counter()
 
     sql = """
-      INSERT INTO found_documents (
+      INSERT OR IGNORE INTO found_documents (
         url,
         link_extension,
         link_text,
@@ -293,8 +661,19 @@ def flush_pdf_info_batch(db_conn, batch):
     cur = db_conn.cursor()
     cur.executemany(sql, batch)
     db_conn.commit()
-    print(f"Committed {len(batch)} new entries.")
+    if document_listener is not None and cur.rowcount:
+        placeholders = ",".join("?" * len(batch))
+        document_listener(db_conn.execute(
+            f"SELECT id, url FROM found_documents WHERE link_http_code IS NULL AND url IN ({placeholders})",
+            [row[0] for row in batch],
+        ).fetchall())
+    ignored = len(batch) - cur.rowcount
+    if ignored:
+        print(f"Committed {cur.rowcount} new entries ({ignored} already in database).")
+    else:
+        print(f"Committed {cur.rowcount} new entries.")
     batch.clear()
+    metrics.observe("crawl_db_flush_seconds", time.perf_counter() - start)
 
 
 
@@ -309,182 +688,702 @@ def is_url_allowed(url):
     # attention utilise les variables globales.
     # si la liste allowed domaines est vide, on autorise
     # pas ultra sécurisé
-    if len(allowed_crawl_patterns) == 0:
+    if len(allowed_crawl_matcher) == 0:
         return True
-    return any(pattern.strip().lower() in url for pattern in allowed_crawl_patterns)
+    return allowed_crawl_matcher.matches(url)
 
-def is_url_blocked(url):
+def is_url_blocked(url, domain=None):
     # attention utilise les variables globales.
-    # blocage de pattern et de domaines
-    for pattern in blocked_crawl_patterns:
-        pattern = pattern.strip().lower()
-        if pattern and pattern in url:
-            return True
+    # blocage de pattern et de domaines, compilés au chargement (voir url_patterns.py)
+    return blocked_crawl_matcher.matches(url, get_domain(url) if domain is None else domain)
 
-    domain = get_domain(url).lower()
-    return domain in blocked_crawl_domains
 
-
-def is_eligible_for_crawl(url):
+def is_eligible_for_crawl(url, revisit=False, domain=None):
     # attention utilise les variables globales.
-    domain = get_domain(url)
+    # revisit : page reprogrammée par --recrawl, déjà visitée
+    # domain : déjà connu (UrlRecord), évite de réanalyser l'url
+    if domain is None:
+        domain = get_domain(url)
     if domain in unreachable_domains:
         print(f"[SKIPPED] Domain marked as unreachable: {url}")
         return False
-    if is_url_blocked(url):
+    if is_url_blocked(url, domain):
         print(f"[BLOCKED] {url}")
         return False
     if not is_url_allowed(url):
         print(f"[NOT ALLOWED] {url}")
         return False
-    if url in urls_already_visited:
+    if url in urls_already_visited and not revisit:
         print(f"[SKIPPED] Already visited: {url}")
         return False
     if url in urls_being_visited:
         print(f"[SKIPPED] Already being visited: {url}")
         return False
-    if url in urls_to_visit_set:
+    if url in urls_to_visit:
         print(f"[SKIPPED] Already scheduled : {url}")
         return False
 
     return True
 
-def get_next_url_to_visit():
-    now = time.time()
-    for i, (candidate_url, candidate_depth) in enumerate(urls_to_visit):
-        sanitized_url = normalize_url(candidate_url)
-        domain = get_domain(sanitized_url)
-        elapsed = now - last_request_time[domain]
-
-        if elapsed >= REQUEST_DELAY:
-            urls_to_visit.pop(i)
-            urls_to_visit_set.discard(candidate_url)
-            return sanitized_url, int(candidate_depth)
-
-    return None, None
-
-
+def domain_ready_time(domain):
+    return throttle.ready_time(domain)
 
+def get_next_url_to_visit():
+    # renvoie (url, profondeur, domaine) ; le domaine est celui de la frontière,
+    # à libérer avec urls_to_visit.release()
+    while True:
+        entry = urls_to_visit.pop(time.time())
+        if entry is None:
+            return None, None, None
+
+        candidate_url, candidate_depth, domain = entry
+        journal_record("-todo", candidate_url)
+        url = normalize_url(candidate_url)
+        if get_domain(url) == domain:
+            return url, int(candidate_depth), domain
+        # url rangée avant qu'une redirection permanente n'apprenne un alias de
+        # domaine (a.fr -> www.a.fr) : elle rejoint la file du domaine réellement
+        # visité, pour que la frontière et le throttle parlent du même hôte
+        urls_to_visit.release(domain)
+        schedule_url(url, int(candidate_depth), link_scorer.score(url, int(candidate_depth)))
+
+
+
+
+def add_document(db_conn, url, text, title, source_url, source_title, extension=None):
+    # added_documents : cette session (y compris le batch pas encore écrit),
+    # la base (index unique sur url) : les sessions précédentes,
+    # et en crawl réparti la base partagée : les autres shards
+    if url in added_documents or document_in_db(db_conn, url) or (shard is not None and shard.document_known(url)):
+        print(f"Document {url} already in added to databse")
+        return
+    if extension is None:
+        extension = get_file_extension(url)
+    append_pdf_info_batch(pdf_batch, url, extension, text, title, source_url, source_title)
+    added_documents.add(url)
+    crawl_yield["documents"] += 1
+    metrics.count("crawl_documents_added_total")
+    print(f"[ADDED] {url}. Batch length : {len(pdf_batch)}")
+    if len(pdf_batch) >= PDF_BATCH_SIZE:
+        flush_pdf_info_batch(db_conn, pdf_batch)
 
-def crawl():
 
-    db_conn = init_db()
+def visit_page(db_conn, current_url, current_depth, fetched):
+    # Renvoie True si la page est à réessayer plus tard (voir retry_later).
+    res, kind, content = fetched
+    requested_url = current_url
+    metrics.count("crawl_pages_total", kind=kind or "error")
+    if kind == "disallowed":
+        return False
+    if res is None or kind in ("retry", "deferred"):
+        domain = get_domain(current_url)
+        if throttle.is_dead(domain):
+            print(f"[UNREACHEABLE] {current_url}")
+            mark_unreachable(domain)
+            return False
+        if kind == "deferred":
+            print(f"[DEFERRED] robots.txt unavailable: {current_url}")
+            return True  # reprogrammée, sans compter de tentative
+        fetch_attempts[current_url] += 1
+        if fetch_attempts[current_url] < MAX_FETCH_ATTEMPTS:
+            return True
+        print(f"[FAILED] Giving up after {MAX_FETCH_ATTEMPTS} attempts: {current_url}")
+        return False
 
-    try:
-        while urls_to_visit:
-            now = time.time()
+    redirected_url = normalize_url(res.url) # éventuel redirect http :
+    if redirected_url != current_url:
+        # redirection permanente : on retient l'équivalence pour les prochaines urls
+        if res.history and all(r.status_code in (301, 308) for r in res.history):
+            if canonicalizer.learn_redirect(current_url, res.url):
+                url_record.cache_clear()
+        if not is_eligible_for_crawl(redirected_url):
+            return
+        mark_visited(redirected_url)
+        current_url = redirected_url
+
+    if kind == "sitemap":
+        visit_sitemap(db_conn, current_url, current_depth, *content)
+        return
+    if kind == "document":
+        # lien qui ne ressemblait pas à un document (pas d'extension .pdf...) :
+        # la page qui le contient n'est plus connue, on met l'url elle-même comme source
+        add_document(db_conn, current_url, "[no text]", None, current_url, None)
+        return
+    if kind == "not_modified":
+        page = load_page(db_conn, current_url)
+        page_cache_stats["not_modified"] += 1
+        if page is None:
+            return
+        save_page(db_conn, current_url, current_depth, res, page, not_modified=True)
+    elif kind != "html":
+        return
+    else:
+        # même encodage que res.text
+        encoding = res.encoding or requests.compat.chardet.detect(content)["encoding"]
+        with metrics.timer("crawl_parse_seconds"):
+            page = extract_links([content], encoding)
+        # pas de cache pour les pages redirigées : la requête conditionnelle porterait sur une autre url,
+        # ni pour les pages relues de l'archive : elles n'ont pas été revisitées
+        if PAGE_CACHE and current_url == requested_url and not replaying:
+            changed = save_page(db_conn, current_url, current_depth, res, CachedPage.from_page(page))
+            page_cache_stats["changed" if changed else "unchanged"] += 1
+
+    redirect_url = page.meta_refresh_url(current_url)
+    if redirect_url:
+        if is_eligible_for_crawl(redirect_url):
+            print(f"[FOLLOW] {redirect_url}")
+            redirect_url = normalize_url(redirect_url)
+            schedule_url(redirect_url, current_depth, link_scorer.score(redirect_url, current_depth))
+        return  # skip
+
+
+    source_title = page.title.strip() if page.title else None
+
+    links = []
+    for href, text, title in page.links:
+        record = link_record(current_url, href.strip())
+        if record is not None:
+            links.append((record, text, title))
+
+    metrics.count("crawl_links_total", len(links))
+    # liens vers des documents, y compris ceux déjà connus : rendement de la page
+    documents = sum(1 for record, _, _ in links if record.is_pdf)
+    link_scorer.record_page(get_domain(current_url), documents)
+
+    if TRAP_DETECTION:
+        link_urls = {record.url for record, _, _ in links}
+        similar_url = trap_detector.near_duplicate(current_url, get_domain(current_url), link_urls)
+        if similar_url:
+            print(f"[NEAR DUPLICATE] {current_url} has almost the same links as {similar_url}")
+        trap_detector.record_visit(current_url, documents, similar_url is not None)
+
+    for record, text, title in links:
+        url = record.url
+
+        text = text.strip() or "[no text]"
+
+        with metrics.timer("crawl_eligibility_seconds"):
+            eligible = is_eligible_for_crawl(url, domain=record.domain)
+        if not eligible:
+            continue
+
+        if record.is_pdf:
+            add_document(db_conn, record.document_url, text, title, current_url, source_title, record.document_extension)
+        elif record.is_html:
+            if TRAP_DETECTION:
+                reason = trap_detector.check(url)
+                if reason:
+                    print(f"[TRAP] {reason}: {url}")
+                    continue
+            score = link_scorer.score(url, current_depth + 1, record.domain, text, title, documents)
+            print(f"[SCHEDULED] {url}")
+            schedule_url(url, current_depth + 1, score)
+
+
+def visit_sitemap(db_conn, sitemap_url, depth, is_index, urls):
+    # Les documents listés vont directement dans found_documents, les pages dans la
+    # frontière (profondeur depth + 1), les sitemaps d'un index sont programmés à
+    # la même profondeur que l'index.
+    counts = defaultdict(int)
+    for loc in urls:
+        record = link_record(sitemap_url, loc)
+        if record is None:
+            continue
+        if is_index:
+            schedule_sitemap(record.url, depth)
+            counts["sitemaps"] += 1
+            continue
+        if not is_eligible_for_crawl(record.url, domain=record.domain):
+            continue
+        if record.is_pdf:
+            add_document(db_conn, record.document_url, "[no text]", None, sitemap_url, None, record.document_extension)
+            counts["documents"] += 1
+        elif record.is_html:
+            if TRAP_DETECTION:
+                reason = trap_detector.check(record.url)
+                if reason:
+                    print(f"[TRAP] {reason}: {record.url}")
+                    continue
+            schedule_url(record.url, depth + 1, link_scorer.score(record.url, depth + 1, record.domain))
+            counts["pages"] += 1
+    for kind, count in counts.items():
+        metrics.count("crawl_sitemap_urls_total", count, kind=kind)
+    print(f"[SITEMAP] {len(urls)} urls in {sitemap_url}: {counts['documents']} documents, "
+          f"{counts['pages']} pages and {counts['sitemaps']} sitemaps")
+
+
+def schedule_sitemap(url, depth=0):
+    # Sitemap annoncé par robots.txt ou listé dans un index : visité comme une page
+    # (politesse, journal, urls visitées, motifs autorisés et bloqués), une fois par
+    # session au plus.
+    url = normalize_url(url)
+    if url in sitemap_urls:
+        return
+    sitemap_urls.add(url)
+    if url in urls_already_visited:
+        if not recrawling:
+            return
+        urls_to_revisit.add(url)  # de nouveaux documents ont pu y être ajoutés
+    elif url in urls_being_visited or url in urls_to_visit:
+        return
+    if not is_url_allowed(url) or is_url_blocked(url) or get_domain(url) in unreachable_domains:
+        return
+    print(f"[SITEMAP] Scheduled {url}")
+    schedule_url(url, depth, SITEMAP_SCORE)
 
-            current_url, current_depth = get_next_url_to_visit()
 
-            if current_url is None:
-                print("[WAITING 0.1s]")
-                time.sleep(0.1)
-                continue
+def schedule_announced_sitemaps():
+    while announced_sitemaps:
+        schedule_sitemap(announced_sitemaps.pop())
 
-            if current_depth > MAX_DEPTH:
-                print("[SKIP] Max depth")
-                continue
 
-            if not is_eligible_for_crawl(current_url):
-                continue
+def crawl(concurrency=1):
+    # Les téléchargements sont faits par un pool de `concurrency` threads, un seul
+    # par domaine à la fois (voir Frontier.release). Tout le reste (analyse des pages,
+    # état, base de données) reste dans le thread principal.
 
+    db_conn = init_db(DB_PATH)
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+    in_flight = {}  # future -> (url, depth, domain)
+    stopping = False  # crawl réparti : le shard est rendu une fois les pages en cours terminées
 
-            urls_being_visited.add(current_url)
-            # save state ?
-            print(f"- - - - - Crawling (depth {current_depth}): {current_url}")
-            try:
-                res = fetch_with_throttle(current_url)
-                if res is None:
-                    print(f"[UNREACHEABLE] {current_url}")
-                    unreachable_domains.add(domain)
+    try:
+        while True:
+            if shard is not None and shard.poll_due():
+                receive_routed_urls()
+                if shard.merge_due():
+                    shard.merge_documents(db_conn)
+                stopping = stopping or shard.should_yield()
+            if not urls_to_visit and not in_flight:
+                # dernière lecture de l'inbox avant de s'arrêter
+                if shard is None or not receive_routed_urls():
+                    break
+
+            while len(in_flight) < concurrency and not stopping:
+                current_url, current_depth, domain = get_next_url_to_visit()
+                if current_url is None:
+                    break
+
+                if current_depth > MAX_DEPTH:
+                    print("[SKIP] Max depth")
+                    urls_to_visit.release(domain)
                     continue
 
-                current_url = normalize_url(res.url) # éventuel redirect http :
-                if not is_eligible_for_crawl(current_url):
+                revisit = current_url in urls_to_revisit
+                urls_to_revisit.discard(current_url)
+                if not is_eligible_for_crawl(current_url, revisit=revisit):
+                    urls_to_visit.release(domain)
                     continue
 
-                soup = BeautifulSoup(res.text, "html.parser")
-
-                redirect_url = get_meta_refresh_redirect_url(soup, current_url)
-                if redirect_url:
-                    if is_eligible_for_crawl(redirect_url):
-                        print(f"[FOLLOW] {redirect_url}")
-                        urls_to_visit.append((normalize_url(redirect_url), str(current_depth)))
-                        urls_to_visit_set.add(normalize_url(redirect_url))
-                        urls_already_visited.add(current_url)
-                        urls_being_visited.discard(current_url)
-                    continue  # skip 
-
-                
-                source_title = soup.title.string.strip() if soup.title and soup.title.string else None
-
-                for link in soup.find_all("a", href=True):
-                    href = link["href"].strip()
-                    full_url = urljoin(current_url, href)
-                    url = normalize_url(full_url)
-                    
-                    text = link.text.strip() or "[no text]"
-                    title = link.get("title", None)
-
-                    if not is_eligible_for_crawl(url):
-                        continue
-
-                    if url in added_documents:
-                        print(f"Document {url} already in added to databse")
-                        continue
-
-                    if is_probable_pdf(url):
-                        if convert_google_drive_share_to_download(url):
-                            url = convert_google_drive_share_to_download(url)
-                        append_pdf_info_batch(pdf_batch, url, get_file_extension(url), text, title, current_url, source_title)
-                        added_documents.add(url)
-                        print(f"[ADDED] {url}. Batch length : {len(pdf_batch)}")
-                        if len(pdf_batch) >= PDF_BATCH_SIZE:
-                            flush_pdf_info_batch(db_conn, pdf_batch)
-                    elif is_probable_html(url):
-                        print(f"[SCHEDULED] {url}")
-                        urls_to_visit.append((url, str(current_depth + 1)))
-                        urls_to_visit_set.add(url)
-      
-
+                if TRAP_DETECTION and not revisit and trap_detector.is_suppressed(current_url):
+                    print(f"[TRAP] Family suppressed: {current_url}")
+                    urls_to_visit.release(domain)
+                    continue
 
+                validators = cached_validators(db_conn, current_url) if PAGE_CACHE and revisit else None
+                mark_being_visited(current_url)
+                print(f"- - - - - {'Revisiting' if revisit else 'Crawling'} (depth {current_depth}): {current_url}")
+                future = pool.submit(fetch_with_throttle, current_url, validators)
+                in_flight[future] = (current_url, current_depth, domain)
+
+            metrics.gauge("crawl_in_flight", len(in_flight))
+            next_ready_time = urls_to_visit.next_ready_time()
+            if not in_flight:
+                if next_ready_time is None or stopping:
+                    break
+                # on dort exactement jusqu'à ce que le prochain domaine soit prêt
+                # (en crawl réparti, au plus POLL_INTERVAL : l'inbox peut recevoir des urls)
+                wait_time = max(next_ready_time - time.time(), 0)
+                if shard is not None:
+                    wait_time = min(wait_time, POLL_INTERVAL)
+                print(f"[WAITING {wait_time:.2f}s]")
+                time.sleep(wait_time)
+                continue
 
-            except Exception as e:
-                log_error(f"Error visiting {current_url}: {e}")
-            finally:
-                flush_pdf_info_batch(db_conn, pdf_batch) #à la fin de chaque page
-                urls_already_visited.add(current_url)
-                urls_being_visited.discard(current_url)
-                save_state_to_files()
+            timeout = None
+            if len(in_flight) < concurrency and next_ready_time is not None:
+                timeout = max(next_ready_time - time.time(), 0)
+            if shard is not None:
+                timeout = min(timeout if timeout is not None else POLL_INTERVAL, POLL_INTERVAL)
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                current_url, current_depth, domain = in_flight.pop(future)
+                retry = False
+                try:
+                    fetched = future.result()
+                    res, kind, content = fetched
+                    if page_archive is not None and kind == "html":
+                        page_archive.write(db_conn, normalize_url(res.url), current_url, current_depth, res, content)
+                    retry = visit_page(db_conn, current_url, current_depth, fetched)
+                except Exception as e:
+                    log_error(f"Error visiting {current_url}: {e}")
+                finally:
+                    schedule_announced_sitemaps()
+                    flush_pdf_info_batch(db_conn, pdf_batch) #à la fin de chaque page
+                    db_conn.commit()  # page_cache
+                    if retry:
+                        retry_later(current_url, current_depth)
+                    else:
+                        mark_visited(current_url)
+                    urls_to_visit.release(domain)
+                    journal_commit()
+                    crawl_yield["pages"] += 1
+                    if crawl_yield["pages"] % YIELD_REPORT_EVERY == 0:
+                        report_yield()
 
     finally:
         # par exemple en cas d'interruption au clavier
+        pool.shutdown(wait=False, cancel_futures=True)
         flush_pdf_info_batch(db_conn, pdf_batch)
+        db_conn.commit()
         db_conn.close()
-        save_state_to_files()
-
+        if page_archive is not None:
+            page_archive.close()
+        compact_state()
+        if crawl_yield["pages"] % YIELD_REPORT_EVERY:
+            report_yield()
+        for line in trap_detector.report():
+            print(f"[INFO] Traps: {line}")
+        if page_cache_stats:
+            print(f"[INFO] Page cache: {page_cache_stats['not_modified']} not modified (304), "
+                  f"{page_cache_stats['unchanged']} unchanged, {page_cache_stats['changed']} new or changed")
+
+
+def retry_later(url, depth):
+    # Échec passager (erreur réseau, 429, 503) ou page reportée (robots.txt injoignable) :
+    # la page est reprogrammée. Son domaine n'est de nouveau prêt qu'après le délai
+    # du throttle (Retry-After, coupe-circuit, throttle.defer).
+    urls_being_visited.discard(url)
+    journal_record("-visiting", url)
+    if url in urls_already_visited:
+        urls_to_revisit.add(url)
+    if fetch_attempts[url]:
+        print(f"[RETRY LATER] Attempt {fetch_attempts[url]}/{MAX_FETCH_ATTEMPTS} failed: {url}")
+    schedule_url(url, depth, link_scorer.score(url, depth) - fetch_attempts[url])
+
+
+def replay_archive():
+    # Hors ligne : chaque page de l'archive (sa dernière version) repasse par
+    # l'extraction des liens, les règles et l'ajout des documents, comme si elle
+    # venait d'être téléchargée. Les nouveaux documents sont ajoutés à la base, les
+    # nouvelles pages à visiter (motifs élargis...) sont programmées pour le prochain crawl.
+    db_conn = init_db(DB_PATH)
+    read_conn = connect(DB_PATH)  # lecture de l'index pendant les écritures (WAL)
+    pages = skipped = 0
+    start = time.perf_counter()
+    try:
+        for url, depth, res, content in read_archive(read_conn, ARCHIVE_DIR):
+            url = normalize_url(res.url)
+            if depth > MAX_DEPTH or is_url_blocked(url) or not is_url_allowed(url):
+                skipped += 1
+                continue
+            try:
+                visit_page(db_conn, url, depth, (res, "html", content))
+            except Exception as e:
+                log_error(f"Error replaying {url}: {e}")
+            pages += 1
+            if pages % REPLAY_COMMIT_EVERY == 0:
+                flush_pdf_info_batch(db_conn, pdf_batch)
+                journal_commit()
+                print(f"[INFO] Replayed {pages} archived pages ({pages / (time.perf_counter() - start):.0f}/s)")
+    finally:
+        flush_pdf_info_batch(db_conn, pdf_batch)
+        db_conn.commit()
+        read_conn.close()
+        db_conn.close()
+        compact_state()
+    print(f"[INFO] Replayed {pages} archived pages in {time.perf_counter() - start:.1f}s "
+          f"({skipped} now blocked or too deep): {crawl_yield['documents']} new documents, "
+          f"{len(urls_to_visit)} urls to visit")
+
+
+def report_yield():
+    # une ligne par rapport dans YIELD_LOG_FILE, pour comparer les frontières au fil du crawl :
+    # date, frontière, pages visitées et nouveaux documents depuis le début de la session
+    pages, documents = crawl_yield["pages"], crawl_yield["documents"]
+    print(f"[INFO] Yield ({FRONTIER}): {documents} new documents in {pages} pages "
+          f"({documents / max(pages, 1):.2f} per page)")
+    with open(YIELD_LOG_FILE, "a", encoding="utf-8") as f:
+        f.write(f"{datetime.now().isoformat(timespec='seconds')}\t{FRONTIER}\t{pages}\t{documents}\n")
+
+
+def schedule_revisits():
+    db_conn = init_db(DB_PATH)
+    count = 0
+    for url, depth, revisit_interval in pages_to_revisit(db_conn):
+        # best-first : l'intervalle de revisite entre dans le score, comme l'ordre
+        # de pages_to_revisit pour la frontière fifo
+        urls_to_revisit.add(url)
+        schedule_url(url, depth, link_scorer.score(url, depth, revisit_interval=revisit_interval))
+        count += 1
+    db_conn.close()
+    print(f"[INFO] {count} page(s) due for a revisit")
+
+
+def load_canonicalizer():
+    global canonicalizer
+    global_params, domain_params = load_domain_params(IGNORED_QUERY_PARAMS_FILE)
+    canonicalizer = Canonicalizer(ignored_params=IGNORED_QUERY_PARAMS + global_params, domain_params=domain_params)
+    learned = canonicalizer.load_learned_rules(LEARNED_URL_RULES_FILE)
+    if learned:
+        print(f"[INFO] Loaded {learned} url rules learned from redirects")
+    url_record.cache_clear()
+
+
+def collect_metrics():
+    # appelé par metrics.py avant chaque rapport
+    metrics.gauge("crawl_frontier_size", len(urls_to_visit))
+    metrics.gauge("crawl_frontier_domains", len(urls_to_visit.queues))
+    metrics.gauge("crawl_frontier_oldest_age_seconds", urls_to_visit.oldest_age())
+    metrics.gauge("crawl_unreachable_domains", len(unreachable_domains))
+
+
+def load_link_scorer():
+    db_conn = init_db(DB_PATH)
+    domains = link_scorer.load(db_conn)
+    db_conn.close()
+    if domains:
+        print(f"[INFO] Loaded document yield of {domains} domain(s)")
+
+
+def setup(seen_set_backend=SEEN_SET_BACKEND, recrawl=False, frontier=FRONTIER, archive=ARCHIVE_PAGES):
+    # charge l'état et les règles dans les variables globales (aussi utilisé par pipeline.py)
+    global SEEN_SET_BACKEND, FRONTIER, added_documents, pdf_batch, page_archive, recrawling
+    global allowed_crawl_matcher, blocked_crawl_matcher
+    SEEN_SET_BACKEND = seen_set_backend
+    FRONTIER = frontier
+    recrawling = recrawl
+    if shard is None and Shards().exists():
+        raise SystemExit("[ERROR] The crawl state is split into shards (state/shards/), use crawl.py --workers N")
 
-if __name__ == "__main__":
     ensure_state_environment()
-    unreachable_domains = set()
-    added_documents = set()
+    load_canonicalizer()
+    if FRONTIER == "best-first":
+        load_link_scorer()
+    added_documents = new_seen_set()
     pdf_batch = []
-    
-    unreachable_domains = load_set(UNREACHABLE_DOMAINS_FILE)
-    urls_being_visited = load_set(BEING_VISITED_FILE)
-    urls_already_visited = load_set(VISITED_FILE)
-    urls_to_visit = load_to_visit(TO_VISIT_FILE)
-    urls_to_visit_set = set(url for url, _ in urls_to_visit)
 
-    allowed_crawl_patterns = load_set(ALLOWED_CRAWL_PATTERNS_FILE)
-    blocked_crawl_patterns = load_set(BLOCKED_CRAWL_PATTERNS_FILE)
-    blocked_crawl_domains = load_set(BLOCKED_CRAWL_DOMAINS_FILE)
+    load_state()
+    metrics.add_collector(collect_metrics)
 
-    if not urls_to_visit:
+    allowed_crawl_matcher = UrlMatcher(patterns=load_set(ALLOWED_CRAWL_PATTERNS_FILE))
+    blocked_crawl_matcher = UrlMatcher(
+        patterns=load_set(BLOCKED_CRAWL_PATTERNS_FILE),
+        domains=load_set(BLOCKED_CRAWL_DOMAINS_FILE),
+    )
+
+    if recrawl:
+        schedule_revisits()
+    if archive:
+        page_archive = PageArchive(ARCHIVE_DIR)
+
+    if not urls_to_visit and shard is None and not replaying:
         seed = input("Enter seed URL to start crawling: ").strip()
-        urls_to_visit = [(seed, 0)]
+        schedule_url(seed, 0)
+
+
+# ---- Crawl réparti (voir shards.py) ----
+
+def use_state_dir(state_dir):
+    # fichiers d'état du shard ; le journal d'erreurs, les règles apprises
+    # et yield.log restent partagés dans STATE_DIR
+    global DB_PATH, BEING_VISITED_FILE, VISITED_FILE, VISITED_FINGERPRINTS_FILE
+    global TO_VISIT_FILE, UNREACHABLE_DOMAINS_FILE, JOURNAL_FILE, ARCHIVE_DIR
+    DB_PATH = os.path.join(state_dir, os.path.basename(DB_PATH))
+    BEING_VISITED_FILE = os.path.join(state_dir, os.path.basename(BEING_VISITED_FILE))
+    VISITED_FILE = os.path.join(state_dir, os.path.basename(VISITED_FILE))
+    VISITED_FINGERPRINTS_FILE = os.path.join(state_dir, os.path.basename(VISITED_FINGERPRINTS_FILE))
+    TO_VISIT_FILE = os.path.join(state_dir, os.path.basename(TO_VISIT_FILE))
+    UNREACHABLE_DOMAINS_FILE = os.path.join(state_dir, os.path.basename(UNREACHABLE_DOMAINS_FILE))
+    JOURNAL_FILE = os.path.join(state_dir, os.path.basename(JOURNAL_FILE))
+    ARCHIVE_DIR = os.path.join(state_dir, os.path.basename(ARCHIVE_DIR))
+
+
+def receive_routed_urls():
+    # urls envoyées par les autres shards ; renvoie le nombre d'urls programmées
+    paths, entries = shard.receive()
+    if not paths:
+        return 0
+    scheduled = 0
+    for url, depth, score in entries:
+        url = normalize_url(url)
+        if not is_eligible_for_crawl(url):
+            continue
+        if TRAP_DETECTION:
+            reason = trap_detector.check(url)
+            if reason:
+                print(f"[TRAP] {reason}: {url}")
+                continue
+        schedule_url(url, depth, score)
+        scheduled += 1
+    journal_commit()
+    shard.done(paths)  # une fois dans le journal
+    metrics.count("crawl_routed_urls_received_total", len(entries))
+    print(f"[SHARD {shard.name}] Received {len(entries)} url(s) from other shards, {scheduled} scheduled")
+    return scheduled
+
+
+def split_state_into_shards(count):
+    # Première utilisation de --workers : l'état du crawl en un seul processus
+    # (fichiers d'état, journal, page_cache) est réparti entre les shards, par domaine.
+    # Les fichiers de state/ sont gardés, mais ne sont plus utilisés.
+    shards = Shards()
+    tmp_directory = shards.create(count)
 
+    ensure_state_environment()
+    load_canonicalizer()
+    unreachable = load_set(UNREACHABLE_DOMAINS_FILE)
+    being_visited = load_set(BEING_VISITED_FILE)
+    visited = load_visited()
+    to_visit = {}
+    for url, depth in load_to_visit(TO_VISIT_FILE):
+        to_visit.setdefault(url, depth)
+    replay_journal(JOURNAL_FILE, to_visit, visited, being_visited, unreachable)
+    init_db(DB_PATH).close()  # page_cache existe
+
+    def owner(url):
+        return shard_of(get_domain(url), count)
+
+    def shard_path(index, path):
+        return os.path.join(tmp_directory, shard_name(index), os.path.basename(path))
+
+    shard_to_visit = defaultdict(list)
+    for url, depth in to_visit.items():
+        shard_to_visit[owner(url)].append((url, depth))
+    shard_being_visited = defaultdict(set)
+    for url in being_visited:
+        shard_being_visited[owner(url)].add(url)
+    shard_unreachable = defaultdict(set)
+    for domain in unreachable:
+        shard_unreachable[shard_of(domain, count)].add(domain)
+    shard_visited = defaultdict(set)
+    if not isinstance(visited, FingerprintSet):
+        for url in visited:
+            shard_visited[owner(url)].add(url)
+
+    for index in range(count):
+        save_to_visit(shard_to_visit[index], shard_path(index, TO_VISIT_FILE))
+        save_set(shard_being_visited[index], shard_path(index, BEING_VISITED_FILE))
+        save_set(shard_unreachable[index], shard_path(index, UNREACHABLE_DOMAINS_FILE))
+        if isinstance(visited, FingerprintSet):
+            # les empreintes ne disent pas le domaine : chaque shard les a toutes
+            visited.save(shard_path(index, VISITED_FINGERPRINTS_FILE))
+        else:
+            save_set(shard_visited[index], shard_path(index, VISITED_FILE))
+
+        # pages du cache (revisites, rendement des domaines) du shard
+        shard_conn = init_db(shard_path(index, DB_PATH))
+        shard_conn.create_function("shard_of_url", 1, owner)
+        shard_conn.execute("ATTACH DATABASE ? AS single", (DB_PATH,))
+        shard_conn.execute(
+            "INSERT OR IGNORE INTO page_cache SELECT * FROM single.page_cache WHERE shard_of_url(url) = ?", (index,))
+        shard_conn.commit()
+        shard_conn.close()
+
+    shards.commit_creation(tmp_directory, count)
+    print(f"[INFO] Crawl state split into {count} shards: {len(to_visit)} urls to visit, "
+          f"{len(visited)} visited, in {shards.directory}")
+    return shards
+
+
+def run_shard_worker(concurrency=1, seen_set_backend=SEEN_SET_BACKEND, frontier=FRONTIER, archive=ARCHIVE_PAGES):
+    # un worker : prend un shard qui attend, le crawle, le rend
+    global shard
+    claimed = Shards().claim()
+    if claimed is None:
+        print("[INFO] No shard waiting for a worker")
+        return
+    shard = claimed
+    use_state_dir(shard.directory)
+    start_reporting(f"crawl_shard{shard.name}")
+    print(f"[SHARD {shard.name}] Worker {os.getpid()} started")
     try:
-        crawl()
-    except KeyboardInterrupt:
-        print("Interrupted by user")
\ No newline at end of file
+        setup(seen_set_backend=seen_set_backend, frontier=frontier, archive=archive)
+        crawl(concurrency=concurrency)
+    finally:
+        shard.flush_outbox()
+        db_conn = init_db(DB_PATH)
+        shard.merge_documents(db_conn)
+        db_conn.close()
+        shard.release()
+        print(f"[SHARD {shard.name}] Worker {os.getpid()} released the shard")
+
+
+def start_sharded_crawl(workers, shard_count=None, concurrency=1, seen_set_backend=SEEN_SET_BACKEND,
+                        frontier=FRONTIER, archive=ARCHIVE_PAGES):
+    # Lance (et relance) `workers` processus worker tant que des shards attendent.
+    # Peut être lancé en même temps sur plusieurs machines qui partagent state/.
+    global SEEN_SET_BACKEND
+    SEEN_SET_BACKEND = seen_set_backend
+    check_platform()
+    shards = Shards()
+    if not shards.exists():
+        shards = split_state_into_shards(shard_count or SHARD_COUNT)
+    elif shard_count and shard_count != shards.count:
+        print(f"[WARN] The crawl is already split into {shards.count} shards, --shards {shard_count} is ignored")
+
+    if not any(shards.has_work(index) for index in range(shards.count)):
+        load_canonicalizer()
+        seed = normalize_url(input("Enter seed URL to start crawling: ").strip())
+        shards.send(shards.owner(get_domain(seed)), "seed", [(seed, 0, 0.0)])
+
+    command = [
+        sys.executable, os.path.abspath(__file__), "--shard-worker",
+        "--concurrency", str(concurrency), "--seen-set", seen_set_backend, "--frontier", frontier,
+    ] + (["--archive"] if archive else [])
+    print(f"[INFO] Crawling {shards.count} shards with up to {workers} worker(s)")
+    run_workers(shards, workers, command)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="nombre de pages téléchargées en parallèle, sur des domaines différents (défaut : 1)")
+    parser.add_argument("--seen-set", choices=["set", "fingerprint"], default=SEEN_SET_BACKEND,
+                        help="stockage des urls déjà vues : chaînes complètes ou empreintes de 64 bits")
+    parser.add_argument("--recrawl", action="store_true",
+                        help="revisite les pages déjà visitées dont l'intervalle de revisite est écoulé")
+    parser.add_argument("--frontier", choices=["best-first", "fifo"], default=FRONTIER,
+                        help="ordre de visite : pages les plus prometteuses d'abord, ou parcours en largeur")
+    parser.add_argument("--metrics-port", type=int,
+                        help="sert les statistiques sur http://127.0.0.1:PORT/metrics (voir metrics.py)")
+    parser.add_argument("--workers", type=int,
+                        help="crawl réparti sur N processus, les domaines étant partagés entre eux (voir shards.py)")
+    parser.add_argument("--shards", type=int,
+                        help=f"nombre de shards, fixé à la première utilisation de --workers (défaut : {SHARD_COUNT})")
+    parser.add_argument("--archive", action="store_true", default=ARCHIVE_PAGES,
+                        help="garde les pages html téléchargées dans state/archive/ (voir archive.py)")
+    parser.add_argument("--replay-archive", action="store_true",
+                        help="relit les pages archivées avec les règles actuelles, sans réseau, puis s'arrête")
+    parser.add_argument("--shard-worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.workers and args.recrawl:
+        parser.error("--recrawl is not supported with --workers")
+    if args.workers and args.replay_archive:
+        parser.error("--replay-archive is not supported with --workers")
+
+    if args.workers:
+        start_sharded_crawl(max(args.workers, 1), shard_count=args.shards and max(args.shards, 1), concurrency=max(args.concurrency, 1),
+                            seen_set_backend=args.seen_set, frontier=args.frontier, archive=args.archive)
+    elif args.shard_worker:
+        try:
+            run_shard_worker(concurrency=max(args.concurrency, 1), seen_set_backend=args.seen_set, frontier=args.frontier,
+                             archive=args.archive)
+        except KeyboardInterrupt:
+            print("Interrupted by user")
+    elif args.replay_archive:
+        replaying = True
+        setup(seen_set_backend=args.seen_set, frontier=args.frontier)
+        try:
+            replay_archive()
+        except KeyboardInterrupt:
+            print("Interrupted by user")
+    else:
+        start_reporting("crawl", port=args.metrics_port)
+        setup(seen_set_backend=args.seen_set, recrawl=args.recrawl, frontier=args.frontier, archive=args.archive)
+
+        try:
+            crawl(concurrency=max(args.concurrency, 1))
+        except KeyboardInterrupt:
+            print("Interrupted by user")
\ No newline at end of file
@@ -0,0 +1,222 @@
+import sqlite3
+
+
+# Base partagée par crawl.py, verify.py et download.py.
+# Le schéma est versionné avec PRAGMA user_version : chaque migration n'est
+# appliquée qu'une fois, dans l'ordre, quel que soit le script lancé en premier.
+# La base est en mode WAL pour que les trois scripts puissent tourner en même
+# temps : les lectures ne bloquent pas l'écriture, et un écrivain attend
+# (busy_timeout) au lieu d'échouer avec "database is locked".
+
+BUSY_TIMEOUT = 30  # secondes
+
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")  # suffisant en WAL, ne perd rien en cas de crash du processus
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -32000")  # 32 MB
+    return conn
+
+
+def init_db(db_path):
+    conn = connect(db_path)
+    migrate(conn)
+    return conn
+
+
+def migrate(conn):
+    # Chaque migration est faite dans une transaction d'écriture (BEGIN IMMEDIATE),
+    # et la version est relue une fois le verrou obtenu : si plusieurs scripts
+    # démarrent en même temps, un seul applique chaque migration.
+    for target_version, migration in enumerate(MIGRATIONS, start=1):
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= target_version:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] < target_version:
+                migration(conn)
+                conn.execute(f"PRAGMA user_version = {target_version}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+def create_found_documents(conn):
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS found_documents (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        url TEXT  NOT NULL,
+        source_url TEXT NOT NULL,
+        source_title TEXT,
+        link_extension TEXT,
+        link_text TEXT,
+        link_title TEXT,
+        link_date_added TEXT DEFAULT (datetime('now')),
+        link_date_accessed TEXT,
+        link_http_code INTEGER,
+        link_content_type TEXT,
+        link_content_length INTEGER,
+        link_last_modified TEXT,
+        doc_initial_bytes BLOB,
+        doc_date_downloaded TEXT,
+        doc_local_path TEXT,
+        doc_file_size INTEGER,
+        doc_file_name TEXT,
+        doc_checksum TEXT,
+        doc_date_created TEXT,
+        doc_author TEXT,
+        doc_title TEXT,
+        doc_producer TEXT,
+        doc_page_count INTEGER
+      )
+    """)
+
+
+def unique_document_urls(conn):
+    # Un document (url) n'apparaît qu'une fois dans la base, même d'une session à l'autre.
+    # Les anciennes bases peuvent contenir des doublons : on garde la ligne la plus
+    # avancée (téléchargée, sinon vérifiée, sinon la plus ancienne).
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_found_documents_url'")
+    if cur.fetchone():
+        return
+
+    cur.execute("""
+      DELETE FROM found_documents WHERE id IN (
+        SELECT id FROM (
+          SELECT id, ROW_NUMBER() OVER (
+            PARTITION BY url
+            ORDER BY doc_date_downloaded IS NULL, link_http_code IS NULL, id
+          ) AS rank
+          FROM found_documents
+        ) WHERE rank > 1
+      )
+    """)
+    if cur.rowcount:
+        print(f"[INFO] Removed {cur.rowcount} duplicate documents from the database")
+    cur.execute("CREATE UNIQUE INDEX idx_found_documents_url ON found_documents(url)")
+
+
+def access_path_indexes(conn):
+    # Index partiels : ils ne contiennent que les lignes encore à traiter,
+    # et restent petits quand la base grossit.
+    # verify.py : WHERE link_http_code IS NULL
+    conn.execute("""
+      CREATE INDEX IF NOT EXISTS idx_found_documents_unverified
+      ON found_documents(id) WHERE link_http_code IS NULL
+    """)
+    # download.py : WHERE doc_date_downloaded IS NULL AND link_http_code IS NOT NULL
+    #               AND LOWER(link_content_type) IN (...) AND link_content_length < ...
+    conn.execute("""
+      CREATE INDEX IF NOT EXISTS idx_found_documents_to_download
+      ON found_documents(LOWER(link_content_type), link_content_length)
+      WHERE doc_date_downloaded IS NULL AND link_http_code IS NOT NULL
+    """)
+
+
+def document_blobs_table(conn):
+    # Les premiers octets des documents sont rarement relus : on les sort de
+    # found_documents pour que les lignes parcourues en permanence restent petites.
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS document_blobs (
+        document_id INTEGER PRIMARY KEY REFERENCES found_documents(id),
+        doc_initial_bytes BLOB
+      )
+    """)
+    conn.execute("""
+      INSERT OR IGNORE INTO document_blobs (document_id, doc_initial_bytes)
+      SELECT id, doc_initial_bytes FROM found_documents
+      WHERE doc_initial_bytes IS NOT NULL
+    """)
+    try:
+        conn.execute("ALTER TABLE found_documents DROP COLUMN doc_initial_bytes")
+    except sqlite3.OperationalError:
+        # SQLite < 3.35 : la colonne reste, vide
+        conn.execute("UPDATE found_documents SET doc_initial_bytes = NULL WHERE doc_initial_bytes IS NOT NULL")
+
+
+def duplicate_documents(conn):
+    # doc_duplicate_of : id du document déjà téléchargé qui a le même contenu
+    conn.execute("ALTER TABLE found_documents ADD COLUMN doc_duplicate_of INTEGER")
+    conn.execute("""
+      CREATE INDEX IF NOT EXISTS idx_found_documents_checksum
+      ON found_documents(doc_checksum) WHERE doc_checksum IS NOT NULL
+    """)
+    # recherche des doublons probables avant téléchargement (taille annoncée par verify.py)
+    conn.execute("""
+      CREATE INDEX IF NOT EXISTS idx_found_documents_downloaded_length
+      ON found_documents(link_content_length)
+      WHERE doc_checksum IS NOT NULL AND doc_duplicate_of IS NULL
+    """)
+
+
+def metadata_extraction(conn):
+    # extract_metadata.py : date de la lecture des métadonnées (réussie ou non),
+    # pour ne pas relire indéfiniment les fichiers qui ne sont pas des pdfs
+    conn.execute("ALTER TABLE found_documents ADD COLUMN doc_metadata_extracted TEXT")
+    conn.execute("""
+      CREATE INDEX IF NOT EXISTS idx_found_documents_metadata_pending
+      ON found_documents(COALESCE(doc_checksum, id))
+      WHERE doc_local_path IS NOT NULL AND doc_page_count IS NULL AND doc_metadata_extracted IS NULL
+    """)
+
+
+def page_cache_table(conn):
+    # Cache des pages html visitées par crawl.py, pour les revisites (voir page_cache.py)
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS page_cache (
+        url TEXT PRIMARY KEY,
+        depth INTEGER,
+        etag TEXT,
+        last_modified TEXT,
+        links_hash TEXT,
+        page BLOB,
+        date_fetched TEXT DEFAULT (datetime('now')),
+        date_changed TEXT DEFAULT (datetime('now')),
+        fetch_count INTEGER,
+        change_count INTEGER,
+        revisit_interval REAL,
+        next_visit REAL
+      )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_page_cache_next_visit ON page_cache(next_visit)")
+
+
+def archive_index_table(conn):
+    # Position de la dernière version archivée de chaque page (voir archive.py)
+    conn.execute("""
+      CREATE TABLE IF NOT EXISTS archive_index (
+        url TEXT PRIMARY KEY,
+        depth INTEGER,
+        file TEXT,
+        offset INTEGER,
+        length INTEGER,
+        date_archived TEXT DEFAULT (datetime('now'))
+      )
+    """)
+
+
+def archive_index_position(conn):
+    # archive.read_archive parcourt l'index par lots, dans l'ordre (fichier, début)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_archive_index_position ON archive_index(file, offset)")
+
+
+MIGRATIONS = [
+    create_found_documents,
+    unique_document_urls,
+    access_path_indexes,
+    document_blobs_table,
+    duplicate_documents,
+    metadata_extraction,
+    page_cache_table,
+    archive_index_table,
+    archive_index_position,
+]
+
+
+def document_in_db(conn, url):
+    cur = conn.execute("SELECT 1 FROM found_documents WHERE url = ?", (url,))
+    return cur.fetchone() is not None
@@ -1,17 +1,35 @@
 import os
-import sqlite3
+import time
+import argparse
 import requests
+from requests.adapters import HTTPAdapter
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 from urllib.parse import urlparse
 from hashlib import sha256
-from PyPDF2 import PdfReader
-import time
+
+from db import init_db, connect
+from frontier import Frontier
+from throttle import DomainThrottle
+from metrics import metrics, start_reporting
+from pipeline_queue import receive, POLL_INTERVAL
 
 # Configuration
 DB_PATH = 'state/found_documents.db'
 DOWNLOAD_DIR = 'state/downloaded_files/'
+OBJECTS_DIR = os.path.join(DOWNLOAD_DIR, 'objects')
+PARTIAL_DIR = os.path.join(DOWNLOAD_DIR, 'partial')
 CONTENT_TYPE_FILTER = 'application/pdf'
 MAX_CONTENT_LENGTH = 500 * 1024  # 500 kB
+USER_AGENT = "Mozilla/5.0 (compatible; MyCrawler/1.0)"
+MIN_DOMAIN_DELAY = 1.1  # secondes entre deux téléchargements sur un même domaine
+CONCURRENCY = 8  # nombre de domaines téléchargés en parallèle
+REQUEST_TIMEOUT = 20  # secondes, réduit sur les domaines rapides (throttle.timeout)
+BATCH_SIZE = 50  # mises à jour écrites par transaction
+PENDING_BUFFER = 10_000  # documents lus à l'avance dans la base
+SELECT_BATCH_SIZE = 1000  # documents lus par requête
+CHUNK_SIZE = 65536
 
 ALLOWED_DOMAINS = []
 BLOCKED_DOMAINS = ["blocked.com"]
@@ -56,6 +74,8 @@ params.append(MAX_CONTENT_LENGTH)
 
 
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+os.makedirs(OBJECTS_DIR, exist_ok=True)
+os.makedirs(PARTIAL_DIR, exist_ok=True)
 
 def sanitize_filename(url):
     parsed = urlparse(url)
@@ -64,133 +84,468 @@ def sanitize_filename(url):
         filename = "nofilename"
     return filename 
 
-def download_file(url, dest_path):
+http_session = requests.Session()
+http_session.headers["User-Agent"] = USER_AGENT
+
+
+def configure_http_pool(size):
+    adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size)
+    http_session.mount("http://", adapter)
+    http_session.mount("https://", adapter)
+
+
+def resume_validator(res):
+    # valeur de If-Range pour reprendre ce téléchargement plus tard : un ETag fort,
+    # sinon Last-Modified ; None si le serveur ne donne ni l'un ni l'autre
+    etag = res.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return res.headers.get("Last-Modified")
+
+
+def content_range_start(res):
+    # "bytes 1000-1999/2000" -> 1000 ; None si absent ou illisible
+    unit, _, byte_range = res.headers.get("Content-Range", "").partition(" ")
+    start = byte_range.split("-", 1)[0]
+    return int(start) if unit == "bytes" and start.isdigit() else None
+
+
+def download_file(throttle, url, dest_path):
+    # Télécharge dans dest_path + ".part", renommé à la fin. Si un .part existe
+    # déjà (téléchargement interrompu), on reprend où il s'est arrêté : Range avec
+    # If-Range (ETag ou Last-Modified de la première réponse, gardé dans
+    # dest_path + ".validator"), pour ne jamais coller la fin d'une autre version
+    # du fichier. Sans validateur, ou si le serveur ne reprend pas au bon octet,
+    # on recommence depuis le début.
+    # La taille et le sha256 sont calculés pendant le téléchargement.
+    # Renvoie (taille, sha256, octets reçus pendant cet appel) ou None en cas d'échec.
+    part_path = dest_path + ".part"
+    validator_path = dest_path + ".validator"
+    checksum = sha256()
+    size = 0
+    received = 0
+    hash_time = 0.0
+    headers = {}
+    validator = None
+    if os.path.exists(validator_path):
+        with open(validator_path, "r", encoding="utf-8") as f:
+            validator = f.read().strip() or None
+    if os.path.exists(part_path) and validator:
+        with open(part_path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                start = time.perf_counter()
+                checksum.update(chunk)
+                hash_time += time.perf_counter() - start
+                size += len(chunk)
+        if size:
+            headers["Range"] = f"bytes={size}-"
+            headers["If-Range"] = validator
+
+    domain = urlparse(url).netloc
     try:
-        with requests.get(url, stream=True, timeout=20) as r:
+        with http_session.get(url, stream=True, timeout=throttle.timeout(domain, REQUEST_TIMEOUT), headers=headers) as r:
+            throttle.record_response(domain, r)
+            if r.status_code == 416 and size:
+                # le .part était déjà complet
+                os.replace(part_path, dest_path)
+                os.remove(validator_path)
+                metrics.observe("download_hash_seconds", hash_time)
+                return size, checksum.hexdigest(), 0
             r.raise_for_status()
-            with open(dest_path, 'wb') as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-        return True
+
+            if r.status_code == 206 and size and content_range_start(r) == size:
+                mode = 'ab'
+            elif r.status_code == 206:
+                if not size:
+                    raise requests.HTTPError(f"206 without Range, Content-Range {r.headers.get('Content-Range')!r}")
+                # reprise à un autre endroit que demandé : on recommence sans Range
+                print(f"[WARN] Unexpected Content-Range {r.headers.get('Content-Range')!r}, restarting: {url}")
+                os.remove(validator_path)
+                os.remove(part_path)
+                mode = None
+            else:
+                # le serveur renvoie tout le fichier (absent, ou modifié depuis : If-Range) : on recommence
+                mode = 'wb'
+                checksum = sha256()
+                size = 0
+                hash_time = 0.0
+                validator = resume_validator(r)
+                if validator:
+                    with open(validator_path, "w", encoding="utf-8") as f:
+                        f.write(validator)
+                elif os.path.exists(validator_path):
+                    os.remove(validator_path)
+
+            if mode is not None:
+                with open(part_path, mode) as f:
+                    for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                        if chunk:
+                            f.write(chunk)
+                            start = time.perf_counter()
+                            checksum.update(chunk)
+                            hash_time += time.perf_counter() - start
+                            size += len(chunk)
+                            received += len(chunk)
+                            metrics.count("download_bytes_total", len(chunk))
+        if mode is None:
+            return download_file(throttle, url, dest_path)  # plus de .part : téléchargement complet
+        os.replace(part_path, dest_path)
+        if os.path.exists(validator_path):
+            os.remove(validator_path)
+        metrics.observe("download_hash_seconds", hash_time)
+        return size, checksum.hexdigest(), received
     except Exception as e:
+        if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+            throttle.record_failure(domain)
+        metrics.count("download_errors_total", domain=domain)
         print(f"[ERROR] Failed to download {url}: {e}")
-        return False
-
-def extract_pdf_metadata(pdf_path):
-    metadata = {
-        'date_created': None,
-        'author': None,
-        'title': None,
-        'page_count': None,
-        'producer': None,
-    }
-
-    try:
-        reader = PdfReader(pdf_path)
-        info = reader.metadata
-
-        try:
-            metadata['page_count'] = len(reader.pages)
-        except Exception as e:
-            print(f"[WARN] Could not determine page count: {e}")
+        return None
 
+# ---- Stockage par contenu ----
+# Chaque fichier est stocké une seule fois, sous son sha256 :
+#   downloaded_files/objects/ab/abcdef...
+# et le nom lisible {id}__{texte du lien}__{nom du fichier} est un lien physique
+# (hardlink) vers cet objet. Si le système de fichiers ne permet pas les liens,
+# doc_local_path pointe directement sur l'objet.
+# Les téléchargements en cours sont dans downloaded_files/partial/{id}.part.
 
-        for key, pdf_key in {
-            'date_created': '/CreationDate',
-            'author': '/Author',
-            'title': '/Title',
-            'producer': '/Producer'
-        }.items():
-            try:
-                value = info.get(pdf_key)
-                if value:
-                    metadata[key] = str(value).strip()
-            except Exception as e:
-                print(f"[WARN] Could not extract {key}: {e}")
-
-
-    except Exception as e:
-        print(f"[WARN] Failed to read PDF metadata: {e}")
-
-    return metadata
+def object_path(checksum):
+    return os.path.join(OBJECTS_DIR, checksum[:2], checksum)
 
 
+def store_object(tmp_path, checksum):
+    # renvoie True si le contenu est nouveau, False si c'était un doublon
+    path = object_path(checksum)
+    if os.path.exists(path):
+        os.remove(tmp_path)
+        return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(tmp_path, path)
+    return True
 
 
-def main():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+def link_object(checksum, local_path):
+    try:
+        if os.path.lexists(local_path):
+            os.remove(local_path)
+        os.link(object_path(checksum), local_path)
+        return local_path
+    except OSError:
+        return object_path(checksum)
+
+
+def duplicate_key(content_length, last_modified, initial_bytes):
+    # Même taille, même Last-Modified et mêmes premiers octets (vus par verify.py) :
+    # très probablement le même fichier. Sans l'une des trois infos, pas de clé.
+    if content_length and last_modified and initial_bytes:
+        return content_length, last_modified, bytes(initial_bytes)
+    return None
+
+
+def find_likely_duplicate(conn, key):
+    content_length, last_modified, initial_bytes = key
+    row = conn.execute("""
+        SELECT found_documents.id, doc_checksum
+        FROM found_documents
+        JOIN document_blobs ON document_blobs.document_id = found_documents.id
+        WHERE link_content_length = ? AND link_last_modified = ? AND doc_initial_bytes = ?
+          AND doc_checksum IS NOT NULL AND doc_duplicate_of IS NULL
+        LIMIT 1
+    """, (content_length, last_modified, initial_bytes)).fetchone()
+    if row and os.path.exists(object_path(row[1])):
+        return row
+    return None
+
+
+def find_by_checksum(conn, checksum, doc_id):
+    row = conn.execute("""
+        SELECT id FROM found_documents
+        WHERE doc_checksum = ? AND doc_duplicate_of IS NULL AND id != ?
+        LIMIT 1
+    """, (checksum, doc_id)).fetchone()
+    return row[0] if row else None
+
+
+def download_document(throttle, doc_id, url, local_path):
+    # exécuté dans un thread du pool (les métadonnées sont lues par extract_metadata.py)
+    tmp_path = os.path.join(PARTIAL_DIR, str(doc_id))
+    domain = urlparse(url).netloc
+    wait_start = time.perf_counter()
+    with throttle.slot(domain):
+        metrics.observe("download_throttle_wait_seconds", time.perf_counter() - wait_start)
+        with metrics.timer("download_request_seconds", domain=domain):
+            downloaded = download_file(throttle, url, tmp_path)
+    if downloaded is None:
+        return None
+
+    file_size, checksum, received = downloaded
+    is_new = store_object(tmp_path, checksum)
+    local_path = link_object(checksum, local_path)
+    return file_size, checksum, local_path, is_new, received
+
+
+def save_results(conn, results, duplicates):
+    if not results and not duplicates:
+        return
+    start = time.perf_counter()
+
+    conn.executemany("""
+        UPDATE found_documents
+        SET 
+            doc_local_path = ?,
+            doc_file_name = ?,
+            doc_file_size = ?,
+            doc_date_downloaded = ?,
+            doc_checksum = ?,
+            doc_duplicate_of = ?
+        WHERE id = ?
+    """, [(
+        local_path,
+        filename,
+        file_size,
+        now,
+        checksum,
+        duplicate_of,
+        doc_id
+    ) for doc_id, local_path, filename, file_size, now, checksum, duplicate_of in results])
+
+    # doublons : mêmes infos que l'original, qui est forcément déjà écrit au-dessus
+    # (métadonnées comprises si extract_metadata.py est déjà passé)
+    conn.executemany("""
+        UPDATE found_documents
+        SET
+            (doc_file_size, doc_checksum, doc_date_created, doc_author,
+             doc_title, doc_producer, doc_page_count) = (
+                SELECT doc_file_size, doc_checksum, doc_date_created, doc_author,
+                       doc_title, doc_producer, doc_page_count
+                FROM found_documents AS original WHERE original.id = ?
+            ),
+            doc_local_path = ?,
+            doc_file_name = ?,
+            doc_date_downloaded = ?,
+            doc_duplicate_of = ?
+        WHERE id = ?
+    """, [
+        (duplicate_of, local_path, filename, now, duplicate_of, doc_id)
+        for doc_id, local_path, filename, now, duplicate_of in duplicates
+    ])
+    conn.commit()
+    metrics.observe("download_db_flush_seconds", time.perf_counter() - start)
+    print(f"[INFO] Saved {len(results) + len(duplicates)} downloads to the database")
+    results.clear()
+    duplicates.clear()
+
+
+def select_documents(conn, ids=None):
+    # Les lignes sont lues par lots de SELECT_BATCH_SIZE, dans l'ordre des ids :
+    # les téléchargements commencent tout de suite, même s'il y a des centaines de
+    # milliers de documents, et aucune lecture ne reste en cours entre deux lots
+    # (en WAL, une lecture ouverte empêche les checkpoints : le fichier -wal
+    # grossirait pendant tout le téléchargement).
+    # ids : seulement ces documents (ceux que verify.py vient de vérifier, dans pipeline.py)
+    where = list(conditions)
+    values = list(params)
+    if ids is not None:
+        where.append(f"id IN ({','.join('?' * len(ids))})")
+        values.extend(ids)
     sql = f"""
-        SELECT id, url, link_text, link_content_type, link_content_length
+        SELECT id, url, link_text, link_content_length,
+               link_last_modified, doc_initial_bytes
         FROM found_documents
-        WHERE {' AND '.join(conditions)}
+        LEFT JOIN document_blobs ON document_blobs.document_id = found_documents.id
+        WHERE {' AND '.join(where)} AND id > ?
+        ORDER BY id
+        LIMIT {SELECT_BATCH_SIZE}
     """
-    cursor.execute(sql, params)
-
-
-    rows = cursor.fetchall()
-    print(f"Found {len(rows)} document(s) to download.")
-
-    for row in rows:
-        doc_id, url, link_text, content_type, content_length = row
-        filename = sanitize_filename(url)
-        filename = f"{doc_id}__{link_text}__{filename}"
-        local_path = os.path.join(DOWNLOAD_DIR, filename)
-
-        if FILENAME_MUST_CONTAIN_ONE and not any(word in filename for word in FILENAME_MUST_CONTAIN_ONE):
-            continue
-
-        if any(blocked in filename for blocked in FILENAME_MUST_NOT_CONTAIN):
-            continue
-
-
-        print(f"[INFO] Downloading ID {doc_id}: {url}")
-        if download_file(url, local_path):
-            file_size = os.path.getsize(local_path)
-            checksum = sha256(open(local_path, 'rb').read()).hexdigest()
-            now = datetime.utcnow().isoformat()
-
-
-            metadata = {}
-            if content_type == 'application/pdf':
-                metadata = extract_pdf_metadata(local_path)
-
-            cursor.execute("""
-                UPDATE found_documents
-                SET 
-                    doc_local_path = ?,
-                    doc_file_name = ?,
-                    doc_file_size = ?,
-                    doc_date_downloaded = ?,
-                    doc_checksum = ?,
-                    doc_date_created = ?,
-                    doc_author = ?,
-                    doc_title = ?,
-                    doc_producer = ?,
-                    doc_page_count = ?
-                WHERE id = ?
-            """, (
-                local_path,
-                filename,
-                file_size,
-                now,
-                checksum,
-                metadata.get('date_created'),
-                metadata.get('author'),
-                metadata.get('title'),
-                metadata.get('producer'),
-                metadata.get('page_count'),
-                doc_id
-            ))
-
-            conn.commit()
-            print(f"[SUCCESS] Saved to {local_path}")
-        else:
-            print(f"[SKIPPED] Failed to download ID {doc_id}")
-
-    conn.close()
-    time.sleep(0.3)
+    last_id = 0
+    while True:
+        rows = conn.execute(sql, values + [last_id]).fetchall()  # lecture terminée avant les yield
+        for row in rows:
+            doc_id, url, link_text, content_length, last_modified, initial_bytes = row
+            filename = sanitize_filename(url)
+            filename = f"{doc_id}__{link_text}__{filename}".replace(os.sep, "_")
+
+            if FILENAME_MUST_CONTAIN_ONE and not any(word in filename for word in FILENAME_MUST_CONTAIN_ONE):
+                continue
+
+            if any(blocked in filename for blocked in FILENAME_MUST_NOT_CONTAIN):
+                continue
+
+            key = duplicate_key(content_length, last_modified, initial_bytes)
+            yield url, (doc_id, filename, key)
+        if len(rows) < SELECT_BATCH_SIZE:
+            return
+        last_id = rows[-1][0]
+
+
+def main(concurrency=CONCURRENCY, throttle=None, incoming=None, stop=None):
+    # Dans pipeline.py : throttle partagé avec les autres étapes, incoming = file des
+    # ids vérifiés par verify.py (jusqu'à END), stop = threading.Event d'arrêt.
+    conn = init_db(DB_PATH)
+    # lecture sur une connexion séparée (WAL) : les écritures ne la perturbent pas
+    read_conn = connect(DB_PATH)
+    count = read_conn.execute(f"SELECT COUNT(*) FROM found_documents WHERE {' AND '.join(conditions)}", params).fetchone()[0]
+    print(f"Found {count} document(s) to download.")
+
+    configure_http_pool(concurrency)
+    throttle = throttle or DomainThrottle(MIN_DOMAIN_DELAY)
+    pending = Frontier(lambda url: urlparse(url).netloc, throttle.ready_time)
+    documents = select_documents(read_conn)
+    documents_left = True
+    more_to_come = incoming is not None
+    queued_ids = set()  # un document lu dans la base et reçu de la file n'est téléchargé qu'une fois
+
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+    in_flight = {}  # future -> (url, id, filename, key)
+    results = []
+    duplicates = []
+
+    # doublons probables (voir duplicate_key) : téléchargés pendant cette session,
+    # ou en cours de téléchargement (les suivants attendent le premier)
+    downloaded_keys = {}  # key -> (id, checksum, taille)
+    originals = {}  # checksum -> id du premier document avec ce contenu
+    downloading_keys = set()
+    deferred = defaultdict(list)  # key -> [(url, entry)]
+    stats = defaultdict(int)
+    metrics.add_collector(lambda: (
+        metrics.gauge("download_pending", len(pending)),
+        metrics.gauge("download_pending_oldest_age_seconds", pending.oldest_age()),
+        metrics.gauge("download_in_flight", len(in_flight)),
+    ))
+
+    def record_duplicate(url, doc_id, filename, original_id, checksum, file_size):
+        local_path = link_object(checksum, os.path.join(DOWNLOAD_DIR, filename))
+        duplicates.append((doc_id, local_path, filename, datetime.utcnow().isoformat(), original_id))
+        stats["skipped"] += 1
+        stats["bytes_not_downloaded"] += file_size or 0
+        metrics.count("download_files_total", result="duplicate_skipped")
+        print(f"[DUPLICATE] ID {doc_id} is likely the same file as ID {original_id}, not downloaded: {url}")
+
+    try:
+        while not (stop and stop.is_set()):
+            while documents_left and len(pending) < PENDING_BUFFER:
+                entry = next(documents, None)
+                if entry is None:
+                    documents_left = False
+                    break
+                if entry[1][0] not in queued_ids:
+                    queued_ids.add(entry[1][0])
+                    pending.push(*entry)
+
+            if more_to_come and not documents_left and len(pending) < PENDING_BUFFER:
+                ids, finished = receive(incoming, block=not pending and not in_flight)
+                ids = [doc_id for doc_id in ids if doc_id not in queued_ids]
+                if ids:
+                    queued_ids.update(ids)
+                    for entry in select_documents(read_conn, ids):
+                        pending.push(*entry)
+                more_to_come = not finished
+
+            if not pending and not in_flight:
+                if more_to_come:
+                    continue
+                break
+
+            while len(in_flight) < concurrency:
+                entry = pending.pop(time.time())
+                if entry is None:
+                    break
+                url, (doc_id, filename, key), domain = entry
+                if throttle.is_dead(domain):
+                    # coupe-circuit : on réessaiera au prochain lancement
+                    print(f"[SKIPPED] Domain unreachable, ID {doc_id}: {url}")
+                    pending.release(domain)
+                    continue
+
+                if key is not None:
+                    if key in downloading_keys:
+                        deferred[key].append((url, (doc_id, filename, key)))
+                        pending.release(domain)
+                        continue
+                    original = downloaded_keys.get(key)
+                    if original is None:
+                        row = find_likely_duplicate(conn, key)
+                        if row:
+                            original = (row[0], row[1], key[0])
+                    if original is not None:
+                        record_duplicate(url, doc_id, filename, *original)
+                        pending.release(domain)
+                        continue
+                    downloading_keys.add(key)
+
+                local_path = os.path.join(DOWNLOAD_DIR, filename)
+                print(f"[INFO] Downloading ID {doc_id}: {url}")
+                future = pool.submit(download_document, throttle, doc_id, url, local_path)
+                in_flight[future] = (url, doc_id, filename, key)
+
+            next_ready_time = pending.next_ready_time()
+            if not in_flight:
+                if next_ready_time is not None:
+                    time.sleep(max(next_ready_time - time.time(), 0))
+                continue
+
+            timeout = None
+            if len(in_flight) < concurrency and next_ready_time is not None:
+                timeout = max(next_ready_time - time.time(), 0)
+            if more_to_come:
+                timeout = min(timeout if timeout is not None else POLL_INTERVAL, POLL_INTERVAL)
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                url, doc_id, filename, key = in_flight.pop(future)
+                domain = urlparse(url).netloc
+                pending.release(domain)
+                downloading_keys.discard(key)
+
+                downloaded = future.result()
+                if downloaded is None:
+                    print(f"[SKIPPED] Failed to download ID {doc_id}")
+                    metrics.count("download_files_total", result="failed")
+                    # les doublons probables en attente seront téléchargés normalement
+                    for deferred_url, deferred_entry in deferred.pop(key, []):
+                        pending.push(deferred_url, deferred_entry)
+                    continue
+
+                file_size, checksum, local_path, is_new, received = downloaded
+                stats["downloaded"] += 1
+                stats["bytes_downloaded"] += received  # sans la partie reprise d'un .part
+                metrics.count("download_files_total", result="downloaded" if is_new else "duplicate_content")
+                duplicate_of = originals.get(checksum) or find_by_checksum(conn, checksum, doc_id)
+                if duplicate_of is None:
+                    originals[checksum] = doc_id
+                if not is_new:
+                    stats["duplicates_after_download"] += 1
+                    stats["bytes_not_stored"] += file_size
+
+                now = datetime.utcnow().isoformat()
+                results.append((doc_id, local_path, filename, file_size, now, checksum, duplicate_of))
+                print(f"[SUCCESS] Saved to {local_path}" + (f" (same content as ID {duplicate_of})" if duplicate_of else ""))
+
+                if key is not None:
+                    downloaded_keys[key] = (duplicate_of or doc_id, checksum, file_size)
+                    for deferred_url, (deferred_id, deferred_filename, _) in deferred.pop(key, []):
+                        record_duplicate(deferred_url, deferred_id, deferred_filename, duplicate_of or doc_id, checksum, file_size)
+
+                if len(results) + len(duplicates) >= BATCH_SIZE:
+                    save_results(conn, results, duplicates)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        save_results(conn, results, duplicates)
+        read_conn.close()
+        conn.close()
+
+        print(f"[INFO] Downloaded {stats['downloaded']} file(s), {stats['bytes_downloaded'] / 1e6:.1f} MB")
+        print(f"[INFO] Likely duplicates not downloaded: {stats['skipped']} "
+              f"({stats['bytes_not_downloaded'] / 1e6:.1f} MB of bandwidth and disk saved)")
+        print(f"[INFO] Duplicates found after download: {stats['duplicates_after_download']} "
+              f"({stats['bytes_not_stored'] / 1e6:.1f} MB of disk saved)")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY,
+                        help=f"nombre de domaines téléchargés en parallèle (défaut : {CONCURRENCY})")
+    parser.add_argument("--metrics-port", type=int,
+                        help="sert les statistiques sur http://127.0.0.1:PORT/metrics (voir metrics.py)")
+    args = parser.parse_args()
+    start_reporting("download", port=args.metrics_port)
+    main(concurrency=max(args.concurrency, 1))
@@ -0,0 +1,289 @@
+import os
+import time
+import signal
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from PyPDF2 import PdfReader
+
+from db import init_db, connect
+from metrics import metrics, start_reporting
+
+try:
+    import resource
+except ImportError:  # Windows : pas de limite mémoire
+    resource = None
+
+# Extraction des métadonnées des pdfs téléchargés, séparée de download.py :
+# PyPDF2 est du pur python, lent sur les gros fichiers ou les fichiers abîmés,
+# et ne bloque plus les téléchargements. Peut être lancé à tout moment, pendant
+# ou après download.py : seuls les documents pas encore traités sont lus.
+#
+# Chaque fichier est lu dans un processus séparé, avec une limite de temps
+# (FILE_TIMEOUT) et de mémoire (MEMORY_LIMIT). Un contenu (sha256) n'est lu
+# qu'une fois, et le résultat est écrit pour tous les documents qui ont ce contenu.
+
+DB_PATH = 'state/found_documents.db'
+WORKERS = os.cpu_count() or 1
+FILE_TIMEOUT = 30  # secondes par fichier
+MEMORY_LIMIT = 512 * 1024 * 1024  # octets par processus
+BATCH_SIZE = 200  # résultats écrits par transaction
+SELECT_BATCH_SIZE = 1000  # fichiers lus par requête
+MAX_ATTEMPTS = 2  # un fichier qui fait planter son processus n'est réessayé qu'une fois
+
+METADATA_KEYS = {
+    'date_created': '/CreationDate',
+    'author': '/Author',
+    'title': '/Title',
+    'producer': '/Producer',
+}
+
+
+class FileTimeout(BaseException):
+    # BaseException : pas rattrapé par les "except Exception" de PyPDF2 ou de ce
+    # fichier, qui continueraient la lecture sans limite de temps
+    pass
+
+
+def on_timeout(signum, frame):
+    raise FileTimeout()
+
+
+def init_worker(memory_limit):
+    if resource is not None and memory_limit:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, hard))
+    if hasattr(signal, "SIGALRM"):
+        signal.signal(signal.SIGALRM, on_timeout)
+    # Ctrl-C est géré par le processus principal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def page_count(reader):
+    # Le nombre de pages est écrit dans le catalogue (/Root /Pages /Count) :
+    # pas besoin de parcourir l'arbre des pages comme len(reader.pages).
+    try:
+        count = reader.trailer["/Root"]["/Pages"]["/Count"]
+        if int(count) >= 0:
+            return int(count)
+    except MemoryError:
+        raise  # limite mémoire atteinte : pas de seconde lecture
+    except Exception:
+        pass
+    return len(reader.pages)
+
+
+def extract_pdf_metadata(pdf_path):
+    # PdfReader ne lit que la table des objets et le trailer ; seuls le
+    # dictionnaire /Info et le catalogue sont ensuite décodés.
+    metadata = {
+        'date_created': None,
+        'author': None,
+        'title': None,
+        'page_count': None,
+        'producer': None,
+    }
+
+    with open(pdf_path, "rb") as f:
+        if f.read(5) != b"%PDF-":
+            return metadata, "not a pdf"
+        f.seek(0)
+
+        reader = PdfReader(f, strict=False)
+        try:
+            metadata['page_count'] = page_count(reader)
+        except MemoryError:
+            raise
+        except Exception as e:
+            print(f"[WARN] Could not determine page count of {pdf_path}: {e}")
+
+        info = reader.metadata or {}
+        for key, pdf_key in METADATA_KEYS.items():
+            try:
+                value = info.get(pdf_key)
+                if value:
+                    metadata[key] = str(value).strip()
+            except MemoryError:
+                raise
+            except Exception as e:
+                print(f"[WARN] Could not extract {key} of {pdf_path}: {e}")
+
+    return metadata, None
+
+
+def extract_with_limits(pdf_path, timeout):
+    # exécuté dans un processus du pool ; renvoie (métadonnées, erreur, durée de lecture)
+    # (la durée est mesurée ici : le fichier a pu attendre dans la file du pool)
+    if hasattr(signal, "SIGALRM"):
+        signal.alarm(timeout)
+    start = time.perf_counter()
+    try:
+        metadata, error = extract_pdf_metadata(pdf_path)
+    except FileTimeout:
+        metadata, error = None, f"timeout after {timeout}s"
+    except MemoryError:
+        metadata, error = None, "memory limit exceeded"
+    except Exception as e:
+        metadata, error = None, f"failed to read pdf: {e}"
+    finally:
+        if hasattr(signal, "SIGALRM"):
+            signal.alarm(0)
+    return metadata, error, time.perf_counter() - start
+
+
+def select_files(conn):
+    # Un seul fichier par contenu ; les anciens documents sans checksum sont traités un par un.
+    # Lus par lots de SELECT_BATCH_SIZE, dans l'ordre des ids : aucune lecture ne reste
+    # en cours pendant l'extraction (en WAL, elle empêcherait les checkpoints).
+    sql = f"""
+        SELECT doc_checksum, MIN(id), MIN(doc_local_path)
+        FROM found_documents
+        WHERE doc_local_path IS NOT NULL AND doc_page_count IS NULL AND doc_metadata_extracted IS NULL
+        GROUP BY COALESCE(doc_checksum, id)
+        HAVING MIN(id) > ?
+        ORDER BY MIN(id)
+        LIMIT {SELECT_BATCH_SIZE}
+    """
+    last_id = 0
+    while True:
+        rows = conn.execute(sql, (last_id,)).fetchall()
+        yield from rows
+        if len(rows) < SELECT_BATCH_SIZE:
+            return
+        last_id = rows[-1][1]
+
+
+def save_results(conn, results):
+    if not results:
+        return
+    start = time.perf_counter()
+
+    sql = """
+        UPDATE found_documents
+        SET
+            doc_date_created = ?,
+            doc_author = ?,
+            doc_title = ?,
+            doc_producer = ?,
+            doc_page_count = ?,
+            doc_metadata_extracted = ?
+        WHERE doc_local_path IS NOT NULL AND doc_page_count IS NULL AND {}
+    """
+    rows = {"doc_checksum = ?": [], "id = ?": []}
+    for (checksum, doc_id), now, metadata in results:
+        condition, value = ("doc_checksum = ?", checksum) if checksum else ("id = ?", doc_id)
+        rows[condition].append((
+            metadata.get('date_created'),
+            metadata.get('author'),
+            metadata.get('title'),
+            metadata.get('producer'),
+            metadata.get('page_count'),
+            now,
+            value
+        ))
+    for condition, values in rows.items():
+        conn.executemany(sql.format(condition), values)
+    conn.commit()
+    metrics.observe("metadata_db_flush_seconds", time.perf_counter() - start)
+    print(f"[INFO] Saved metadata of {len(results)} file(s)")
+    results.clear()
+
+
+def main(workers=WORKERS, timeout=FILE_TIMEOUT, memory_limit=MEMORY_LIMIT):
+    conn = init_db(DB_PATH)
+    read_conn = connect(DB_PATH)
+    files = select_files(read_conn)
+    files_left = True
+
+    def new_pool():
+        return ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(memory_limit,))
+
+    pool = new_pool()
+    in_flight = {}  # future -> (key, chemin, tentatives)
+    retry = []
+    results = []
+    stats = {"files": 0, "errors": 0}
+    metrics.add_collector(lambda: metrics.gauge("metadata_in_flight", len(in_flight)))
+
+    try:
+        while True:
+            # au plus 2 fichiers par processus en attente : la base est lue au fur et à mesure
+            while len(in_flight) < 2 * workers:
+                if retry:
+                    key, path, attempts = retry.pop()
+                elif files_left:
+                    row = next(files, None)
+                    if row is None:
+                        files_left = False
+                        continue
+                    checksum, doc_id, path = row
+                    key, attempts = (checksum, doc_id), 0
+                else:
+                    break
+                if not os.path.exists(path):
+                    results.append((key, datetime.utcnow().isoformat(), {}))
+                    print(f"[WARN] File not found: {path}")
+                    continue
+                in_flight[pool.submit(extract_with_limits, path, timeout)] = (key, path, attempts + 1)
+
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                key, path, attempts = in_flight.pop(future)
+                try:
+                    metadata, error, seconds = future.result()
+                    metrics.observe("metadata_extract_seconds", seconds)
+                except BrokenProcessPool:
+                    # un processus a été tué (mémoire, crash de la bibliothèque) : on ne sait pas
+                    # lequel des fichiers en cours est en cause, ils sont tous réessayés
+                    broken = True
+                    if attempts < MAX_ATTEMPTS:
+                        retry.append((key, path, attempts))
+                        continue
+                    metadata, error = None, "worker process crashed"
+                    metrics.count("metadata_crashes_total")
+
+                stats["files"] += 1
+                metrics.count("metadata_files_total", result="error" if error else "ok")
+                if error:
+                    stats["errors"] += 1
+                    print(f"[WARN] {path}: {error}")
+                results.append((key, datetime.utcnow().isoformat(), metadata or {}))
+
+            if broken:
+                for future, entry in in_flight.items():
+                    future.cancel()
+                    retry.append(entry)
+                in_flight.clear()
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = new_pool()
+
+            if len(results) >= BATCH_SIZE:
+                save_results(conn, results)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        save_results(conn, results)
+        read_conn.close()
+        conn.close()
+
+    print(f"[INFO] Read {stats['files']} file(s), {stats['errors']} without metadata")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help=f"nombre de processus (défaut : nombre de cœurs, {WORKERS})")
+    parser.add_argument("--timeout", type=int, default=FILE_TIMEOUT,
+                        help=f"temps maximum par fichier, en secondes (défaut : {FILE_TIMEOUT})")
+    parser.add_argument("--memory-limit", type=int, default=MEMORY_LIMIT // (1024 * 1024),
+                        help=f"mémoire maximum par processus, en MB (défaut : {MEMORY_LIMIT // (1024 * 1024)})")
+    parser.add_argument("--metrics-port", type=int,
+                        help="sert les statistiques sur http://127.0.0.1:PORT/metrics (voir metrics.py)")
+    args = parser.parse_args()
+    start_reporting("extract_metadata", port=args.metrics_port)
+    main(workers=max(args.workers, 1), timeout=max(args.timeout, 1),
+         memory_limit=args.memory_limit * 1024 * 1024)
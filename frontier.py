@@ -0,0 +1,159 @@
+import time
+import heapq
+from collections import deque
+from itertools import count
+
+
+class Frontier:
+    # Une file FIFO par domaine, et un tas (min-heap) des domaines non vides,
+    # trié par la date à partir de laquelle on a de nouveau le droit de les visiter.
+    # pop() est en O(log D) avec D le nombre de domaines, au lieu d'un parcours
+    # de toute la liste des urls à visiter.
+    #
+    # Les entrées sont des couples (url, data) : data est la profondeur pour crawl.py,
+    # l'id du document pour verify.py.
+    # domain_of(url) donne le domaine d'une url,
+    # ready_time(domain) donne la date (time.time()) de prochaine visite autorisée.
+    # Les entrées du tas peuvent être périmées (le domaine a été visité entre-temps) :
+    # elles sont corrigées au moment où elles arrivent en tête.
+    #
+    # Un domaine renvoyé par pop() est "en cours" jusqu'à l'appel de release(domain),
+    # avec ce domaine-là (celui sous lequel l'url a été rangée, même si domain_of
+    # donne autre chose depuis) : il n'est plus proposé entre-temps, ce qui permet de crawler plusieurs domaines
+    # en parallèle sans jamais visiter deux pages du même domaine en même temps.
+    #
+    # priority=True : chaque url a un score (push(url, data, score)), la file de chaque
+    # domaine est un tas trié par score, et parmi les domaines prêts on prend celui
+    # dont la meilleure url a le plus haut score (best-first). La politesse par domaine
+    # reste la même. À score égal, l'ordre d'arrivée est gardé.
+
+    def __init__(self, domain_of, ready_time, priority=False):
+        self.domain_of = domain_of
+        self.ready_time = ready_time
+        self.priority = priority
+        self.queues = {}
+        self.heap = []
+        self.scheduled = set()
+        self.in_flight = set()
+        self.urls = {}  # url -> date d'ajout (time.monotonic), dans l'ordre d'ajout
+        # priority=True seulement : domaines prêts, triés par meilleur score
+        self.ready = []
+        self.ready_best = {}  # domaine -> score de son entrée à jour dans self.ready
+        self.counter = count()
+
+    def __len__(self):
+        return len(self.urls)
+
+    def __bool__(self):
+        return bool(self.urls)
+
+    def __contains__(self, url):
+        return url in self.urls
+
+    def __iter__(self):
+        for queue in self.queues.values():
+            if self.priority:
+                for _, _, url, data in sorted(queue):
+                    yield url, data
+            else:
+                yield from queue
+
+    def push(self, url, data, score=0.0):
+        if url in self.urls:
+            return False
+        domain = self.domain_of(url)
+        queue = self.queues.get(domain)
+        if self.priority:
+            if queue is None:
+                queue = self.queues[domain] = []
+            heapq.heappush(queue, (-score, next(self.counter), url, data))
+            if domain in self.ready_best and score > self.ready_best[domain]:
+                # le domaine attend déjà parmi les prêts, avec un score plus bas
+                self.ready_best[domain] = score
+                heapq.heappush(self.ready, (-score, next(self.counter), domain))
+        else:
+            if queue is None:
+                queue = self.queues[domain] = deque()
+            queue.append((url, data))
+        self.urls[url] = time.monotonic()
+        self._schedule(domain)
+        return True
+
+    def _schedule(self, domain):
+        if domain not in self.scheduled and domain not in self.in_flight:
+            self.scheduled.add(domain)
+            heapq.heappush(self.heap, (self.ready_time(domain), domain))
+
+    def _best_score(self, domain):
+        return -self.queues[domain][0][0]
+
+    def oldest_age(self):
+        # secondes depuis l'ajout de la plus ancienne url en attente (pour metrics.py)
+        for pushed_at in self.urls.values():
+            return time.monotonic() - pushed_at
+        return 0.0
+
+    def next_ready_time(self):
+        # date à laquelle le prochain domaine sera prêt, None si aucun domaine n'est en attente
+        if self.ready:
+            return 0.0  # des domaines sont déjà prêts
+        return self.heap[0][0] if self.heap else None
+
+    def pop(self, now):
+        # renvoie (url, data, domaine) pour un domaine prêt, ou None si aucun ne l'est encore
+        if self.priority:
+            return self._pop_best(now)
+        while self.heap and self.heap[0][0] <= now:
+            _, domain = heapq.heappop(self.heap)
+            self.scheduled.discard(domain)
+            ready_at = self.ready_time(domain)
+            if ready_at > now:
+                # entrée périmée : le domaine a été visité depuis
+                self._schedule(domain)
+                continue
+
+            queue = self.queues[domain]
+            url, data = queue.popleft()
+            del self.urls[url]
+            if not queue:
+                del self.queues[domain]
+            self.in_flight.add(domain)
+            return url, data, domain
+        return None
+
+    def _pop_best(self, now):
+        # les domaines devenus prêts passent du tas des dates au tas des scores
+        while self.heap and self.heap[0][0] <= now:
+            _, domain = heapq.heappop(self.heap)
+            if self.ready_time(domain) > now:
+                self.scheduled.discard(domain)
+                self._schedule(domain)
+                continue
+            score = self._best_score(domain)
+            self.ready_best[domain] = score
+            heapq.heappush(self.ready, (-score, next(self.counter), domain))
+
+        while self.ready:
+            neg_score, _, domain = heapq.heappop(self.ready)
+            if self.ready_best.get(domain) != -neg_score:
+                continue  # entrée remplacée par une autre avec un meilleur score
+            del self.ready_best[domain]
+            self.scheduled.discard(domain)
+            if self.ready_time(domain) > now:
+                # visité entre-temps par une autre étape (throttle partagé)
+                self._schedule(domain)
+                continue
+
+            queue = self.queues[domain]
+            _, _, url, data = heapq.heappop(queue)
+            del self.urls[url]
+            if not queue:
+                del self.queues[domain]
+            self.in_flight.add(domain)
+            return url, data, domain
+        return None
+
+    def release(self, domain):
+        self.in_flight.discard(domain)
+        if domain in self.queues:
+            self._schedule(domain)
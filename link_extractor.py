@@ -0,0 +1,206 @@
+import codecs
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+
+# Extraction en une seule passe de ce dont crawl() a besoin dans une page :
+# le <title>, la cible d'un <meta http-equiv="refresh"> et les liens <a href>
+# avec leur texte et leur attribut title. Aucun arbre n'est construit.
+# Les résultats sont les mêmes qu'avec BeautifulSoup(..., "html.parser") :
+#   - title       : soup.title.string (None si le <title> contient autre chose que du texte)
+#   - meta_refresh: attribut content du premier <meta http-equiv="refresh">
+#   - links       : soup.find_all("a", href=True), dans l'ordre du document,
+#                   sous forme de tuples (href, texte, title)
+
+
+def parse_meta_refresh(content, current_url):
+    if not isinstance(content, str):
+        return None
+
+    parts = content.lower().split(";")
+    for part in parts:
+        part = part.strip()
+        if part.startswith("url="):
+            raw_url = part[4:].strip().strip('\'"')
+            if raw_url:
+                return urljoin(current_url, raw_url)
+
+    return None
+
+
+# éléments sans balise fermante, comme dans BeautifulSoup
+VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen',
+    'link', 'menuitem', 'meta', 'param', 'source', 'track', 'wbr',
+    'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex', 'nextid', 'spacer',
+}
+
+# texte ignoré par BeautifulSoup dans link.text
+SCRIPT_ELEMENTS = {'script', 'style', 'template'}
+
+# éléments dans lesquels BeautifulSoup ne réduit pas les blancs
+PRESERVE_WHITESPACE_ELEMENTS = {'pre', 'textarea'}
+ASCII_SPACES = str.maketrans('', '', '\x20\x0a\x09\x0c\x0d')
+
+
+class TitleNode:
+    # reproduit Tag.string : la chaîne d'un élément qui n'a qu'un seul enfant,
+    # en descendant dans cet enfant si c'est lui-même un élément
+    def __init__(self):
+        self.children = 0
+        self.string = None
+
+    def add_string(self, data):
+        self.children += 1
+        self.string = data
+
+    def add_child(self, node):
+        self.children += 1
+        self.string = node.string if node.children == 1 else None
+
+
+class LinkExtractor(HTMLParser):
+    # On ne garde que la pile des noms des éléments ouverts, pour fermer les liens
+    # comme le fait BeautifulSoup : une balise fermante ferme aussi tout ce qui a
+    # été ouvert depuis la balise ouvrante correspondante.
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = None
+        self.meta_refresh = None
+        self.links = []
+        self._stack = []  # (tag, lien ou None, TitleNode ou None)
+        self._open_links = []  # liens <a href> ouverts, ils peuvent être imbriqués
+        self._title_nodes = []  # noeuds ouverts à l'intérieur du premier <title>
+        self._title_seen = False
+        self._script_depth = 0
+        self._preserve_depth = 0
+        self._data = []
+
+    def _end_data(self):
+        # Le texte entre deux balises peut arriver en plusieurs morceaux : on le
+        # regroupe, et comme BeautifulSoup on réduit un texte fait uniquement de
+        # blancs à "\n" ou " ".
+        if not self._data:
+            return
+        data = "".join(self._data)
+        self._data = []
+        if not self._preserve_depth and not data.translate(ASCII_SPACES):
+            data = "\n" if "\n" in data else " "
+
+        if not self._script_depth:
+            for link in self._open_links:
+                link[1].append(data)
+        if self._title_nodes:
+            self._title_nodes[-1].add_string(data)
+
+    def handle_starttag(self, tag, attrs):
+        self._end_data()
+        link = None
+        title_node = None
+
+        if tag in ("a", "meta"):
+            # attribut sans valeur (<a href=x title>) : "" comme dans BeautifulSoup, pas None
+            attrs = {name: "" if value is None else value for name, value in attrs}
+
+        if tag == "a":
+            if "href" in attrs:
+                # [href, morceaux de texte, title], complété à la fermeture
+                link = [attrs["href"], [], attrs.get("title")]
+                self.links.append(link)
+        elif tag == "meta" and self.meta_refresh is None:
+            http_equiv = attrs.get("http-equiv")
+            if http_equiv and http_equiv.lower() == "refresh":
+                self.meta_refresh = attrs.get("content", "")
+
+        if self._title_nodes:
+            title_node = TitleNode()
+        elif tag == "title" and not self._title_seen:
+            self._title_seen = True
+            title_node = TitleNode()
+
+        if tag in VOID_ELEMENTS:
+            if title_node is not None and self._title_nodes:
+                self._title_nodes[-1].add_child(title_node)
+            return
+
+        self._stack.append((tag, link, title_node))
+        if link is not None:
+            self._open_links.append(link)
+        if title_node is not None:
+            self._title_nodes.append(title_node)
+        if tag in SCRIPT_ELEMENTS:
+            self._script_depth += 1
+        if tag in PRESERVE_WHITESPACE_ELEMENTS:
+            self._preserve_depth += 1
+
+    def handle_endtag(self, tag):
+        self._end_data()
+        # balise fermante sans ouvrante correspondante : ignorée
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                break
+        else:
+            return
+        while len(self._stack) > i:
+            self._pop()
+
+    def _pop(self):
+        tag, link, title_node = self._stack.pop()
+        if link is not None:
+            self._open_links.pop()
+        if title_node is not None:
+            self._title_nodes.pop()
+            if self._title_nodes:
+                self._title_nodes[-1].add_child(title_node)
+            else:
+                self.title = title_node.string if title_node.children == 1 else None
+        if tag in SCRIPT_ELEMENTS:
+            self._script_depth -= 1
+        if tag in PRESERVE_WHITESPACE_ELEMENTS:
+            self._preserve_depth -= 1
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_comment(self, data):
+        self._end_data()
+        if self._title_nodes:
+            self._title_nodes[-1].add_string(data)
+
+    def handle_decl(self, decl):
+        self._end_data()
+
+    def handle_pi(self, data):
+        self._end_data()
+
+    def unknown_decl(self, data):
+        self._end_data()
+
+    def close(self):
+        super().close()
+        self._end_data()
+        while self._stack:
+            self._pop()
+        self.links = [(href, "".join(parts), title) for href, parts, title in self.links]
+
+    def meta_refresh_url(self, current_url):
+        if self.meta_refresh is None:
+            return None
+        return parse_meta_refresh(self.meta_refresh, current_url)
+
+
+def extract_links(chunks, encoding=None):
+    # chunks : itérable de bytes (par exemple res.iter_content()),
+    # décodés au fil de l'eau comme le ferait res.text
+    try:
+        decoder = codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    parser = LinkExtractor()
+    for chunk in chunks:
+        parser.feed(decoder.decode(chunk))
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    return parser
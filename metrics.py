@@ -0,0 +1,268 @@
+import os
+import sys
+import atexit
+import time
+import signal
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+# Compteurs, jauges et histogrammes de durées, partagés par toutes les étapes d'un
+# processus (crawl.py, verify.py, download.py, extract_metadata.py, pipeline.py) :
+#
+#   from metrics import metrics
+#   metrics.count("crawl_pages_total", status=200)
+#   with metrics.timer("crawl_fetch_seconds", domain=domain):
+#       ...
+#   metrics.gauge("crawl_frontier_size", len(urls_to_visit))
+#   metrics.add_collector(fonction)   # appelée avant chaque rapport, pour mettre les jauges à jour
+#
+# Le tout est écrit au format texte de Prometheus toutes les REPORT_INTERVAL secondes
+# dans state/metrics_{nom}.prom (start_reporting), et servi sur
+# http://127.0.0.1:{port}/metrics avec l'option --metrics-port.
+#
+# Le label `domain` est limité à MAX_DOMAIN_LABELS domaines, les suivants sont
+# regroupés sous "other".
+#
+# Profilage par échantillonnage, à la demande sur un crawl en cours :
+#   kill -USR1 <pid>   démarre, puis arrête et écrit state/profile_{nom}_{date}.txt
+# (ou http://127.0.0.1:{port}/profile?seconds=30). Toutes les PROFILE_INTERVAL
+# secondes, la pile de chaque thread est relevée ; le fichier contient une ligne
+# "fonction;fonction;... nombre" par pile, lisible par flamegraph.pl ou speedscope.
+
+STATS_DIR = "state"
+REPORT_INTERVAL = 10  # secondes
+MAX_DOMAIN_LABELS = 100
+PROFILE_INTERVAL = 0.01  # secondes
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{str(value).replace(chr(34), "")}"' for name, value in labels) + "}"
+
+
+class Metrics:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)  # (nom, labels) -> valeur
+        self.gauges = {}
+        self.histograms = defaultdict(Histogram)
+        self.domains = set()
+        self.collectors = []
+
+    def _key(self, name, labels):
+        if "domain" in labels:
+            domain = labels["domain"]
+            if domain not in self.domains:
+                if len(self.domains) < MAX_DOMAIN_LABELS:
+                    self.domains.add(domain)
+                else:
+                    labels = dict(labels, domain="other")
+        return name, tuple(sorted(labels.items()))
+
+    def count(self, name, value=1, **labels):
+        with self.lock:
+            self.counters[self._key(name, labels)] += value
+
+    def gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def observe(self, name, seconds, **labels):
+        with self.lock:
+            self.histograms[self._key(name, labels)].observe(seconds)
+
+    def add_collector(self, collect):
+        self.collectors.append(collect)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def render(self):
+        for collect in self.collectors:
+            try:
+                collect()
+            except RuntimeError:
+                pass  # structure modifiée par un autre thread pendant la lecture : au prochain rapport
+        lines = []
+        with self.lock:
+            for kind, values in (("counter", self.counters), ("gauge", self.gauges)):
+                previous = None
+                for (name, labels), value in sorted(values.items()):
+                    if name != previous:
+                        lines.append(f"# TYPE {name} {kind}")
+                        previous = name
+                    lines.append(f"{name}{_labels(labels)} {value:g}")
+            previous = None
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name != previous:
+                    lines.append(f"# TYPE {name} histogram")
+                    previous = name
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {histogram.sum:.6f}")
+                lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+metrics = Metrics()
+
+
+# ---- profilage ----
+
+class SamplingProfiler:
+
+    def __init__(self, name):
+        self.name = name
+        self.stacks = Counter()
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def start(self):
+        if self.running:
+            return
+        self.stacks.clear()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self.thread.start()
+        print(f"[PROFILE] Sampling started (pid {os.getpid()})")
+
+    def stop(self):
+        # renvoie le chemin du fichier écrit
+        if not self.running:
+            return None
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        path = os.path.join(STATS_DIR, f"profile_{self.name}_{datetime.now():%Y%m%d_%H%M%S}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        print(f"[PROFILE] {sum(self.stacks.values())} samples written to {path}")
+        return path
+
+    def toggle(self, *args):
+        # gestionnaire de SIGUSR1 : l'arrêt (attente du thread, écriture du fichier)
+        # est fait dans un autre thread, pas dans le gestionnaire de signal
+        if self.running:
+            threading.Thread(target=self.stop, daemon=True).start()
+        else:
+            self.start()
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self.stop_event.wait(PROFILE_INTERVAL):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, "thread"))
+                self.stacks[";".join(reversed(stack))] += 1
+
+
+profiler = None
+
+
+# ---- rapports ----
+
+def _make_handler():
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            path, _, query = self.path.partition("?")
+            if path == "/metrics":
+                body = metrics.render().encode("utf-8")
+                content_type = "text/plain; version=0.0.4"
+            elif path == "/profile" and profiler is not None:
+                seconds = float(dict(p.split("=", 1) for p in query.split("&") if "=" in p).get("seconds", 30))
+                profiler.start()
+                time.sleep(min(seconds, 600))
+                with open(profiler.stop(), "rb") as f:
+                    body = f.read()
+                content_type = "text/plain"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def start_reporting(name, port=None, interval=REPORT_INTERVAL):
+    # name : nom du fichier de statistiques (state/metrics_{name}.prom) et des profils
+    global profiler
+    os.makedirs(STATS_DIR, exist_ok=True)
+    path = os.path.join(STATS_DIR, f"metrics_{name}.prom")
+
+    def report():
+        while True:
+            time.sleep(interval)
+            metrics.write(path)
+
+    threading.Thread(target=report, name="metrics", daemon=True).start()
+    atexit.register(metrics.write, path)  # état final
+
+    profiler = SamplingProfiler(name)
+    if hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, profiler.toggle)
+
+    if port:
+        server = ThreadingHTTPServer(("127.0.0.1", port), _make_handler())
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"[INFO] Metrics on http://127.0.0.1:{port}/metrics")
+    print(f"[INFO] Metrics written to {path} every {interval}s, profiling: kill -USR1 {os.getpid()}")
+    return path
@@ -0,0 +1,129 @@
+import json
+import time
+import zlib
+from hashlib import sha256
+
+from link_extractor import parse_meta_refresh
+
+
+# Cache des pages html déjà visitées, dans la table page_cache (voir db.py) :
+#   - ETag / Last-Modified, renvoyés au serveur (If-None-Match / If-Modified-Since)
+#     quand la page est revisitée : une réponse 304 n'a pas de corps ;
+#   - le résultat de l'extraction (titre, meta refresh, liens), compressé, réutilisé
+#     tel quel après un 304 ;
+#   - un hash de ce résultat, pour savoir si la page a changé.
+#
+# Chaque page a un intervalle de revisite, divisé par 2 quand elle a changé et
+# multiplié par 2 sinon (entre MIN_REVISIT_INTERVAL et MAX_REVISIT_INTERVAL).
+# `crawl.py --recrawl` revisite les pages dont l'intervalle est écoulé, celles qui
+# changent le plus souvent d'abord.
+
+DAY = 24 * 3600
+DEFAULT_REVISIT_INTERVAL = 7 * DAY
+MIN_REVISIT_INTERVAL = 1 * DAY
+MAX_REVISIT_INTERVAL = 180 * DAY
+
+
+class CachedPage:
+    # même interface que link_extractor.LinkExtractor pour visit_page()
+
+    def __init__(self, title, meta_refresh, links):
+        self.title = title
+        self.meta_refresh = meta_refresh
+        self.links = links
+
+    def meta_refresh_url(self, current_url):
+        if self.meta_refresh is None:
+            return None
+        return parse_meta_refresh(self.meta_refresh, current_url)
+
+    def serialize(self):
+        return json.dumps([self.title, self.meta_refresh, self.links], ensure_ascii=False).encode("utf-8")
+
+    @classmethod
+    def from_page(cls, page):
+        return cls(page.title, page.meta_refresh, [list(link) for link in page.links])
+
+    @classmethod
+    def deserialize(cls, data):
+        title, meta_refresh, links = json.loads(data.decode("utf-8"))
+        return cls(title, meta_refresh, [tuple(link) for link in links])
+
+
+def cached_validators(conn, url):
+    # (etag, last_modified) si la page est dans le cache, sinon None
+    return conn.execute("SELECT etag, last_modified FROM page_cache WHERE url = ?", (url,)).fetchone()
+
+
+def load_page(conn, url):
+    row = conn.execute("SELECT page FROM page_cache WHERE url = ?", (url,)).fetchone()
+    if row is None or row[0] is None:
+        return None
+    return CachedPage.deserialize(zlib.decompress(row[0]))
+
+
+def save_page(conn, url, depth, res, page, not_modified=False):
+    # Met à jour le cache et l'intervalle de revisite. Renvoie True si la page a changé.
+    # Ne fait pas de commit : fait par crawl() après chaque page.
+    now = time.time()
+    row = conn.execute(
+        "SELECT links_hash, revisit_interval FROM page_cache WHERE url = ?", (url,)
+    ).fetchone()
+
+    data = page.serialize()
+    links_hash = sha256(data).hexdigest()
+    if row is None:
+        changed = True
+        interval = DEFAULT_REVISIT_INTERVAL
+    else:
+        changed = not not_modified and links_hash != row[0]
+        interval = row[1] / 2 if changed else row[1] * 2
+        interval = min(max(interval, MIN_REVISIT_INTERVAL), MAX_REVISIT_INTERVAL)
+
+    if not_modified:
+        # rien de nouveau à écrire, sauf les dates
+        conn.execute("""
+            UPDATE page_cache
+            SET date_fetched = datetime('now'), fetch_count = fetch_count + 1,
+                revisit_interval = ?, next_visit = ?
+            WHERE url = ?
+        """, (interval, now + interval, url))
+        return False
+
+    conn.execute("""
+        INSERT INTO page_cache (url, depth, etag, last_modified, links_hash, page,
+                                revisit_interval, next_visit, fetch_count, change_count)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, 1)
+        ON CONFLICT(url) DO UPDATE SET
+            depth = MIN(depth, excluded.depth),
+            etag = excluded.etag,
+            last_modified = excluded.last_modified,
+            links_hash = excluded.links_hash,
+            page = excluded.page,
+            date_fetched = datetime('now'),
+            date_changed = CASE WHEN links_hash = excluded.links_hash THEN date_changed ELSE datetime('now') END,
+            revisit_interval = excluded.revisit_interval,
+            next_visit = excluded.next_visit,
+            fetch_count = fetch_count + 1,
+            change_count = change_count + (links_hash != excluded.links_hash)
+    """, (
+        url,
+        depth,
+        res.headers.get("ETag"),
+        res.headers.get("Last-Modified"),
+        links_hash,
+        zlib.compress(data),
+        interval,
+        now + interval,
+    ))
+    return changed
+
+
+def pages_to_revisit(conn, now=None):
+    # (url, depth, revisit_interval) des pages à revisiter, les plus changeantes d'abord
+    now = time.time() if now is None else now
+    return conn.execute("""
+        SELECT url, depth, revisit_interval FROM page_cache
+        WHERE next_visit <= ?
+        ORDER BY revisit_interval, next_visit
+    """, (now,))
@@ -0,0 +1,111 @@
+import argparse
+import threading
+
+import crawl
+import verify
+import download
+from db import init_db
+from metrics import start_reporting
+from pipeline_queue import END, new_queue, send
+
+
+# Crawl, vérification et téléchargement en même temps, dans un seul processus.
+#
+#   crawl (thread principal) --(url, id)--> verify --id--> download
+#
+# Les étapes sont reliées par des files bornées (pipeline_queue.py) : si le
+# téléchargement prend du retard, la vérification attend, puis le crawl attend.
+# Les trois étapes partagent la même politesse par domaine (crawl.throttle,
+# REQUEST_DELAY) : jamais deux requêtes en même temps sur un domaine, quelle
+# que soit l'étape.
+#
+# Tout est écrit dans state/found_documents.db comme avec les trois scripts
+# séparés, qui restent utilisables (par exemple pour reprendre après un arrêt).
+
+
+def run_stage(target, outgoing, stop, **kwargs):
+    try:
+        target(stop=stop, **kwargs)
+    except Exception as e:
+        print(f"[ERROR] Pipeline stage {target.__module__} stopped: {e}")
+        stop.set()
+    finally:
+        if outgoing is not None:
+            send(outgoing, END, stop)
+
+
+def main(crawl_concurrency, verify_concurrency, download_concurrency, seen_set_backend, recrawl=False,
+         frontier=crawl.FRONTIER, archive=crawl.ARCHIVE_PAGES):
+    crawl.setup(seen_set_backend=seen_set_backend, recrawl=recrawl, frontier=frontier, archive=archive)
+    init_db(crawl.DB_PATH).close()  # migrations avant de démarrer les étapes
+
+    stop = threading.Event()
+    to_verify = new_queue()
+    to_download = new_queue()
+
+    def on_documents_added(rows):
+        for doc_id, url in rows:
+            send(to_verify, (url, doc_id), stop)
+
+    crawl.document_listener = on_documents_added
+
+    stages = [
+        threading.Thread(target=run_stage, name="verify", args=(verify.verify_links, to_download, stop), kwargs={
+            "concurrency": verify_concurrency,
+            "throttle": crawl.throttle,
+            "incoming": to_verify,
+            "verified": to_download,
+        }),
+        threading.Thread(target=run_stage, name="download", args=(download.main, None, stop), kwargs={
+            "concurrency": download_concurrency,
+            "throttle": crawl.throttle,
+            "incoming": to_download,
+        }),
+    ]
+    for stage in stages:
+        stage.start()
+
+    try:
+        crawl.crawl(concurrency=crawl_concurrency)
+        send(to_verify, END, stop)
+        for stage in stages:
+            while stage.is_alive():
+                stage.join(timeout=1)
+    except KeyboardInterrupt:
+        print("Interrupted by user")
+    finally:
+        # chaque étape écrit ses derniers résultats avant de s'arrêter
+        stop.set()
+        for stage in stages:
+            stage.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--crawl-concurrency", type=int, default=1,
+                        help="nombre de pages téléchargées en parallèle (défaut : 1)")
+    parser.add_argument("--verify-concurrency", type=int, default=verify.CONCURRENCY,
+                        help=f"nombre de domaines vérifiés en parallèle (défaut : {verify.CONCURRENCY})")
+    parser.add_argument("--download-concurrency", type=int, default=download.CONCURRENCY,
+                        help=f"nombre de domaines téléchargés en parallèle (défaut : {download.CONCURRENCY})")
+    parser.add_argument("--seen-set", choices=["set", "fingerprint"], default=crawl.SEEN_SET_BACKEND,
+                        help="stockage des urls déjà vues : chaînes complètes ou empreintes de 64 bits")
+    parser.add_argument("--recrawl", action="store_true",
+                        help="revisite les pages déjà visitées dont l'intervalle de revisite est écoulé")
+    parser.add_argument("--frontier", choices=["best-first", "fifo"], default=crawl.FRONTIER,
+                        help="ordre de visite : pages les plus prometteuses d'abord, ou parcours en largeur")
+    parser.add_argument("--archive", action="store_true", default=crawl.ARCHIVE_PAGES,
+                        help="garde les pages html téléchargées dans state/archive/ (voir archive.py)")
+    parser.add_argument("--metrics-port", type=int,
+                        help="sert les statistiques sur http://127.0.0.1:PORT/metrics (voir metrics.py)")
+    args = parser.parse_args()
+    start_reporting("pipeline", port=args.metrics_port)
+    main(
+        crawl_concurrency=max(args.crawl_concurrency, 1),
+        verify_concurrency=max(args.verify_concurrency, 1),
+        download_concurrency=max(args.download_concurrency, 1),
+        seen_set_backend=args.seen_set,
+        recrawl=args.recrawl,
+        frontier=args.frontier,
+        archive=args.archive,
+    )
@@ -0,0 +1,42 @@
+import queue
+
+
+# Files bornées entre les étapes de pipeline.py (crawl -> vérification -> téléchargement).
+# Une étape qui produit plus vite que la suivante attend que la file se vide
+# (contre-pression). END est envoyé quand l'étape précédente a fini.
+
+END = None
+QUEUE_SIZE = 1000
+POLL_INTERVAL = 0.5  # secondes
+
+
+def new_queue():
+    return queue.Queue(maxsize=QUEUE_SIZE)
+
+
+def send(outgoing, item, stop=None):
+    # put bloquant, mais abandonné si le pipeline est arrêté
+    while stop is None or not stop.is_set():
+        try:
+            outgoing.put(item, timeout=POLL_INTERVAL)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def receive(incoming, block=False, limit=QUEUE_SIZE):
+    # Renvoie (éléments reçus, fini). Avec block=True, attend au plus POLL_INTERVAL
+    # le premier élément, pour que l'appelant puisse vérifier s'il doit s'arrêter.
+    items = []
+    try:
+        item = incoming.get(timeout=POLL_INTERVAL) if block else incoming.get_nowait()
+        while True:
+            if item is END:
+                return items, True
+            items.append(item)
+            if len(items) >= limit:
+                return items, False
+            item = incoming.get_nowait()
+    except queue.Empty:
+        return items, False
@@ -0,0 +1,111 @@
+import time
+import requests
+from collections import defaultdict
+from urllib.robotparser import RobotFileParser
+
+
+# robots.txt de chaque domaine, lu par crawl.py avant la première page du domaine
+# (dans le thread du pool qui fait la requête) et gardé ROBOTS_TTL secondes :
+#   - Disallow / Allow pour robots_user_agent : pages non visitées ;
+#   - Crawl-delay : appliqué par le throttle ;
+#   - Sitemap : sitemaps du domaine, lus par crawl.py (voir sitemaps.py).
+#
+# Comme le demande la RFC 9309 :
+#   - réponse 4xx (pas de robots.txt) : tout est autorisé ;
+#   - erreur 5xx, 429 ou erreur réseau : robots.txt "indisponible", tout est
+#     interdit. crawl.py reporte alors les pages du domaine, sans les compter comme
+#     des échecs :
+#       - l'hôte a répondu (429, 5xx) : pendant ROBOTS_UNAVAILABLE_TTL secondes
+#         (throttle.defer) ;
+#       - pas de réponse (connexion refusée, délai dépassé) : robots.txt est relu
+#         dès que le throttle le permet.
+#     Les erreurs 5xx et réseau comptent pour le coupe-circuit du throttle : un
+#     hôte en panne finit marqué injoignable, comme sur ses pages.
+#     Après ROBOTS_MAX_UNAVAILABLE indisponibilités de suite, tout est autorisé
+#     (la RFC le permet après 30 jours) ;
+#   - robots.txt lu au plus jusqu'à MAX_ROBOTS_SIZE octets.
+
+ROBOTS_TTL = 24 * 3600  # secondes
+ROBOTS_UNAVAILABLE_TTL = 30 * 60  # secondes
+ROBOTS_MAX_UNAVAILABLE = 6
+MAX_ROBOTS_SIZE = 500 * 1024  # octets
+
+
+class RobotsRules:
+    __slots__ = ("parser", "user_agent", "crawl_delay", "sitemaps", "expires", "unavailable")
+
+    def __init__(self, parser, user_agent, ttl, unavailable=False):
+        self.parser = parser
+        self.user_agent = user_agent
+        crawl_delay = parser.crawl_delay(user_agent)
+        self.crawl_delay = float(crawl_delay) if crawl_delay else None
+        self.sitemaps = parser.site_maps() or []
+        self.expires = time.time() + ttl
+        self.unavailable = unavailable
+
+    def allowed(self, url):
+        return self.parser.can_fetch(self.user_agent, url)
+
+
+class RobotsCache:
+
+    def __init__(self, user_agent, robots_user_agent, ttl=ROBOTS_TTL):
+        # user_agent : envoyé avec la requête ; robots_user_agent : nom cherché dans robots.txt
+        self.user_agent = user_agent
+        self.robots_user_agent = robots_user_agent
+        self.ttl = ttl
+        self.rules = {}  # domaine -> RobotsRules
+        self.unavailable_count = defaultdict(int)  # domaine -> indisponibilités de suite
+
+    def get(self, domain):
+        # règles en cache, None si jamais lues ou périmées
+        rules = self.rules.get(domain)
+        if rules is None or rules.expires < time.time():
+            return None
+        return rules
+
+    def fetch(self, throttle, scheme, domain, timeout):
+        # lit robots.txt (dans la politesse du domaine) et renvoie les règles ;
+        # rules.unavailable si robots.txt n'a pas pu être lu
+        robots_url = f"{scheme}://{domain}/robots.txt"
+        error = None
+        unavailable_ttl = ROBOTS_UNAVAILABLE_TTL
+        with throttle.slot(domain):
+            try:
+                with requests.get(robots_url, timeout=throttle.timeout(domain, timeout), stream=True,
+                                  headers={"User-Agent": self.user_agent}) as res:
+                    throttle.record_response(domain, res)  # 5xx : échec pour le coupe-circuit
+                    content = b""
+                    if res.status_code == 429 or res.status_code >= 500:
+                        error = f"HTTP {res.status_code}"
+                    if 200 <= res.status_code < 300:
+                        for chunk in res.iter_content(chunk_size=65536):
+                            content += chunk
+                            if len(content) >= MAX_ROBOTS_SIZE:
+                                break
+            except requests.RequestException as e:
+                error = str(e)
+                if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+                    throttle.record_failure(domain)
+                unavailable_ttl = 0  # pas de réponse : le throttle (coupe-circuit) fixe l'attente
+
+        parser = RobotFileParser(robots_url)
+        if error is not None:
+            self.unavailable_count[domain] += 1
+            if self.unavailable_count[domain] < ROBOTS_MAX_UNAVAILABLE:
+                print(f"[ROBOTS] Unable to read {robots_url} ({error}), "
+                      f"pages of {domain} deferred for {unavailable_ttl}s")
+                parser.disallow_all = True
+                rules = RobotsRules(parser, self.robots_user_agent, unavailable_ttl, unavailable=True)
+                self.rules[domain] = rules
+                return rules
+            print(f"[ROBOTS] Unable to read {robots_url} ({error}) {ROBOTS_MAX_UNAVAILABLE} times, allowing all")
+            parser.allow_all = True
+        elif 200 <= res.status_code < 300:
+            parser.parse(content[:MAX_ROBOTS_SIZE].decode("utf-8", "replace").splitlines())
+        else:
+            parser.allow_all = True
+        self.unavailable_count.pop(domain, None)
+        rules = RobotsRules(parser, self.robots_user_agent, self.ttl)
+        self.rules[domain] = rules
+        return rules
@@ -0,0 +1,119 @@
+import re
+import math
+import unicodedata
+from collections import Counter
+from urllib.parse import urlparse
+
+from page_cache import MAX_REVISIT_INTERVAL
+
+
+# Score des pages à visiter, pour la frontière best-first (FRONTIER dans crawl.py) :
+# les pages qui ont le plus de chances de mener à des documents sont visitées d'abord.
+#
+# Le score d'un lien vers une page html additionne :
+#   - les mots-clés du texte et du titre du lien ("TD", "exercices", "télécharger"...)
+#     et, avec un poids plus faible, ceux du chemin de l'url ;
+#   - le nombre de liens vers des documents de la page source : une page qui en
+#     contient déjà beaucoup (page d'un cours, liste d'annales) pointe souvent vers
+#     d'autres pages du même genre ;
+#   - le rendement passé du domaine : documents trouvés par page visitée, lissé
+#     pour qu'un domaine peu visité ne soit ni favorisé ni pénalisé ;
+#   - une pénalité par niveau de profondeur, pour garder un peu du parcours en largeur ;
+#   - pour une page revisitée (--recrawl), un bonus par division par 2 de son
+#     intervalle de revisite : les pages qui changent le plus souvent d'abord.
+#
+# Les statistiques par domaine sont reconstruites au démarrage depuis la base
+# (found_documents et page_cache, voir load()).
+
+KEYWORD_WEIGHTS = {
+    # préfixes de mots, sans accents ; les mots de 3 lettres ou moins doivent être
+    # entiers (éventuellement au pluriel) : "td", "tds", mais pas "tdah"
+    "td": 3, "tp": 2, "exercice": 3, "exo": 2, "feuille": 2, "fiche": 2, "sujet": 3,
+    "corrige": 3, "correction": 3, "annale": 4, "examen": 3, "exams": 2, "partiel": 3,
+    "controle": 2, "ds": 2, "devoir": 2, "dm": 1, "colle": 2, "interro": 2,
+    "cours": 2, "polycop": 2, "chapitre": 2, "enseignement": 2, "teaching": 2, "lecture": 1,
+    "pdf": 3, "telecharg": 3, "download": 3, "document": 1, "ressource": 1,
+    "licence": 1, "master": 1, "l1": 1, "l2": 1, "l3": 1, "m1": 1, "m2": 1, "agreg": 2, "capes": 2,
+    "actualite": -3, "news": -3, "agenda": -3, "evenement": -2, "event": -2, "calendrier": -3,
+    "contact": -2, "connexion": -3, "login": -3, "logout": -3, "recherche": -1, "search": -2,
+    "tag": -2, "categorie": -1, "facebook": -4, "twitter": -4, "linkedin": -4,
+    "mentions": -3, "legal": -3, "imprimer": -3, "rss": -3, "feed": -3,
+    "annuaire": -2, "recrutement": -2, "emploi": -2, "presse": -2,
+}
+MAX_KEYWORD_SCORE = 8  # plafond, pour un texte de lien qui répète les mots-clés
+PATH_WEIGHT = 0.5  # poids des mots du chemin, par rapport au texte du lien
+SOURCE_DOCUMENTS_WEIGHT = 1.0  # par doublement du nombre de documents de la page source
+DOMAIN_YIELD_WEIGHT = 2.0
+DOMAIN_PRIOR_PAGES = 10  # lissage : un domaine inconnu a le rendement DOMAIN_PRIOR_YIELD
+DOMAIN_PRIOR_YIELD = 0.5
+MAX_DOMAIN_YIELD = 5.0
+DEPTH_PENALTY = 1.0
+REVISIT_WEIGHT = 2.0  # par division par 2 de l'intervalle de revisite (page_cache.py)
+
+_WORD = re.compile(r"[a-z0-9]+")
+_SHORT_KEYWORDS = {word for word in KEYWORD_WEIGHTS if len(word) <= 3}
+_PREFIX_KEYWORDS = re.compile(
+    "|".join(sorted((word for word in KEYWORD_WEIGHTS if len(word) > 3), key=len, reverse=True))
+)
+
+
+def _plain(text):
+    # minuscules sans accents
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def keyword_score(text):
+    if not text:
+        return 0
+    score = 0
+    for word in _WORD.findall(_plain(text)):
+        if len(word) <= 4 and (word in _SHORT_KEYWORDS or word[:-1] in _SHORT_KEYWORDS and word[-1] == "s"):
+            score += KEYWORD_WEIGHTS[word if word in _SHORT_KEYWORDS else word[:-1]]
+            continue
+        match = _PREFIX_KEYWORDS.match(word)
+        if match:
+            score += KEYWORD_WEIGHTS[match.group(0)]
+    return max(min(score, MAX_KEYWORD_SCORE), -MAX_KEYWORD_SCORE)
+
+
+class LinkScorer:
+
+    def __init__(self):
+        self.domain_pages = Counter()
+        self.domain_documents = Counter()
+
+    def record_page(self, domain, documents):
+        # appelé après chaque page visitée, avec le nombre de liens vers des documents trouvés
+        self.domain_pages[domain] += 1
+        self.domain_documents[domain] += documents
+
+    def domain_yield(self, domain):
+        pages = self.domain_pages[domain] + DOMAIN_PRIOR_PAGES
+        documents = self.domain_documents[domain] + DOMAIN_PRIOR_PAGES * DOMAIN_PRIOR_YIELD
+        return min(documents / pages, MAX_DOMAIN_YIELD)
+
+    def score(self, url, depth, domain=None, text=None, title=None, source_documents=0, revisit_interval=None):
+        # text, title, source_documents : inconnus pour les urls rechargées depuis l'état du crawl
+        # revisit_interval : secondes, pour les pages revisitées
+        parsed = urlparse(url)
+        if domain is None:
+            domain = parsed.netloc
+        score = keyword_score(text) + keyword_score(title)
+        score += PATH_WEIGHT * keyword_score(parsed.path + " " + parsed.query)
+        score += SOURCE_DOCUMENTS_WEIGHT * (source_documents + 1).bit_length()
+        score += DOMAIN_YIELD_WEIGHT * self.domain_yield(domain)
+        score -= DEPTH_PENALTY * depth
+        if revisit_interval:
+            score += REVISIT_WEIGHT * math.log2(MAX_REVISIT_INTERVAL / max(revisit_interval, 1))
+        return score
+
+    def load(self, conn):
+        # rendement passé des domaines : pages du cache et documents trouvés, par domaine
+        for (url,) in conn.execute("SELECT url FROM page_cache"):
+            self.domain_pages[urlparse(url).netloc] += 1
+        for source_url, documents in conn.execute(
+            "SELECT source_url, COUNT(*) FROM found_documents WHERE source_url IS NOT NULL GROUP BY source_url"
+        ):
+            self.domain_documents[urlparse(source_url).netloc] += documents
+        return len(self.domain_pages)
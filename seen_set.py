@@ -0,0 +1,271 @@
+import os
+import math
+import mmap
+import time
+import heapq
+import bisect
+from array import array
+from hashlib import blake2b
+
+
+# Ensemble d'urls "déjà vues" qui ne garde qu'une empreinte de 64 bits par url,
+# au lieu de la chaîne complète (une centaine d'octets par url dans un set()).
+#
+#   - base    : empreintes triées dans un fichier, projeté en mémoire (mmap) ;
+#               le chargement est immédiat, la recherche est une dichotomie.
+#   - overlay : table de hachage à adressage ouvert dans un array('Q'),
+#               pour les urls ajoutées depuis la dernière sauvegarde.
+#   - bloom   : filtre de Bloom optionnel devant les deux, qui évite la plupart
+#               des recherches pour les urls jamais vues.
+#
+# save() fusionne overlay et base dans un nouveau fichier trié.
+# Deux urls différentes ont la même empreinte avec une probabilité ~ n / 2**64 :
+# négligeable, mais ce n'est pas un ensemble exact.
+
+FINGERPRINT_SIZE = 8
+
+
+def url_fingerprint(url):
+    fingerprint = int.from_bytes(blake2b(url.encode("utf-8"), digest_size=FINGERPRINT_SIZE).digest(), "little")
+    return fingerprint or 1  # 0 marque une case vide
+
+
+class FingerprintTable:
+
+    def __init__(self, capacity=1024):
+        self.table = array("Q", [0]) * capacity
+        self.mask = capacity - 1
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return (fingerprint for fingerprint in self.table if fingerprint)
+
+    def __contains__(self, fingerprint):
+        table = self.table
+        mask = self.mask
+        i = fingerprint & mask
+        while True:
+            slot = table[i]
+            if slot == fingerprint:
+                return True
+            if slot == 0:
+                return False
+            i = (i + 1) & mask
+
+    def add(self, fingerprint):
+        if 2 * (self.count + 1) > len(self.table):
+            self._grow()
+        table = self.table
+        mask = self.mask
+        i = fingerprint & mask
+        while True:
+            slot = table[i]
+            if slot == fingerprint:
+                return False
+            if slot == 0:
+                table[i] = fingerprint
+                self.count += 1
+                return True
+            i = (i + 1) & mask
+
+    def _grow(self):
+        old = self.table
+        self.table = array("Q", [0]) * (2 * len(old))
+        self.mask = len(self.table) - 1
+        self.count = 0
+        for fingerprint in old:
+            if fingerprint:
+                self.add(fingerprint)
+
+    def memory_usage(self):
+        return self.table.itemsize * len(self.table)
+
+
+class BloomFilter:
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, fingerprint):
+        # double hachage à partir des deux moitiés de l'empreinte
+        h1 = fingerprint & 0xFFFFFFFF
+        h2 = (fingerprint >> 32) | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hash_count)]
+
+    def add(self, fingerprint):
+        bits = self.bits
+        for position in self._positions(fingerprint):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, fingerprint):
+        bits = self.bits
+        for position in self._positions(fingerprint):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def save(self, path):
+        header = array("Q", [self.capacity, self.size, self.hash_count])
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            header.tofile(f)
+            f.write(self.bits)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, error_rate):
+        with open(path, "rb") as f:
+            header = array("Q")
+            header.fromfile(f, 3)
+            bloom = cls(header[0], error_rate)
+            if (bloom.size, bloom.hash_count) != (header[1], header[2]):
+                return None  # autre taux d'erreur demandé : on reconstruit
+            bits = f.read()
+        if len(bits) != len(bloom.bits):
+            return None
+        bloom.bits = bytearray(bits)
+        return bloom
+
+
+class FingerprintSet:
+
+    def __init__(self, path=None, bloom_error_rate=None, expected_items=1_000_000):
+        self.path = path
+        self.bloom_error_rate = bloom_error_rate
+        self.expected_items = expected_items
+        self.overlay = FingerprintTable()
+        self.bloom = None
+        self._file = None
+        self._mmap = None
+        self.base = array("Q")
+
+        self.lookups = 0
+        self.bloom_rejections = 0
+        self.lookup_time = 0.0
+
+        if path is not None and os.path.exists(path):
+            self._open_base(path)
+        if bloom_error_rate:
+            self._load_bloom()
+
+    def _open_base(self, path):
+        self._file = open(path, "rb")
+        if os.fstat(self._file.fileno()).st_size >= FINGERPRINT_SIZE:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.base = memoryview(self._mmap).cast("Q")
+
+    def _close_base(self):
+        if isinstance(self.base, memoryview):
+            self.base.release()
+        self.base = array("Q")
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _load_bloom(self):
+        bloom_path = self.path + ".bloom" if self.path else None
+        if bloom_path and os.path.exists(bloom_path):
+            self.bloom = BloomFilter.load(bloom_path, self.bloom_error_rate)
+            if self.bloom is not None and len(self) <= self.bloom.capacity:
+                return
+        self._rebuild_bloom()
+
+    def _rebuild_bloom(self):
+        self.bloom = BloomFilter(max(self.expected_items, 2 * len(self)), self.bloom_error_rate)
+        for fingerprint in self._all_fingerprints():
+            self.bloom.add(fingerprint)
+
+    def _all_fingerprints(self):
+        yield from self.base
+        yield from self.overlay
+
+    def __len__(self):
+        return len(self.base) + len(self.overlay)
+
+    def _contains_fingerprint(self, fingerprint):
+        if self.bloom is not None and fingerprint not in self.bloom:
+            self.bloom_rejections += 1
+            return False
+        if fingerprint in self.overlay:
+            return True
+        base = self.base
+        i = bisect.bisect_left(base, fingerprint)
+        return i < len(base) and base[i] == fingerprint
+
+    def _lookup(self, fingerprint):
+        start = time.perf_counter()
+        found = self._contains_fingerprint(fingerprint)
+        self.lookups += 1
+        self.lookup_time += time.perf_counter() - start
+        return found
+
+    def __contains__(self, url):
+        return self._lookup(url_fingerprint(url))
+
+    def add(self, url):
+        fingerprint = url_fingerprint(url)
+        if self._lookup(fingerprint):
+            return
+        self.overlay.add(fingerprint)
+        if self.bloom is not None:
+            self.bloom.add(fingerprint)
+
+    def save(self, path=None):
+        # fusionne la base et l'overlay dans un nouveau fichier trié.
+        # Le filtre de Bloom est écrit avant : après un crash entre les deux, il
+        # contient au pire des empreintes en trop (faux positifs, sans danger),
+        # jamais moins que la base (faux négatifs : urls vues traitées comme nouvelles).
+        path = path or self.path
+        if self.bloom is not None:
+            if len(self) > self.bloom.capacity:
+                self._rebuild_bloom()
+            self.bloom.save(path + ".bloom")
+
+        tmp_path = path + ".tmp"
+        chunk = array("Q")
+        with open(tmp_path, "wb") as f:
+            for fingerprint in heapq.merge(self.base, sorted(self.overlay)):
+                chunk.append(fingerprint)
+                if len(chunk) >= 65536:
+                    chunk.tofile(f)
+                    del chunk[:]
+            chunk.tofile(f)
+        self._close_base()
+        os.replace(tmp_path, path)
+        self.path = path
+        self.overlay = FingerprintTable()
+        self._open_base(path)
+
+    def close(self):
+        self._close_base()
+
+    def memory_usage(self):
+        # la base est projetée en mémoire : le système ne charge que les pages lues
+        usage = self.overlay.memory_usage()
+        if self.bloom is not None:
+            usage += len(self.bloom.bits)
+        return usage
+
+    def stats(self):
+        return {
+            "entries": len(self),
+            "base_entries": len(self.base),
+            "overlay_entries": len(self.overlay),
+            "memory_bytes": self.memory_usage(),
+            "mapped_bytes": len(self.base) * FINGERPRINT_SIZE,
+            "bloom_bytes": len(self.bloom.bits) if self.bloom is not None else 0,
+            "lookups": self.lookups,
+            "bloom_rejections": self.bloom_rejections,
+            "lookups_per_second": self.lookups / self.lookup_time if self.lookup_time else 0.0,
+        }
@@ -0,0 +1,292 @@
+import os
+import sys
+import time
+import zlib
+import socket
+import subprocess
+from collections import defaultdict
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de crawl réparti
+    fcntl = None
+
+from db import init_db, document_in_db
+
+
+# Crawl réparti sur plusieurs processus (crawl.py --workers N), éventuellement sur
+# plusieurs machines qui partagent le dossier state/.
+#
+# Les domaines sont répartis en SHARD_COUNT shards fixes (crc32 du domaine), chacun
+# avec son propre état dans state/shards/NN/ : urls à visiter, visitées, journal,
+# domaines injoignables, et sa propre base (page_cache, documents trouvés). Un
+# processus "worker" prend un shard libre qui a du travail (verrou flock sur
+# state/shards/NN/lock), le crawle avec la boucle habituelle de crawl.py, puis le
+# rend. Chaque domaine n'est donc crawlé que par un processus à la fois, qui a
+# toute sa politesse (throttle.py) en mémoire.
+#
+#   - liens vers un domaine d'un autre shard : écrits dans state/shards/NN/inbox/
+#     (un fichier par envoi, renommé une fois complet), lus par le propriétaire ;
+#   - documents : écrits dans la base du shard, puis copiés par lots dans
+#     state/found_documents.db toutes les MERGE_INTERVAL secondes (une seule
+#     transaction courte par shard, au lieu d'une écriture par page) ;
+#   - reprise après un crash : le verrou est libéré par le système, le prochain
+#     worker qui prend le shard rejoue son journal ;
+#   - nombre de workers : plus de workers démarre plus de shards en même temps,
+#     sans rien redémarrer (crawl.py --workers N sur une autre machine, par
+#     exemple). Avec moins de workers que de shards, un worker rend son shard
+#     après TIME_SLICE secondes si un autre shard attend.
+#
+# Le nombre de shards est fixé à la première utilisation (state/shards/shards.txt) :
+# c'est le nombre maximum de workers utiles.
+
+STATE_DIR = "state"
+SHARDS_DIR = os.path.join(STATE_DIR, "shards")
+DB_PATH = os.path.join(STATE_DIR, "found_documents.db")
+COUNT_FILE = "shards.txt"
+WORK_FILES = ("urls_to_visit.txt", "journal.log")  # non vides : le shard a des urls à visiter
+SHARD_COUNT = 16
+TIME_SLICE = 10 * 60  # secondes
+POLL_INTERVAL = 1  # secondes, lecture de l'inbox
+MERGE_INTERVAL = 30  # secondes, copie des documents dans la base partagée
+SUPERVISOR_INTERVAL = 2  # secondes
+MAX_ROUTED_URLS = 100_000  # urls déjà envoyées, gardées pour ne pas les renvoyer
+
+
+def shard_of(domain, count):
+    # crc32 et pas hash() : le même résultat dans tous les processus, sur toutes les machines
+    return zlib.crc32(domain.encode("utf-8")) % count
+
+
+def shard_name(index):
+    return f"{index:02d}"
+
+
+class Shards:
+
+    def __init__(self, directory=SHARDS_DIR):
+        self.directory = directory
+        self.count = None
+        count_path = os.path.join(directory, COUNT_FILE)
+        if os.path.exists(count_path):
+            with open(count_path, "r", encoding="utf-8") as f:
+                self.count = int(f.read().strip())
+
+    def exists(self):
+        return self.count is not None
+
+    def path(self, index, *names):
+        return os.path.join(self.directory, shard_name(index), *names)
+
+    def owner(self, domain):
+        return shard_of(domain, self.count)
+
+    # ---- verrous ----
+
+    def _lock(self, index):
+        # renvoie le fichier de verrou ouvert, ou None si le shard est déjà pris
+        lock_file = open(self.path(index, "lock"), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def is_free(self, index):
+        lock_file = self._lock(index)
+        if lock_file is None:
+            return False
+        lock_file.close()
+        return True
+
+    def has_work(self, index):
+        for name in WORK_FILES:
+            path = self.path(index, name)
+            if os.path.exists(path) and os.path.getsize(path):
+                return True
+        return any(name.endswith(".txt") for name in os.listdir(self.path(index, "inbox")))
+
+    def waiting(self, exclude=None):
+        # shards avec du travail et sans worker
+        return [
+            index for index in range(self.count)
+            if index != exclude and self.has_work(index) and self.is_free(index)
+        ]
+
+    def claim(self):
+        # prend le shard libre qui a du travail et qui a été pris il y a le plus
+        # longtemps (date du fichier de verrou) : avec moins de workers que de
+        # shards, chacun a son tour
+        candidates = [index for index in range(self.count) if self.has_work(index)]
+        candidates.sort(key=lambda index: os.path.getmtime(self.path(index, "lock")))
+        for index in candidates:
+            lock_file = self._lock(index)
+            if lock_file is not None:
+                os.utime(self.path(index, "lock"))
+                return Shard(self, index, lock_file)
+        return None
+
+    # ---- inbox ----
+
+    def send(self, index, sender, entries):
+        # entries : [(url, profondeur, score)] ; le fichier n'apparaît qu'une fois complet
+        inbox = self.path(index, "inbox")
+        name = f"{sender}-{socket.gethostname()}-{os.getpid()}-{time.time_ns()}"
+        tmp_path = os.path.join(inbox, name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for url, depth, score in entries:
+                f.write(f"{url}|{depth}|{score:g}\n")
+        os.replace(tmp_path, os.path.join(inbox, name + ".txt"))
+
+    def create(self, count):
+        # dans un dossier temporaire, renommé à la fin : un shard à moitié créé n'est jamais utilisé
+        tmp_directory = self.directory + ".tmp"
+        for index in range(count):
+            os.makedirs(os.path.join(tmp_directory, shard_name(index), "inbox"), exist_ok=True)
+            open(os.path.join(tmp_directory, shard_name(index), "lock"), "a").close()
+        with open(os.path.join(tmp_directory, COUNT_FILE), "w", encoding="utf-8") as f:
+            f.write(f"{count}\n")
+        return tmp_directory
+
+    def commit_creation(self, tmp_directory, count):
+        os.replace(tmp_directory, self.directory)
+        self.count = count
+
+
+class Shard:
+    # le shard pris par ce processus
+
+    def __init__(self, shards, index, lock_file):
+        self.shards = shards
+        self.index = index
+        self.name = shard_name(index)
+        self.directory = shards.path(index)
+        self.lock_file = lock_file
+        self.outbox = defaultdict(list)  # shard -> [(url, profondeur, score)]
+        self.routed = set()
+        self.started = time.monotonic()
+        self.last_poll = 0.0
+        self.last_merge = time.monotonic()
+        self.main_conn = None
+
+    def owns(self, domain):
+        return self.shards.owner(domain) == self.index
+
+    def route(self, url, domain, depth, score):
+        # lien vers un domaine d'un autre shard, envoyé au prochain flush_outbox()
+        if url in self.routed:
+            return
+        if len(self.routed) >= MAX_ROUTED_URLS:
+            self.routed.clear()
+        self.routed.add(url)
+        self.outbox[self.shards.owner(domain)].append((url, depth, score))
+
+    def flush_outbox(self):
+        for index, entries in self.outbox.items():
+            self.shards.send(index, self.name, entries)
+        self.outbox.clear()
+
+    def poll_due(self):
+        now = time.monotonic()
+        if now - self.last_poll < POLL_INTERVAL:
+            return False
+        self.last_poll = now
+        return True
+
+    def receive(self):
+        # renvoie (fichiers lus, [(url, profondeur, score)]) ; les fichiers sont supprimés
+        # par done(), une fois les urls inscrites dans le journal
+        inbox = os.path.join(self.directory, "inbox")
+        paths = [os.path.join(inbox, name) for name in sorted(os.listdir(inbox)) if name.endswith(".txt")]
+        entries = []
+        for path in paths:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        url, depth, score = line.rstrip("\n").rsplit("|", 2)
+                        entries.append((url, int(depth), float(score)))
+        return paths, entries
+
+    def done(self, paths):
+        for path in paths:
+            os.remove(path)
+
+    def should_yield(self):
+        # temps écoulé et un autre shard attend un worker
+        return time.monotonic() - self.started > TIME_SLICE and bool(self.shards.waiting(exclude=self.index))
+
+    # ---- documents ----
+
+    def main_db(self):
+        if self.main_conn is None:
+            self.main_conn = init_db(DB_PATH)
+        return self.main_conn
+
+    def document_known(self, url):
+        # document déjà copié dans la base partagée (par ce shard ou un autre)
+        return document_in_db(self.main_db(), url)
+
+    def merge_due(self):
+        return time.monotonic() - self.last_merge >= MERGE_INTERVAL
+
+    def merge_documents(self, conn):
+        # conn : base du shard. Copie idempotente (url unique dans la base partagée) :
+        # après un crash entre les deux étapes, les lignes sont simplement recopiées.
+        self.last_merge = time.monotonic()
+        merged_path = os.path.join(self.directory, "merged_id")
+        merged_id = 0
+        if os.path.exists(merged_path):
+            with open(merged_path, "r", encoding="utf-8") as f:
+                merged_id = int(f.read().strip() or 0)
+        rows = conn.execute("""
+            SELECT id, url, link_extension, link_text, link_title, source_url, source_title, link_date_added
+            FROM found_documents WHERE id > ? ORDER BY id
+        """, (merged_id,)).fetchall()
+        if not rows:
+            return 0
+        main_conn = self.main_db()
+        cur = main_conn.executemany("""
+            INSERT OR IGNORE INTO found_documents (
+              url, link_extension, link_text, link_title, source_url, source_title, link_date_added
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [row[1:] for row in rows])
+        main_conn.commit()
+        tmp_path = merged_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(f"{rows[-1][0]}\n")
+        os.replace(tmp_path, merged_path)
+        print(f"[SHARD {self.name}] Merged {cur.rowcount} new document(s) into {DB_PATH}")
+        return cur.rowcount
+
+    def release(self):
+        if self.main_conn is not None:
+            self.main_conn.close()
+            self.main_conn = None
+        self.lock_file.close()
+
+
+def run_workers(shards, workers, command):
+    # Garde `workers` processus `command` en marche tant que des shards attendent.
+    # Un worker prend un shard, le crawle et s'arrête : il est relancé s'il reste du travail.
+    processes = []
+    try:
+        while True:
+            processes = [process for process in processes if process.poll() is None]
+            waiting = shards.waiting()
+            for _ in range(min(workers - len(processes), len(waiting))):
+                processes.append(subprocess.Popen(command))
+            if not processes and not waiting:
+                print("[INFO] No shard waiting for a worker")
+                break
+            time.sleep(SUPERVISOR_INTERVAL)
+    except KeyboardInterrupt:
+        # Ctrl-C est aussi reçu par les workers, qui sauvegardent leur état
+        print("Interrupted by user, waiting for workers to save their state")
+        for process in processes:
+            process.wait()
+
+
+def check_platform():
+    if fcntl is None:
+        sys.exit("[ERROR] Sharded crawling needs file locks (fcntl), not available on this system")
@@ -0,0 +1,86 @@
+import zlib
+from itertools import chain
+from xml.etree.ElementTree import XMLPullParser, ParseError
+
+
+# Lecture des sitemaps (https://www.sitemaps.org/protocol.html) au fil du
+# téléchargement, sans garder le document entier en mémoire :
+#   <urlset>       urls des pages et documents du site
+#   <sitemapindex> urls d'autres sitemaps
+# Les sitemaps compressés (sitemap.xml.gz servi sans Content-Encoding) sont
+# décompressés à la volée, par morceaux de DECOMPRESS_CHUNK octets.
+# Au plus MAX_SITEMAP_SIZE octets décompressés et MAX_SITEMAP_URLS urls : les
+# limites du protocole, au-delà le reste est ignoré.
+
+SITEMAP_ROOTS = {"urlset": False, "sitemapindex": True}  # élément racine -> index de sitemaps
+ENTRY_TAGS = {"url", "sitemap"}
+MAX_SITEMAP_SIZE = 50 * 1024 * 1024  # octets
+MAX_SITEMAP_URLS = 50_000
+DECOMPRESS_CHUNK = 65536
+
+
+def _local_name(tag):
+    # sans l'espace de noms : "{http://www.sitemaps.org/schemas/sitemap/0.9}loc" -> "loc"
+    return tag.rsplit("}", 1)[-1]
+
+
+def _gunzip(chunks):
+    decompressor = zlib.decompressobj(wbits=31)
+    for chunk in chunks:
+        while chunk:
+            yield decompressor.decompress(chunk, DECOMPRESS_CHUNK)
+            chunk = decompressor.unconsumed_tail
+
+
+def is_sitemap_url(url):
+    # nom habituel d'un sitemap (sitemap.xml, sitemap_index.xml, post-sitemap2.xml.gz...)
+    path = url.split("?", 1)[0].lower()
+    return "sitemap" in path.rsplit("/", 1)[-1] and path.endswith((".xml", ".xml.gz"))
+
+
+def parse_sitemap(chunks, url=""):
+    # chunks : octets de la réponse (iter_content). Renvoie (index, [urls]), index
+    # étant vrai pour un index de sitemaps ; None si ce n'est pas un sitemap.
+    chunks = iter(chunks)
+    first_chunk = next(chunks, b"")
+    data = chain([first_chunk], chunks)
+    if first_chunk.startswith(b"\x1f\x8b"):
+        data = _gunzip(data)
+
+    parser = XMLPullParser(events=("start", "end"))
+    root = None
+    level = 0  # profondeur dans l'arbre : <loc> d'une entrée au niveau 3
+    locs = []
+    size = 0
+    try:
+        for chunk in data:
+            size += len(chunk)
+            if size > MAX_SITEMAP_SIZE:
+                print(f"[SITEMAP] Truncated after {MAX_SITEMAP_SIZE / 1e6:.0f} MB: {url}")
+                break
+            parser.feed(chunk)
+            for event, element in parser.read_events():
+                if event == "start":
+                    level += 1
+                    if root is None:
+                        if _local_name(element.tag) not in SITEMAP_ROOTS:
+                            return None
+                        root = element
+                    continue
+                level -= 1
+                name = _local_name(element.tag)
+                if name == "loc" and level == 2 and element.text and element.text.strip():
+                    locs.append(element.text.strip())
+                elif name in ENTRY_TAGS and level == 1:
+                    root.clear()  # entrée lue : rien n'est gardé
+            if len(locs) >= MAX_SITEMAP_URLS:
+                print(f"[SITEMAP] Only the first {MAX_SITEMAP_URLS} urls are read: {url}")
+                del locs[MAX_SITEMAP_URLS:]
+                break
+    except (ParseError, zlib.error) as e:
+        if root is None:
+            return None
+        print(f"[SITEMAP] Malformed, {len(locs)} urls read: {url}: {e}")
+    if root is None:
+        return None
+    return SITEMAP_ROOTS[_local_name(root.tag)], locs
@@ -0,0 +1,225 @@
+import time
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+
+# Politesse par domaine, partagée entre les threads qui font les requêtes
+# (et entre les étapes de pipeline.py) : jamais deux requêtes en même temps sur
+# un domaine, et au moins un délai (propre à chaque domaine) entre la fin d'une
+# requête et le début de la suivante.
+#
+#   with throttle.slot(domain):
+#       try:
+#           res = session.get(url, timeout=throttle.timeout(domain, 10))
+#           throttle.record_response(domain, res)
+#       except (requests.ConnectionError, requests.Timeout):
+#           throttle.record_failure(domain)
+#
+# ready_time(domain) sert aux Frontier pour savoir quand un domaine sera prêt.
+#
+# Délai adaptatif (seulement si min_delay < delay) : chaque domaine commence à
+# `delay`, qui est
+#   - multiplié par SLOWDOWN sur une réponse 429 ou 5xx, ou quand le temps de
+#     réponse augmente nettement par rapport à la moyenne du domaine ;
+#   - multiplié par SPEEDUP après une réponse rapide, jusqu'au plancher :
+#     min_delay, Crawl-delay de robots.txt (set_crawl_delay), et LATENCY_FACTOR
+#     fois le temps de réponse moyen du domaine.
+# Retry-After (429, 503) est toujours respecté, jusqu'à MAX_RETRY_AFTER.
+#
+# Coupe-circuit par domaine : après FAILURE_THRESHOLD échecs de connexion ou
+# erreurs 5xx de suite, le domaine est "ouvert" (plus aucune requête) pendant
+# BREAKER_COOLDOWN secondes, doublées à chaque nouvelle ouverture. Ensuite une
+# seule requête d'essai passe ("half-open") : un succès referme le circuit, un
+# échec le rouvre. Après MAX_BREAKER_OPENS ouvertures de suite, is_dead(domain)
+# est vrai : crawl.py marque alors le domaine comme injoignable.
+#
+# Délais d'attente adaptatifs (timeout()) : calculés comme le RTO de TCP à partir
+# du temps de réponse moyen et de sa variance, plafonnés par les valeurs par défaut.
+# Un hôte rapide qui ne répond plus est détecté en quelques secondes.
+
+SLOWDOWN = 2.0
+SPEEDUP = 0.9
+LATENCY_FACTOR = 2  # délai >= 2 fois le temps de réponse moyen
+LATENCY_ALPHA = 1 / 8  # moyennes mobiles, comme TCP (RFC 6298)
+LATENCY_BETA = 1 / 4
+MIN_LATENCY_SAMPLES = 3
+MAX_DELAY = 60
+MAX_RETRY_AFTER = 3600
+FAILURE_THRESHOLD = 3
+BREAKER_COOLDOWN = 60
+MAX_BREAKER_COOLDOWN = 30 * 60
+MAX_BREAKER_OPENS = 6
+CONNECT_TIMEOUT = 5  # domaine inconnu
+MIN_CONNECT_TIMEOUT = 1
+MIN_READ_TIMEOUT = 3
+READ_TIMEOUT_FACTOR = 4
+
+
+def parse_retry_after(value):
+    # secondes, ou date HTTP ; None si illisible
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return min(int(value), MAX_RETRY_AFTER)
+    try:
+        return min(max(parsedate_to_datetime(value).timestamp() - time.time(), 0), MAX_RETRY_AFTER)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+class DomainState:
+    __slots__ = ("delay", "crawl_delay", "latency", "latency_var", "samples",
+                 "blocked_until", "failures", "opens", "breaker")
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.crawl_delay = 0
+        self.latency = None
+        self.latency_var = 0.0
+        self.samples = 0
+        self.blocked_until = 0.0  # Retry-After, ou coupe-circuit ouvert
+        self.failures = 0  # échecs de suite
+        self.opens = 0  # ouvertures du coupe-circuit de suite
+        self.breaker = "closed"
+
+    def rto(self):
+        return self.latency + 4 * self.latency_var
+
+
+class DomainThrottle:
+
+    def __init__(self, delay, min_delay=None, max_delay=MAX_DELAY):
+        self.delay = delay
+        self.min_delay = delay if min_delay is None else min(min_delay, delay)
+        self.max_delay = max(max_delay, delay)
+        self.domains = {}
+        self.last_request_time = defaultdict(float)
+        self.busy = set()
+        self.condition = threading.Condition()
+
+    def _state(self, domain):
+        state = self.domains.get(domain)
+        if state is None:
+            state = self.domains[domain] = DomainState(self.delay)
+        return state
+
+    def ready_time(self, domain):
+        state = self.domains.get(domain)
+        if state is None:
+            return self.last_request_time[domain] + self.delay
+        return max(self.last_request_time[domain] + state.delay, state.blocked_until)
+
+    def wait_time(self, domain):
+        return max(self.ready_time(domain) - time.time(), 0)
+
+    def is_dead(self, domain):
+        state = self.domains.get(domain)
+        return state is not None and state.opens >= MAX_BREAKER_OPENS
+
+    @contextmanager
+    def slot(self, domain):
+        with self.condition:
+            while True:
+                if domain in self.busy:
+                    self.condition.wait()
+                    continue
+                wait_time = self.wait_time(domain)
+                if not wait_time:
+                    break
+                self.condition.wait(wait_time)
+            self.busy.add(domain)
+            state = self.domains.get(domain)
+            if state is not None and state.breaker == "open":
+                state.breaker = "half-open"  # requête d'essai
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.busy.discard(domain)
+                self.last_request_time[domain] = time.time()
+                self.condition.notify_all()
+
+    # ---- retours des requêtes (appelés dans slot()) ----
+
+    def timeout(self, domain, read_timeout):
+        # (connexion, lecture) pour requests ; read_timeout : valeur par défaut de l'appelant
+        state = self.domains.get(domain)
+        if state is None or state.samples < MIN_LATENCY_SAMPLES:
+            return min(CONNECT_TIMEOUT, read_timeout), read_timeout
+        rto = state.rto()
+        return (
+            min(max(rto, MIN_CONNECT_TIMEOUT), CONNECT_TIMEOUT),
+            min(max(rto * READ_TIMEOUT_FACTOR, MIN_READ_TIMEOUT), read_timeout),
+        )
+
+    def set_crawl_delay(self, domain, crawl_delay):
+        with self.condition:
+            state = self._state(domain)
+            state.crawl_delay = min(crawl_delay, self.max_delay)
+            state.delay = max(state.delay, state.crawl_delay)
+
+    def defer(self, domain, seconds):
+        # aucune requête sur le domaine pendant `seconds` (robots.txt injoignable),
+        # sans compter comme un échec pour le coupe-circuit
+        with self.condition:
+            state = self._state(domain)
+            state.blocked_until = max(state.blocked_until, time.time() + seconds)
+
+    def record_response(self, domain, res):
+        status = res.status_code
+        latency = res.elapsed.total_seconds()
+        with self.condition:
+            state = self._state(domain)
+            if status == 429 or status >= 500:
+                retry_after = parse_retry_after(res.headers.get("Retry-After"))
+                if retry_after:
+                    state.blocked_until = max(state.blocked_until, time.time() + retry_after)
+                self._slow_down(state)
+                if status >= 500:
+                    self._failure(domain, state)
+                return
+
+            slow = state.samples >= MIN_LATENCY_SAMPLES and latency > state.rto()
+            self._add_latency_sample(state, latency)
+            state.failures = 0
+            state.opens = 0
+            state.breaker = "closed"
+            if slow:
+                self._slow_down(state)
+            elif self.min_delay < self.delay:
+                floor = max(self.min_delay, state.crawl_delay, LATENCY_FACTOR * state.latency)
+                state.delay = max(state.delay * SPEEDUP, floor)
+
+    def record_failure(self, domain):
+        # erreur de connexion ou délai dépassé
+        with self.condition:
+            state = self._state(domain)
+            self._slow_down(state)
+            self._failure(domain, state)
+
+    def _add_latency_sample(self, state, latency):
+        if state.latency is None:
+            state.latency = latency
+            state.latency_var = latency / 2
+        else:
+            state.latency_var += LATENCY_BETA * (abs(state.latency - latency) - state.latency_var)
+            state.latency += LATENCY_ALPHA * (latency - state.latency)
+        state.samples += 1
+
+    def _slow_down(self, state):
+        if self.min_delay < self.delay:
+            state.delay = min(state.delay * SLOWDOWN, self.max_delay)
+
+    def _failure(self, domain, state):
+        state.failures += 1
+        if state.breaker == "half-open" or state.failures >= FAILURE_THRESHOLD:
+            state.opens += 1
+            state.failures = 0
+            state.breaker = "open"
+            cooldown = min(BREAKER_COOLDOWN * 2 ** (state.opens - 1), MAX_BREAKER_COOLDOWN)
+            state.blocked_until = max(state.blocked_until, time.time() + cooldown)
+            print(f"[CIRCUIT OPEN] {domain}: no request for {cooldown}s "
+                  f"({state.opens}/{MAX_BREAKER_OPENS} before giving up)")
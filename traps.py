@@ -0,0 +1,171 @@
+import re
+from collections import defaultdict, deque, Counter
+from urllib.parse import urlparse
+
+from seen_set import url_fingerprint
+
+
+# Détection des pièges à crawler (calendriers, recherches à facettes, listes
+# paginées sans fin) : des milliers de pages qui ne contiennent aucun document.
+#
+# Les urls sont regroupées en familles : domaine + chemin où les nombres sont
+# remplacés par # + noms des paramètres, par exemple
+#   www.univ.fr/agenda/#/#/#?view
+# Pour chaque famille on compte les urls programmées, les pages visitées, les liens
+# vers des documents trouvés sur ces pages, et les pages quasi identiques à une autre.
+#
+# Une url est écartée quand :
+#   - son chemin est trop profond, ou répète le même segment (/a/b/a/b/a/...) ;
+#   - son chemin a déjà trop de variantes de paramètres (?date=...&salle=...)
+#     et aucune de ces pages n'a donné de document ;
+#   - sa famille a été supprimée : assez de pages visitées, aucun document, et
+#     soit beaucoup de pages quasi identiques, soit une explosion du nombre d'urls.
+#
+# Pages quasi identiques : SimHash de l'ensemble des liens de la page, comparé
+# aux dernières pages du même domaine (distance de Hamming <= SIMHASH_DISTANCE).
+
+MAX_PATH_SEGMENTS = 15
+MAX_SEGMENT_REPEAT = 3
+MAX_QUERY_VARIANTS = 200  # variantes de paramètres par chemin
+FAMILY_MIN_VISITS = 20  # pages visitées avant de juger une famille
+FAMILY_MAX_URLS = 1000  # urls programmées dans une famille sans document
+NEAR_DUPLICATE_RATIO = 0.5
+SIMHASH_DISTANCE = 3
+SIMHASH_WINDOW = 500  # pages gardées par domaine pour la comparaison
+SIMHASH_MIN_LINKS = 8  # en dessous, le SimHash ne veut pas dire grand-chose
+
+_NUMBER = re.compile(r"\d+")
+
+
+def url_family(parsed):
+    path = _NUMBER.sub("#", parsed.path)
+    if not parsed.query:
+        return parsed.netloc + path
+    keys = sorted({segment.split("=", 1)[0] for segment in parsed.query.split("&") if segment})
+    return parsed.netloc + path + "?" + "&".join(keys)
+
+
+def simhash(features):
+    counts = [0] * 64
+    for feature in features:
+        h = url_fingerprint(feature)
+        for bit in range(64):
+            if h >> bit & 1:
+                counts[bit] += 1
+            else:
+                counts[bit] -= 1
+    value = 0
+    for bit in range(64):
+        if counts[bit] > 0:
+            value |= 1 << bit
+    return value
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class FamilyStats:
+    __slots__ = ("scheduled", "visited", "documents", "near_duplicates", "suppressed", "dropped")
+
+    def __init__(self):
+        self.scheduled = 0
+        self.visited = 0
+        self.documents = 0
+        self.near_duplicates = 0
+        self.suppressed = None  # raison de la suppression
+        self.dropped = 0
+
+
+class TrapDetector:
+
+    def __init__(self):
+        self.families = defaultdict(FamilyStats)
+        self.path_documents = Counter()  # (domaine, chemin) -> documents trouvés
+        self.query_variants = defaultdict(set)  # (domaine, chemin) -> paramètres vus
+        self.simhashes = defaultdict(lambda: deque(maxlen=SIMHASH_WINDOW))
+        self.dropped = Counter()  # raison -> urls écartées
+
+    def _drop(self, reason, stats=None):
+        self.dropped[reason] += 1
+        if stats is not None:
+            stats.dropped += 1
+        return reason
+
+    def _suppress(self, family, stats, reason):
+        stats.suppressed = reason
+        print(f"[TRAP] Suppressing {family}: {reason} "
+              f"({stats.visited} pages visited, {stats.scheduled} scheduled, {stats.documents} documents)")
+
+    def check(self, url):
+        # Appelé avant de programmer une url. Renvoie la raison si elle est écartée, sinon None.
+        parsed = urlparse(url)
+        segments = [segment for segment in parsed.path.split("/") if segment]
+        if len(segments) > MAX_PATH_SEGMENTS:
+            return self._drop("path too deep")
+        if segments and Counter(segments).most_common(1)[0][1] >= MAX_SEGMENT_REPEAT:
+            return self._drop("repeated path segment")
+
+        family = url_family(parsed)
+        stats = self.families[family]
+        if stats.suppressed:
+            return self._drop(stats.suppressed, stats)
+
+        if parsed.query:
+            key = (parsed.netloc, parsed.path)
+            variants = self.query_variants[key]
+            if parsed.query not in variants:
+                if len(variants) >= MAX_QUERY_VARIANTS and not self.path_documents[key]:
+                    return self._drop("too many query variants", stats)
+                variants.add(parsed.query)
+
+        stats.scheduled += 1
+        if (stats.scheduled > FAMILY_MAX_URLS and not stats.documents
+                and stats.visited >= FAMILY_MIN_VISITS):
+            self._suppress(family, stats, "url pattern explosion")
+            return self._drop(stats.suppressed, stats)
+        return None
+
+    def is_suppressed(self, url):
+        # Appelé avant de visiter une url programmée avant la suppression de sa famille.
+        stats = self.families.get(url_family(urlparse(url)))
+        if stats is not None and stats.suppressed:
+            self._drop(stats.suppressed, stats)
+            return True
+        return False
+
+    def near_duplicate(self, url, domain, link_urls):
+        # Renvoie l'url d'une page récente du même domaine qui a presque les mêmes liens, ou None.
+        if len(link_urls) < SIMHASH_MIN_LINKS:
+            return None
+        value = simhash(link_urls)
+        window = self.simhashes[domain]
+        similar = None
+        for other_value, other_url in window:
+            if other_url != url and hamming_distance(value, other_value) <= SIMHASH_DISTANCE:
+                similar = other_url
+                break
+        window.append((value, url))
+        return similar
+
+    def record_visit(self, url, documents, near_duplicate):
+        parsed = urlparse(url)
+        family = url_family(parsed)
+        stats = self.families[family]
+        stats.visited += 1
+        stats.documents += documents
+        stats.near_duplicates += near_duplicate
+        self.path_documents[(parsed.netloc, parsed.path)] += documents
+        if (not stats.suppressed and stats.visited >= FAMILY_MIN_VISITS and not stats.documents
+                and stats.near_duplicates >= stats.visited * NEAR_DUPLICATE_RATIO):
+            self._suppress(family, stats, "near-duplicate pages")
+
+    def report(self):
+        lines = []
+        for reason, count in self.dropped.most_common():
+            lines.append(f"{count} url(s) dropped: {reason}")
+        suppressed = [(family, stats) for family, stats in self.families.items() if stats.suppressed]
+        suppressed.sort(key=lambda item: item[1].dropped, reverse=True)
+        for family, stats in suppressed:
+            lines.append(f"  {family}: {stats.suppressed}, {stats.visited} visited, {stats.dropped} dropped")
+        return lines
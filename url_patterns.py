@@ -0,0 +1,128 @@
+import re
+import fnmatch
+from collections import deque
+
+
+# Règles d'autorisation / de blocage des urls, compilées une fois au chargement.
+#
+# Dans les fichiers de motifs (allowed_crawl_patterns.txt, blocked_crawl_patterns.txt) :
+#   - une ligne sans * ni ? est une sous-chaîne cherchée dans l'url (comme avant),
+#     toutes ces sous-chaînes sont cherchées en une seule passe (automate d'Aho-Corasick) ;
+#   - une ligne avec * ou ? est un motif glob qui doit couvrir toute l'url,
+#     par exemple  */agenda/*  ou  https://*.univ-*.fr/*.pdf
+#
+# Dans le fichier de domaines (blocked_crawl_domains.txt) :
+#   - example.com    : ce domaine exactement (comme avant)
+#   - *.example.com  : tous les sous-domaines de example.com
+#   - .example.com   : example.com et tous ses sous-domaines
+#
+# Les motifs sont passés en minuscules, l'url est comparée telle quelle (comme avant).
+
+
+class SubstringMatcher:
+    # Aho-Corasick : temps linéaire en la longueur du texte, quel que soit le
+    # nombre de motifs.
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [False]
+        for pattern in patterns:
+            self._add(pattern)
+        self._build_fail_links()
+
+    def _add(self, pattern):
+        state = 0
+        for char in pattern:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(False)
+                self.goto[state][char] = next_state
+            state = next_state
+        self.output[state] = True
+
+    def _build_fail_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                self.output[next_state] = self.output[next_state] or self.output[self.fail[next_state]]
+
+    def search(self, text):
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                return True
+        return False
+
+
+class UrlMatcher:
+
+    def __init__(self, patterns=(), domains=()):
+        substrings = set()
+        globs = set()
+        for pattern in patterns:
+            pattern = pattern.strip().lower()
+            if not pattern:
+                continue
+            if "*" in pattern or "?" in pattern:
+                globs.add(pattern)
+            else:
+                substrings.add(pattern)
+
+        self.exact_domains = set()
+        self.domain_suffixes = set()
+        for domain in domains:
+            domain = domain.strip().lower()
+            if domain.startswith("*."):
+                self.domain_suffixes.add(domain[2:])
+            elif domain.startswith("."):
+                self.exact_domains.add(domain[1:])
+                self.domain_suffixes.add(domain[1:])
+            elif domain:
+                self.exact_domains.add(domain)
+
+        self.substrings = SubstringMatcher(substrings) if substrings else None
+        self.globs = re.compile("|".join(fnmatch.translate(g) for g in sorted(globs))) if globs else None
+        self.rule_count = len(substrings) + len(globs) + len(self.exact_domains) + len(self.domain_suffixes)
+
+    def __len__(self):
+        return self.rule_count
+
+    def matches(self, url, domain=None):
+        if self.substrings is not None and self.substrings.search(url):
+            return True
+        if self.globs is not None and self.globs.match(url):
+            return True
+        if domain is not None:
+            return self.matches_domain(domain)
+        return False
+
+    def matches_domain(self, domain):
+        domain = domain.lower()
+        if domain in self.exact_domains:
+            return True
+        if not self.domain_suffixes:
+            return False
+        # on remonte les suffixes : a.b.example.com -> b.example.com -> example.com -> com
+        host = domain.rsplit(":", 1)[0] if domain.count(":") == 1 else domain
+        while "." in host:
+            host = host.split(".", 1)[1]
+            if host in self.domain_suffixes:
+                return True
+        return False
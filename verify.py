@@ -1,114 +1,236 @@
-import sqlite3
-import requests
+import re
 import time
+import argparse
+import requests
+from requests.adapters import HTTPAdapter
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, timezone
 from urllib.parse import urlparse
 
+from db import init_db
+from frontier import Frontier
+from throttle import DomainThrottle
+from metrics import metrics, start_reporting
+from pipeline_queue import send, receive
+
 DB_PATH = "state/found_documents.db"
 USER_AGENT = "Mozilla/5.0 (compatible; MyCrawler/1.0)"
 MIN_DOMAIN_DELAY = 1.1 # secondes
-
-def fetch_head_and_initial_bytes(url):
-    headers = {
-        "User-Agent": USER_AGENT
-    }
-
+CONCURRENCY = 16  # nombre de domaines vérifiés en parallèle
+BATCH_SIZE = 100  # résultats écrits par transaction
+INITIAL_BYTES = 32
+PENDING_BUFFER = 10_000  # pipeline.py : documents reçus à l'avance
+SAVE_INTERVAL = 2  # pipeline.py : secondes max avant d'écrire (et de transmettre) les résultats
+REQUEST_TIMEOUT = 10  # secondes, réduit sur les domaines rapides (throttle.timeout)
+MAX_ATTEMPTS = 3  # par lien et par session, en cas d'erreur réseau ou de réponse 429 / 503
+RETRY_STATUS_CODES = {429, 503}
+
+# une seule session pour tous les threads : les connexions sont réutilisées
+http_session = requests.Session()
+http_session.headers["User-Agent"] = USER_AGENT
+
+
+def configure_http_pool(size):
+    adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size)
+    http_session.mount("http://", adapter)
+    http_session.mount("https://", adapter)
+
+
+def parse_content_length(res):
+    # réponse 206 : la taille totale est dans Content-Range ("bytes 0-31/12345")
+    if res.status_code == 206:
+        match = re.search(r"/(\d+)\s*$", res.headers.get("Content-Range", ""))
+        return int(match.group(1)) if match else None
+    content_length = res.headers.get("Content-Length", "")
+    return int(content_length) if content_length.isdigit() else None
+
+
+def fetch_head_and_initial_bytes(throttle, url):
+    # On ne demande que les premiers octets (Range). Un serveur qui ignore le Range
+    # répond 200 avec tout le fichier : on ne lit que le début et on ferme.
+    domain = urlparse(url).netloc
     try:
-        res = requests.get(url, stream=True, headers=headers, timeout=10)
-        initial_bytes = res.raw.read(32)
-        if res.status_code in (200, 206):  # 206 = partial content
-            headers = res.headers
-            return {
-                "status_code": res.status_code,
-                "content_type": headers.get("Content-Type"),
-                "content_length": int(headers.get("Content-Length")) if headers.get("Content-Length", "").isdigit() else None,
-                "last_modified": headers.get("Last-Modified"),
-                "initial_bytes": initial_bytes
-            }
-        else:
+        res = http_session.get(url, stream=True, timeout=throttle.timeout(domain, REQUEST_TIMEOUT),
+                               headers={"Range": f"bytes=0-{INITIAL_BYTES - 1}"})
+        if res.status_code == 416:
+            # fichier vide, ou Range refusé : on redemande sans Range
+            res.close()
+            res = http_session.get(url, stream=True, timeout=throttle.timeout(domain, REQUEST_TIMEOUT))
+
+        throttle.record_response(domain, res)
+        with res:
+            initial_bytes = b''
+            if res.status_code in (200, 206):  # 206 = partial content
+                initial_bytes = res.raw.read(INITIAL_BYTES, decode_content=True)
             return {
                 "status_code": res.status_code,
                 "content_type": res.headers.get("Content-Type"),
-                "content_length": int(res.headers.get("Content-Length")) if res.headers.get("Content-Length", "").isdigit() else None,
+                "content_length": parse_content_length(res),
                 "last_modified": res.headers.get("Last-Modified"),
-                "initial_bytes": b''
+                "initial_bytes": initial_bytes
             }
     except requests.RequestException as e:
+        if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+            throttle.record_failure(domain)
         return {
             "status_code": None,
             "error": str(e),
             "initial_bytes": b''
         }
 
-def verify_links():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
 
-    cur.execute("""
+def verify_link(throttle, url):
+    # exécuté dans un thread du pool
+    domain = urlparse(url).netloc
+    wait_start = time.perf_counter()
+    with throttle.slot(domain):
+        metrics.observe("verify_throttle_wait_seconds", time.perf_counter() - wait_start)
+        with metrics.timer("verify_request_seconds", domain=domain):
+            result = fetch_head_and_initial_bytes(throttle, url)
+    metrics.count("verify_responses_total", status=result.get("status_code") or "error")
+    return result
+
+
+def save_results(conn, results):
+    if not results:
+        return
+    start = time.perf_counter()
+
+    cur = conn.cursor()
+    cur.executemany("""
+        UPDATE found_documents
+        SET
+            link_date_accessed = ?,
+            link_http_code = ?,
+            link_content_type = ?,
+            link_content_length = ?,
+            link_last_modified = ?
+        WHERE id = ?
+    """, [(
+        accessed,
+        result.get("status_code"),
+        result.get("content_type"),
+        result.get("content_length"),
+        result.get("last_modified"),
+        doc_id
+    ) for doc_id, accessed, result in results])
+    cur.executemany("""
+        INSERT OR REPLACE INTO document_blobs (document_id, doc_initial_bytes)
+        VALUES (?, ?)
+    """, [(doc_id, result.get("initial_bytes")) for doc_id, _, result in results])
+    conn.commit()
+    metrics.observe("verify_db_flush_seconds", time.perf_counter() - start)
+    print(f"Saved {len(results)} results.")
+    results.clear()
+
+
+def verify_links(concurrency=CONCURRENCY, throttle=None, incoming=None, verified=None, stop=None):
+    # Seul, vérifie les documents non vérifiés de la base. Dans pipeline.py :
+    #   throttle : politesse partagée avec les autres étapes
+    #   incoming : file des (url, id) trouvés par le crawl, jusqu'à END
+    #   verified : file où sont envoyés les ids vérifiés, une fois écrits dans la base
+    #   stop     : threading.Event, arrêt demandé
+    conn = init_db(DB_PATH)
+    configure_http_pool(concurrency)
+
+    throttle = throttle or DomainThrottle(MIN_DOMAIN_DELAY)
+    pending = Frontier(lambda url: urlparse(url).netloc, throttle.ready_time)
+    for doc_id, url in conn.execute("""
         SELECT id, url FROM found_documents
         WHERE link_http_code IS NULL
-    """)
-    rows = cur.fetchall()
-
-    print(f"Found {len(rows)} unverified links.")
-
-    pending = list(rows)
-    last_access_time = {}
-
-    while pending:
-        now = time.time()
-        made_progress = False
-
-        for i in range(len(pending)):
-            row = pending[i]
-            doc_id = row["id"]
-            url = row["url"]
-            domain = urlparse(url).netloc
-
-            last_access = last_access_time.get(domain, 0)
-            if now - last_access < MIN_DOMAIN_DELAY:
-                continue  # domaine occupé
-
-            print(f"Verifying: {url}")
-            result = fetch_head_and_initial_bytes(url)
-            last_access_time[domain] = time.time()
-
-            if not result.get("status_code"):
-                pending.pop(i)
-                made_progress = True
-                break  
-
-            iso_now = datetime.now(timezone.utc).isoformat()
-            cur.execute("""
-                UPDATE found_documents
-                SET
-                    link_date_accessed = ?,
-                    link_http_code = ?,
-                    link_content_type = ?,
-                    link_content_length = ?,
-                    link_last_modified = ?,
-                    doc_initial_bytes = ?
-                WHERE id = ?
-            """, (
-                iso_now,
-                result.get("status_code"),
-                result.get("content_type"),
-                result.get("content_length"),
-                result.get("last_modified"),
-                result.get("initial_bytes"),
-                doc_id
-            ))
-            conn.commit()
-            pending.pop(i)
-            made_progress = True
-            break  
-
-        if not made_progress:
-            time.sleep(0.2)  # on réessaye dans 200ms
+    """):
+        pending.push(url, doc_id)
+
+    print(f"Found {len(pending)} unverified links.")
+    metrics.add_collector(lambda: (
+        metrics.gauge("verify_pending", len(pending)),
+        metrics.gauge("verify_pending_oldest_age_seconds", pending.oldest_age()),
+    ))
+
+    # Un domaine n'a jamais deux requêtes en cours (voir Frontier.release),
+    # et MIN_DOMAIN_DELAY est respecté entre deux requêtes sur un même domaine.
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+    in_flight = {}  # future -> (id, url)
+    results = []
+    attempts = defaultdict(int)  # id -> requêtes échouées
+    more_to_come = incoming is not None
+    last_save = time.time()
+
+    def save():
+        ids = [doc_id for doc_id, _, _ in results]
+        save_results(conn, results)
+        if verified is not None:
+            for doc_id in ids:
+                send(verified, doc_id, stop)
+
+    try:
+        while (pending or in_flight or more_to_come) and not (stop and stop.is_set()):
+            if more_to_come and len(pending) < PENDING_BUFFER:
+                # on n'attend la file que s'il n'y a rien d'autre à faire
+                entries, finished = receive(incoming, block=not pending and not in_flight)
+                for url, doc_id in entries:
+                    pending.push(url, doc_id)
+                more_to_come = not finished
+
+            while len(in_flight) < concurrency:
+                entry = pending.pop(time.time())
+                if entry is None:
+                    break
+                url, doc_id, domain = entry
+                if throttle.is_dead(domain):
+                    # coupe-circuit : on réessaiera au prochain lancement
+                    print(f"[SKIPPED] Domain unreachable: {url}")
+                    pending.release(domain)
+                    continue
+                print(f"Verifying: {url}")
+                in_flight[pool.submit(verify_link, throttle, url)] = (doc_id, url)
+
+            next_ready_time = pending.next_ready_time()
+            if not in_flight:
+                if next_ready_time is not None:
+                    time.sleep(max(next_ready_time - time.time(), 0))
+                continue
+
+            timeout = None
+            if len(in_flight) < concurrency and next_ready_time is not None:
+                timeout = max(next_ready_time - time.time(), 0)
+            if more_to_come:
+                timeout = min(timeout if timeout is not None else SAVE_INTERVAL, SAVE_INTERVAL)
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                doc_id, url = in_flight.pop(future)
+                pending.release(urlparse(url).netloc)
+
+                result = future.result()
+                if not result.get("status_code") or result["status_code"] in RETRY_STATUS_CODES:
+                    # erreur réseau, ou serveur surchargé : le domaine n'est de nouveau prêt
+                    # qu'après le délai du throttle. Au-delà de MAX_ATTEMPTS, on réessaiera
+                    # au prochain lancement.
+                    attempts[doc_id] += 1
+                    if attempts[doc_id] < MAX_ATTEMPTS:
+                        pending.push(url, doc_id)
+                    continue
+
+                results.append((doc_id, datetime.now(timezone.utc).isoformat(), result))
+
+            if len(results) >= BATCH_SIZE or (verified is not None and results and time.time() - last_save > SAVE_INTERVAL):
+                save()
+                last_save = time.time()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        save()
+        conn.close()
 
     print("Verification complete.")
-    conn.close()
 
 if __name__ == "__main__":
-    verify_links()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY,
+                        help=f"nombre de domaines vérifiés en parallèle (défaut : {CONCURRENCY})")
+    parser.add_argument("--metrics-port", type=int,
+                        help="sert les statistiques sur http://127.0.0.1:PORT/metrics (voir metrics.py)")
+    args = parser.parse_args()
+    start_reporting("verify", port=args.metrics_port)
+    verify_links(concurrency=max(args.concurrency, 1))